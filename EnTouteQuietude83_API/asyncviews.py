@@ -0,0 +1,56 @@
+import functools
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from user.authentication import CachedTokenAuthentication
+
+
+# Vues de lecture async (ASGI) :
+# ================================
+# Sous ASGI, une vue DRF (synchrone) est exécutée dans l'unique thread
+# "thread-sensitive" : les requêtes concurrentes y passent une à une. Les
+# routes /async/ servent les lectures les plus sollicitées par des vues
+# async (ORM et cache async), avec le même token et le même JSON que les
+# routes DRF correspondantes. Sous WSGI, elles fonctionnent aussi (Django
+# les exécute dans une boucle par requête), sans intérêt.
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # Même rendu (octet pour octet) que le JSONRenderer des vues DRF.
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        content_type="application/json")
+
+
+def error_response(exc):
+    # Mêmes corps d'erreur que le gestionnaire d'exceptions de DRF.
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response["WWW-Authenticate"] = CachedTokenAuthentication().authenticate_header(None)
+    return response
+
+
+def async_read_view(view):
+    # GET authentifié par token (CachedTokenAuthentication.aauthenticate) :
+    # request.user / request.auth renseignés avant l'appel de la vue, les
+    # APIException levées par la vue rendues comme par DRF.
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ("GET", "HEAD"):
+                raise exceptions.MethodNotAllowed(request.method)
+            result = await CachedTokenAuthentication().aauthenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = result
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = error_response(exc)
+            if isinstance(exc, exceptions.MethodNotAllowed):
+                response["Allow"] = "GET, HEAD"
+            return response
+    return wrapper
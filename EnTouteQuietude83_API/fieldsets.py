@@ -0,0 +1,153 @@
+from rest_framework import exceptions, permissions
+
+SIDELOAD_CHOICES = ("users",)
+
+
+# Champs et objets imbriqués à la demande (lectures) :
+# ======================================================
+# ?fields=id,degree,user.first_name : champs émis (et lus en base par les
+#   listes compilées, EnTouteQuietude83_API.rows) ; "relation.champ" pour
+#   les objets imbriqués. Champs inconnus ignorés.
+# ?expand=user : relations imbriquées, les autres réduites à leur id ;
+#   absent => toutes (comportement historique), vide => aucune.
+# ?sideload=users (listes) : chaque étudiant référencé figure une seule
+#   fois dans "included", les lignes ne gardent que son id.
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class FieldSelection:
+
+    def __init__(self, fields=None, expand=None, nested=None):
+        # None : tous les champs / toutes les relations.
+        self.fields = fields
+        self.expand = expand
+        self.nested = nested or {}
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        names, nested = None, {}
+        if fields is not None:
+            names = set()
+            for entry in split_names(fields):
+                head, _, rest = entry.partition(".")
+                names.add(head)
+                if rest:
+                    nested.setdefault(head, []).append(rest)
+        return cls(
+            fields=names,
+            expand=None if expand is None else set(split_names(expand)),
+            nested={name: cls.parse(",".join(paths)) for name, paths in nested.items()},
+        )
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return ALL_FIELDS
+        # Request DRF ou HttpRequest (vues async).
+        params = getattr(request, "query_params", request.GET)
+        if "fields" not in params and "expand" not in params:
+            return ALL_FIELDS
+        return cls.parse(params.get("fields"), params.get("expand"))
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return self.expand is None or name in self.expand
+
+    def child(self, name):
+        return self.nested.get(name, ALL_FIELDS)
+
+    def with_nested_field(self, relation, name):
+        # Champ imposé dans un objet imbriqué (id des étudiants sideloadés).
+        child = self.child(relation)
+        if child.fields is None or name in child.fields:
+            return self
+        nested = dict(self.nested)
+        nested[relation] = FieldSelection(child.fields | {name}, child.expand, child.nested)
+        return FieldSelection(self.fields, self.expand, nested)
+
+
+ALL_FIELDS = FieldSelection()
+
+
+# Serializers DRF : sélection passée explicitement (objets imbriqués) ou
+# par le contexte de la vue (FieldSelectionMixin).
+# ---------------------------------------------------------------------
+
+
+class SparseFieldsMixin:
+
+    def __init__(self, *args, selection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if selection is None:
+            selection = self.context.get("selection", ALL_FIELDS)
+        self.selection = selection
+        if selection.fields is not None:
+            for name in list(self.fields):
+                if name not in selection.fields:
+                    self.fields.pop(name)
+
+    def nested_representation(self, representation, name, serializer_class, instance):
+        # Relation demandée (expand) : objet complet, sinon son id.
+        if name in representation and self.selection.expands(name):
+            representation[name] = serializer_class(
+                instance, selection=self.selection.child(name)).data
+
+
+# Vues :
+# --------
+
+
+class FieldSelectionMixin:
+    # Relations vers un étudiant, remplacées par son id avec ?sideload=users.
+    sideload_fields = ()
+
+    def get_field_selection(self):
+        if not hasattr(self, "_field_selection"):
+            selection = FieldSelection.from_request(self.request)
+            if self.sideloading():
+                for name in self.sideload_fields:
+                    selection = selection.with_nested_field(name, "id")
+            self._field_selection = selection
+        return self._field_selection
+
+    def sideloading(self):
+        value = self.request.query_params.get("sideload")
+        if value is None or not self.sideload_fields or getattr(self, "action", None) != "list":
+            return False
+        if value not in SIDELOAD_CHOICES:
+            raise exceptions.ValidationError(
+                {"sideload": f"Valeurs possibles : {', '.join(SIDELOAD_CHOICES)}."})
+        return True
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["selection"] = self.get_field_selection()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.sideloading() and response.status_code == 200:
+            response.data = sideload_users(response.data, self.sideload_fields)
+        return response
+
+
+def sideload_users(data, fields):
+    rows = data["results"] if isinstance(data, dict) else data
+    users = {}
+    for row in rows:
+        for name in fields:
+            user = row.get(name)
+            if isinstance(user, dict):
+                # Étudiant supprimé (expéditeur vide) : pas d'id => null.
+                user_id = user.get("id")
+                if user_id is not None:
+                    users.setdefault(user_id, user)
+                row[name] = user_id
+    if isinstance(data, dict):
+        return {**data, "included": {"users": users}}
+    return {"results": rows, "included": {"users": users}}
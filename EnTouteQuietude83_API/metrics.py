@@ -0,0 +1,217 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+
+
+# Métriques (format texte Prometheus) :
+# =======================================
+# Chaque processus (worker) tient ses compteurs en mémoire et les écrit
+# régulièrement dans son propre fichier de METRICS_DIR ; la lecture
+# additionne les fichiers de tous les workers : scraper n'importe lequel
+# renvoie les totaux. Vider METRICS_DIR à chaque déploiement (les fichiers
+# des workers arrêtés sont conservés pour que les compteurs restent cumulés).
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def label_values(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} : labels attendus {self.labelnames}, reçus {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, self.label_values(labels),
+                             lambda value: (value or 0) + amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        def update(current):
+            current = current or {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    current["buckets"][index] += 1
+            current["sum"] += value
+            current["count"] += 1
+            return current
+        self.registry.update(self, self.label_values(labels), update)
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._pid = None
+        self._filename = None
+        self._last_flush = 0.0
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        return self.register(Histogram(self, name, documentation, labelnames, **kwargs))
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrique déjà enregistrée : {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, label_values, function):
+        with self._lock:
+            self._check_fork()
+            key = (metric.name, label_values)
+            self._values[key] = function(self._values.get(key))
+
+    def _check_fork(self):
+        # Après un fork (workers gunicorn...), repartir de zéro dans un
+        # nouveau fichier : les valeurs héritées appartiennent au parent.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._filename = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+            self._values = {}
+
+    # Stockage partagé (un fichier JSON par processus) :
+    # ----------------------------------------------------
+
+    def flush(self):
+        with self._lock:
+            self._check_fork()
+            entries = [[name, list(labels), value]
+                       for (name, labels), value in self._values.items()]
+            filename = self._filename
+            self._last_flush = time.monotonic()
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(entries, file)
+        # Remplacement atomique : un lecteur ne voit jamais de fichier partiel.
+        os.replace(f"{path}.tmp", path)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def collect(self):
+        self.flush()
+        totals = {}
+        directory = settings.METRICS_DIR
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as file:
+                    entries = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                key = (name, tuple(labels))
+                totals[key] = merge_values(metric, totals.get(key), value)
+        return totals
+
+    # Format texte Prometheus (version 0.0.4) :
+    # ------------------------------------------
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            series = sorted((labels, value) for (metric_name, labels), value
+                            in totals.items() if metric_name == name)
+            for labels, value in series:
+                pairs = list(zip(metric.labelnames, labels))
+                if metric.type == "counter":
+                    lines.append(f"{name}{format_labels(pairs)} {format_value(value)}")
+                    continue
+                for bound, count in zip(metric.buckets, value["buckets"]):
+                    lines.append(f"{name}_bucket{format_labels(pairs + [('le', format_value(bound))])} {count}")
+                lines.append(f"{name}_bucket{format_labels(pairs + [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{format_labels(pairs)} {format_value(value['sum'])}")
+                lines.append(f"{name}_count{format_labels(pairs)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def merge_values(metric, total, value):
+    if total is None:
+        return value
+    if metric.type == "counter":
+        return total + value
+    return {
+        "buckets": [a + b for a, b in zip(total["buckets"], value["buckets"])],
+        "sum": total["sum"] + value["sum"],
+        "count": total["count"] + value["count"],
+    }
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+# Métriques de l'API :
+# ---------------------
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par vue et méthode.",
+    ["view", "method"])
+RESPONSES = registry.counter(
+    "http_responses_total", "Réponses HTTP par vue, méthode et code de statut.",
+    ["view", "method", "status"])
+REQUEST_QUERIES = registry.histogram(
+    "http_request_db_queries", "Nombre de requêtes SQL par requête HTTP.",
+    ["view"], buckets=QUERY_COUNT_BUCKETS)
+BOOKING_CONFLICTS = registry.counter(
+    "booking_conflicts_total", "Réservations refusées (créneau déjà pris, 409).")
+LOGIN_FAILURES = registry.counter(
+    "login_failures_total", "Échecs de connexion (identifiants invalides).")
+THROTTLED = registry.counter(
+    "throttled_requests_total", "Requêtes refusées par limitation de débit (429), par scope.",
+    ["scope"])
@@ -0,0 +1,154 @@
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES, RESPONSES, registry
+from .profiling import release_profiler, start_profiler
+from .timing import QueryTimer, format_server_timing
+
+
+# Profilage par requête :
+# =========================
+# Pour chaque requête : temps total, nombre et durée des requêtes SQL, étapes
+# enregistrées par record_timing() (authentification...), renvoyés dans
+# l'en-tête Server-Timing (visible dans l'onglet Réseau du navigateur).
+# Un superuser peut demander un profil cProfile avec l'en-tête "X-Profile: 1" :
+# son identifiant est renvoyé dans X-Profile-Id (téléchargement : /profiles/).
+
+
+# Sous ASGI (vues async, EnTouteQuietude83_API.asyncviews), les deux
+# middlewares restent dans la boucle d'événements : un middleware synchrone
+# imposerait un passage par un thread à chaque requête. Les requêtes SQL
+# y sont exécutées dans le thread "thread-sensitive" de la requête (ORM
+# async, vues DRF) : le chronomètre SQL y est installé. Pas de profil
+# cProfile sous ASGI (il ne verrait que le thread de la boucle).
+
+
+def time_queries(stack, query_timer):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(query_timer))
+
+
+def set_server_timing(request, response, query_timer, total):
+    timings = request.server_timings
+    timings["db"] = query_timer.duration
+    timings["app"] = max(total - sum(timings.values()), 0.0)
+    timings["total"] = total
+    response["Server-Timing"] = format_server_timing(timings, query_timer.count)
+
+
+# Requêtes SQL comptées dès que les métriques ou Server-Timing sont actifs
+# (request.query_count, lu par MetricsMiddleware) ; en-tête et profils
+# uniquement avec SERVER_TIMING_ENABLED.
+def counts_queries():
+    return settings.SERVER_TIMING_ENABLED or settings.METRICS_ENABLED
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not counts_queries():
+            return self.get_response(request)
+
+        request.server_timings = {}
+        query_timer = QueryTimer()
+        profiler = start_profiler(request) if settings.SERVER_TIMING_ENABLED else None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                time_queries(stack, query_timer)
+                if profiler is not None:
+                    stack.enter_context(profiler)
+                response = self.get_response(request)
+            request.query_count = query_timer.count
+            if settings.SERVER_TIMING_ENABLED:
+                set_server_timing(request, response, query_timer,
+                                  time.perf_counter() - start)
+            if profiler is not None:
+                response["X-Profile-Id"] = profiler.save(request)
+        finally:
+            if profiler is not None:
+                release_profiler()
+        return response
+
+    async def __acall__(self, request):
+        if not counts_queries():
+            return await self.get_response(request)
+
+        request.server_timings = {}
+        query_timer = QueryTimer()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(time_queries)(stack, query_timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        request.query_count = query_timer.count
+        if settings.SERVER_TIMING_ENABLED:
+            set_server_timing(request, response, query_timer, time.perf_counter() - start)
+        return response
+
+
+# Métriques par vue (à placer avant ProfilingMiddleware, dont il lit
+# request.query_count) : latence, codes de statut, requêtes SQL.
+# ====================================================================
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unmatched>"
+    # Vues DRF : classe de la vue (RendezVousViewSet, LoginView...).
+    view = getattr(match.func, "cls", match.func)
+    return view.__name__
+
+
+def record_metrics(request, response, elapsed):
+    view = view_label(request)
+    REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+    RESPONSES.inc(view=view, method=request.method, status=response.status_code)
+    query_count = getattr(request, "query_count", None)
+    if query_count is not None:
+        REQUEST_QUERIES.observe(query_count, view=view)
+    registry.maybe_flush()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        record_metrics(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        record_metrics(request, response, time.perf_counter() - start)
+        return response
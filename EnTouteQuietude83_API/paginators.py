@@ -0,0 +1,116 @@
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+# Changelists de l'admin sur les grandes tables :
+# =================================================
+# COUNT(*) borné (sous-requête LIMIT) : au-delà de count_cap lignes, le
+# compte affiché est count_cap et les pages suivantes ne sont pas proposées ;
+# filtres, recherche et date_hierarchy restreignent la liste. À utiliser avec
+# show_full_result_count = False (pas de second COUNT sur toute la table).
+
+
+class CappedCountPaginator(Paginator):
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list[:self.count_cap].count()
+
+
+# Pagination par curseur sur plusieurs colonnes (API) :
+# ======================================================
+# CursorPagination de DRF ne filtre que sur ordering[0] et départage les
+# ex aequo par un décalage (OFFSET) : sur ("date", "heure", "id"), toutes
+# les lignes d'une même date seraient relues. Ici le curseur contient la
+# valeur de chaque colonne de l'ordre (la dernière doit être unique) :
+# page suivante = WHERE (date, heure, id) > (d, h, i), un parcours d'index.
+
+
+class KeysetCursorPagination(CursorPagination):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Même déroulé que CursorPagination.paginate_queryset, filtre sur
+        # toutes les colonnes ; positions uniques => décalage toujours nul.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.after(queryset.model, ordering, current_position))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def after(self, model, ordering, position):
+        # (a, b, c) > (x, y, z) : a > x OU (a = x ET b > y) OU ...
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            fields = [order.lstrip("-") for order in ordering]
+            values = [model._meta.get_field(field).to_python(value)
+                      for field, value in zip(fields, values)]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        condition, equal = None, Q()
+        for order, field, value in zip(ordering, fields, values):
+            lookup = "lt" if order.startswith("-") else "gt"
+            step = equal & Q(**{f"{field}__{lookup}": value})
+            condition = step if condition is None else condition | step
+            equal &= Q(**{field: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(str(instance[field]))
+            else:
+                values.append(str(getattr(instance, field)))
+        return json.dumps(values)
@@ -0,0 +1,139 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from rest_framework import exceptions, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from user.authentication import CachedTokenAuthentication
+from user.views import IsSuperUser
+
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+# Profils cProfile à la demande (superuser, en-tête X-Profile: 1) :
+# ===================================================================
+
+_profiling_lock = threading.Lock()
+
+
+def wants_profile(request):
+    if request.headers.get("X-Profile") != "1":
+        return False
+    if random.random() >= settings.PROFILING_SAMPLE_RATE:
+        return False
+    return is_superuser_request(request)
+
+
+def is_superuser_request(request):
+    # Token uniquement : le middleware passe avant AuthenticationMiddleware
+    # (session), pour que le profil couvre toute la pile.
+    header = request.headers.get("Authorization", "").split()
+    if len(header) != 2 or header[0].lower() != "token":
+        return False
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(header[1])
+    except exceptions.AuthenticationFailed:
+        return False
+    return user.is_superuser
+
+
+class RequestProfiler:
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+
+    def save(self, request):
+        directory = settings.PROFILING_STORAGE_DIR
+        os.makedirs(directory, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+        self.profile.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+        with open(os.path.join(directory, f"{profile_id}.txt"), "w") as file:
+            file.write(f"{request.method} {request.get_full_path()}\n")
+        prune_profiles(directory, settings.PROFILING_MAX_FILES)
+        return profile_id
+
+
+def start_profiler(request):
+    # Un seul profil à la fois par processus : le surcoût reste borné.
+    if not wants_profile(request) or not _profiling_lock.acquire(blocking=False):
+        return None
+    return RequestProfiler()
+
+
+def release_profiler():
+    _profiling_lock.release()
+
+
+def prune_profiles(directory, keep):
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".prof")),
+        key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in profiles[keep:]:
+        for suffix in (".prof", ".txt"):
+            try:
+                os.remove(entry.path[:-len(".prof")] + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(profile_id, suffix=".prof"):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(settings.PROFILING_STORAGE_DIR, f"{profile_id}{suffix}")
+    return path if os.path.exists(path) else None
+
+
+# Téléchargement des profils (superuser) :
+# GET /profiles/ => liste, GET /profiles/<id>/ => fichier .prof (pstats),
+# GET /profiles/<id>/?summary=1 => résumé texte (tri par temps cumulé)
+# --------------------------------------------------------------------------
+
+
+class ProfileListView(APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        directory = settings.PROFILING_STORAGE_DIR
+        profiles = []
+        if os.path.isdir(directory):
+            for entry in sorted(os.scandir(directory), key=lambda e: e.stat().st_mtime, reverse=True):
+                if not entry.name.endswith(".prof"):
+                    continue
+                profile_id = entry.name[:-len(".prof")]
+                label_path = profile_path(profile_id, ".txt")
+                label = Path(label_path).read_text().strip() if label_path else ""
+                profiles.append({"id": profile_id, "request": label,
+                                 "created": entry.stat().st_mtime})
+        return Response(profiles, status=status.HTTP_200_OK)
+
+
+class ProfileDownloadView(APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    def get(self, request, profile_id):
+        path = profile_path(profile_id)
+        if path is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get("summary"):
+            output = io.StringIO()
+            pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(40)
+            return HttpResponse(output.getvalue(), content_type="text/plain; charset=utf-8")
+        return FileResponse(open(path, "rb"), as_attachment=True,
+                            filename=f"{profile_id}.prof")
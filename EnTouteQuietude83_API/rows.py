@@ -0,0 +1,139 @@
+import operator
+from django.conf import settings
+from rest_framework.response import Response
+from .fieldsets import ALL_FIELDS
+
+
+# Sérialisation compilée des listes (lecture seule) :
+# =====================================================
+# Un RowSerializer décrit le même JSON qu'un serializer DRF (mêmes clés, même
+# ordre, mêmes formats) à partir des lignes de QuerySet.values() : pas
+# d'instance de modèle, pas de champ DRF par ligne. Les accesseurs sont
+# calculés une fois par réponse ; les objets imbriqués (créneau, étudiant)
+# sont sérialisés une fois par id et par réponse. Seules les colonnes des
+# champs demandés (?fields=, ?expand=, EnTouteQuietude83_API.fieldsets) sont
+# lues en base.
+# Conformité (octet pour octet) vérifiée par les tests de chaque app.
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+class Column:
+    # Colonne values() (source, "__" pour traverser une relation) => clé.
+
+    def __init__(self, key, source=None, convert=None):
+        self.key = key
+        self.source = source or key
+        self.convert = convert
+
+    def columns(self, prefix, selection):
+        return [prefix + self.source]
+
+    def accessor(self, prefix, context, selection):
+        column = prefix + self.source
+        convert = self.convert
+        if convert is None:
+            return operator.itemgetter(column)
+
+        def get(row):
+            value = row[column]
+            return None if value is None else convert(value)
+        return get
+
+
+class Nested:
+    # Objet lié sérialisé par un autre RowSerializer (id seul s'il n'est pas
+    # demandé par ?expand=) ; `null` : valeur renvoyée quand la clé étrangère
+    # est vide.
+
+    def __init__(self, key, serializer_class, source=None, null=None):
+        self.key = key
+        self.serializer_class = serializer_class
+        self.source = source or key
+        self.null = null
+
+    def primary_key(self):
+        return Column(self.key, self.source)
+
+    def columns(self, prefix, selection):
+        nested_prefix = f"{prefix}{self.source}__"
+        return [f"{nested_prefix}id",
+                *self.serializer_class(selection=selection).columns(nested_prefix)]
+
+    def accessor(self, prefix, context, selection):
+        # Les serializers imbriqués du projet sont construits sans contexte
+        # (URLs relatives) : même comportement ici.
+        nested_prefix = f"{prefix}{self.source}__"
+        accessors = self.serializer_class(selection=selection).accessors(nested_prefix)
+        pk_column = f"{nested_prefix}id"
+        cache = {}
+        null = self.null
+        if null is not None:
+            null = {key: value for key, value in null.items() if selection.includes(key)}
+
+        def get(row):
+            pk = row[pk_column]
+            if pk is None:
+                return dict(null) if null is not None else None
+            data = cache.get(pk)
+            if data is None:
+                data = cache[pk] = {key: get_value(row) for key, get_value in accessors}
+            return data
+        return get
+
+
+class RowSerializer:
+    fields = ()
+
+    def __init__(self, context=None, selection=None):
+        self.context = context or {}
+        self.selection = selection or self.context.get("selection", ALL_FIELDS)
+
+    def selected_fields(self):
+        for field in self.fields:
+            if not self.selection.includes(field.key):
+                continue
+            if isinstance(field, Nested) and not self.selection.expands(field.key):
+                field = field.primary_key()
+            yield field, self.selection.child(field.key)
+
+    def columns(self, prefix=""):
+        columns = [column for field, selection in self.selected_fields()
+                   for column in field.columns(prefix, selection)]
+        return list(dict.fromkeys(columns))
+
+    def accessors(self, prefix=""):
+        return [(field.key, field.accessor(prefix, self.context, selection))
+                for field, selection in self.selected_fields()]
+
+    def render(self, rows):
+        accessors = self.accessors()
+        return [{key: get(row) for key, get in accessors} for row in rows]
+
+
+# Vues : action list() compilée (désactivable : ROW_SERIALIZATION_ENABLED).
+# ---------------------------------------------------------------------------
+
+
+class RowListMixin:
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.ROW_SERIALIZATION_ENABLED:
+            return super().list(request, *args, **kwargs)
+        serializer = self.row_serializer_class(context=self.get_serializer_context())
+        # Le curseur lit les champs de tri dans les lignes, même hors ?fields=.
+        columns = dict.fromkeys([*serializer.columns(), *self.pagination_columns()])
+        rows = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.render(page))
+        return Response(serializer.render(rows))
+
+    def pagination_columns(self):
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return [name.lstrip("-") for name in ordering]
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from importlib import metadata
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from drf_spectacular.views import SpectacularAPIView
+
+FINGERPRINT_PACKAGES = ("Django", "djangorestframework", "drf-spectacular", "django-filter")
+FINGERPRINT_SKIP_DIRS = {"__pycache__", "media", "var", "static", "venv", "env", "node_modules"}
+
+
+# Schéma OpenAPI précalculé (/schema/, utilisé par /docs/) :
+# ============================================================
+# L'introspection de toutes les vues et de tous les serializers n'est faite
+# qu'une fois par version du code : le document rendu (YAML ou JSON) est
+# gardé en mémoire et sur disque (SCHEMA_CACHE_DIR), servi avec un ETag fort
+# et 304 Not Modified. Au déploiement : python manage.py generate_schema
+
+
+@lru_cache(maxsize=None)
+def code_fingerprint():
+    # CODE_VERSION (sha git du déploiement) ou empreinte des sources Python
+    # du projet et des versions des paquets qui produisent le schéma.
+    if settings.CODE_VERSION:
+        return settings.CODE_VERSION
+    digest = hashlib.sha256()
+    for package in FINGERPRINT_PACKAGES:
+        digest.update(f"{package}={metadata.version(package)}\n".encode())
+    for path in sorted(source_files(settings.BASE_DIR)):
+        digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def source_files(root):
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories
+                             if not name.startswith(".") and name not in FINGERPRINT_SKIP_DIRS]
+        for name in files:
+            if name.endswith(".py"):
+                yield os.path.join(directory, name)
+
+
+class SchemaDocument:
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def schema_path(renderer_format, fingerprint=None):
+    return os.path.join(settings.SCHEMA_CACHE_DIR,
+                        f"schema-{fingerprint or code_fingerprint()}.{renderer_format}")
+
+
+@lru_cache(maxsize=None)
+def build_schema():
+    generator = SpectacularAPIView.generator_class()
+    return generator.get_schema(request=None, public=True)
+
+
+def render_schema(renderer):
+    return renderer.render(build_schema(), renderer.media_type, {})
+
+
+def get_schema_document(renderer):
+    # Mémoire, puis disque (generate_schema), sinon génération.
+    key = (code_fingerprint(), renderer.format)
+    document = _documents.get(key)
+    if document is not None:
+        return document
+    with _documents_lock:
+        if key in _documents:
+            return _documents[key]
+        path = schema_path(renderer.format)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                body = file.read()
+        else:
+            body = render_schema(renderer)
+            write_schema_file(path, body)
+        _documents[key] = SchemaDocument(body)
+        return _documents[key]
+
+
+def write_schema_file(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(body)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_schema_cache():
+    with _documents_lock:
+        _documents.clear()
+    build_schema.cache_clear()
+    code_fingerprint.cache_clear()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+
+    def _get_schema_response(self, request):
+        # ?lang= / ?version= : schéma spécifique, généré à la demande.
+        if request.GET.get("lang") or request.GET.get("version"):
+            return super()._get_schema_response(request)
+
+        document = get_schema_document(request.accepted_renderer)
+        if document.etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            renderer = request.accepted_renderer
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f"; charset={renderer.charset}"
+            response = HttpResponse(document.body, content_type=content_type)
+            response["Content-Disposition"] = (
+                f'inline; filename="{self._get_filename(request, None)}"')
+        response["ETag"] = document.etag
+        # Toujours revalider (ETag) : un nouveau déploiement change le schéma.
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
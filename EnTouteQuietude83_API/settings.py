@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "EnTouteQuietude83_API.middleware.MetricsMiddleware",
+    "EnTouteQuietude83_API.middleware.ProfilingMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -88,10 +90,32 @@ WSGI_APPLICATION = 'EnTouteQuietude83_API.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv("DB_NAME", BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Profil SQLite de production (opt-in : DB_PROFILE=production)
+# WAL (lectures concurrentes des écritures), synchronous=NORMAL (sûr en WAL),
+# cache et mmap agrandis, attente sur verrou au lieu de "database is locked",
+# et connexions persistantes (pas d'ouverture de connexion à chaque requête).
+if os.getenv("DB_PROFILE") == "production":
+    DATABASES['default'].update({
+        'ENGINE': 'EnTouteQuietude83_API.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,  # millisecondes
+                'cache_size': -64000,  # 64 Mo
+                'mmap_size': 268435456,  # 256 Mo
+                'temp_store': 'MEMORY',
+            },
+        },
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -132,6 +156,11 @@ MEDIA_ROOT = BASE_DIR / 'media'
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
 
+# Miniatures des images de profil (user.images) : nombre de workers et
+# génération en arrière-plan (False => dans le thread de la requête)
+PROFILE_IMAGE_WORKERS = int(os.getenv("PROFILE_IMAGE_WORKERS", 2))
+PROFILE_IMAGE_THUMBNAILS_ASYNC = True
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -150,11 +179,132 @@ CORS_ALLOWED_ORIGINS = [
 # Permet d'utiliser le modèle custom partout y compris en sécurité
 AUTH_USER_MODEL = "user.CustomUser"
 
+# Connexion email / mot de passe : ModelBackend dont le hachage se fait dans
+# le pool dédié (user.hashing)
+AUTHENTICATION_BACKENDS = ["user.backends.PooledModelBackend"]
+
 # I) DEFAULT_SCHEMA_CLASS Permet d'utiliser les schema de swagger pour présenter l'api
 # II) DEFAULT_AUTHENTICATION_CLASSES Permet d'utiliser le système authToken de DRF
+# III) NUM_PROXIES : nombre de reverse proxies devant l'API. 0 => l'IP du
+# client (throttles par IP) est REMOTE_ADDR ; X-Forwarded-For, fourni par le
+# client, n'est lu qu'au-delà (sinon un en-tête inventé => seau neuf).
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
-    )
+        "user.authentication.CachedTokenAuthentication",
+    ),
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 0)),
+}
+
+# Cache (authentification par token notamment).
+# Avec plusieurs workers, utiliser un cache partagé (Redis, Memcached) pour que
+# les invalidations (déconnexion, changement de mdp...) touchent tous les
+# workers ; le cache des tokens ignore un LocMemCache (AUTH_TOKEN_CACHE_*).
+# "collections" : versions des listes (ETag, availability.conditional), qui
+# doivent être partagées entre workers : table en base par défaut (créée
+# par la migration availability 0006), Redis ou Memcached possibles.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "etq83",
+    },
+    "collections": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "collection_versions",
+    },
+}
+
+# Cache des tokens (user.authentication) : alias partagé entre workers
+# (Redis, Memcached...). Un LocMemCache n'est utilisé que si l'application
+# tourne dans un seul processus (AUTH_TOKEN_CACHE_SINGLE_PROCESS=True) :
+# sinon les tokens ne sont pas mis en cache.
+AUTH_TOKEN_CACHE_ALIAS = os.getenv("AUTH_TOKEN_CACHE_ALIAS", "default")
+AUTH_TOKEN_CACHE_SINGLE_PROCESS = os.getenv("AUTH_TOKEN_CACHE_SINGLE_PROCESS", "False") == "True"
+# Durée de vie (secondes) du couple token => user en cache
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", 300))
+
+# Flux SSE des messages (availability.views.message_stream)
+MESSAGE_BROKER_BACKEND = "availability.events.InProcessBroker"
+# Nombre maximal de flux ouverts par processus
+MESSAGE_STREAM_MAX_CONNECTIONS = int(
+    os.getenv("MESSAGE_STREAM_MAX_CONNECTIONS", 200))
+# Secondes entre deux commentaires "heartbeat"
+MESSAGE_STREAM_HEARTBEAT = 15
+# Durée de vie d'un flux (secondes) avant reconnexion du client
+MESSAGE_STREAM_MAX_DURATION = 300
+# Délai de reconnexion conseillé au client (secondes)
+MESSAGE_STREAM_RETRY_AFTER = 3
+
+# Sérialisation compilée des listes (EnTouteQuietude83_API.rows) ;
+# False => serializers DRF (comparaison, diagnostic)
+ROW_SERIALIZATION_ENABLED = True
+
+# Synchronisation incrémentale (availability.sync)
+# Conservation des pierres tombales (jours) ; un jeton plus ancien => 410
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+# Élargissement de la fenêtre (secondes) : transactions validées tardivement
+SYNC_OVERLAP_SECONDS = 5
+
+# Profilage des requêtes (EnTouteQuietude83_API.middleware.ProfilingMiddleware)
+# En-têtes Server-Timing (temps total, SQL, authentification) sur chaque réponse
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "True") == "True"
+# Part des requêtes "X-Profile: 1" (superuser) réellement profilées (0 à 1)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 1.0))
+# Stockage des profils cProfile (téléchargeables via /profiles/)
+PROFILING_STORAGE_DIR = os.getenv(
+    "PROFILING_STORAGE_DIR", BASE_DIR / "var" / "profiles")
+PROFILING_MAX_FILES = 50
+
+# Métriques Prometheus (GET /metrics, EnTouteQuietude83_API.metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+# Un fichier par worker, additionnés à la lecture (à vider à chaque déploiement)
+METRICS_DIR = os.getenv("METRICS_DIR", BASE_DIR / "var" / "metrics")
+# Délai max (secondes) avant écriture des compteurs d'un worker sur disque
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+# Adresses autorisées à lire /metrics sans token superuser (scraper interne).
+# Vide par défaut : derrière un reverse proxy local, toutes les requêtes
+# externes arrivent de 127.0.0.1 ; à ne renseigner que si REMOTE_ADDR est
+# bien celle du scraper.
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip]
+
+# Tests : METRICS_DIR temporaire (EnTouteQuietude83_API.test_runner)
+TEST_RUNNER = "EnTouteQuietude83_API.test_runner.TestRunner"
+
+# Hachage des mots de passe en pool de processus (user.hashing)
+# Import en masse : processus du pool éphémère
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Connexion / inscription : pool permanent par worker web (0 = sur le thread
+# de la requête), calculs en cours ou en attente au-delà desquels => 503
+PASSWORD_HASH_POOL_WORKERS = int(os.getenv("PASSWORD_HASH_POOL_WORKERS", 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 16))
+# Attente max d'un hachage (secondes) et valeur de Retry-After renvoyée
+PASSWORD_HASH_TIMEOUT = 10
+PASSWORD_HASH_RETRY_AFTER = 2
+# POST /user/import/ : lignes max par requête (hachage dans la requête) ;
+# au-delà => 400, passer par la commande import_users
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", 200))
+
+# Limitation de débit par seau à jetons (EnTouteQuietude83_API.throttling)
+# Scope (attribut throttle_scope des vues) => "jetons/période" ; scope absent
+# => pas de limite. Par IP : login, user_create ; par token (écritures) :
+# messages, rendezvous.
+THROTTLE_RATES = {
+    "login": os.getenv("THROTTLE_RATE_LOGIN", "20/min"),
+    "user_create": os.getenv("THROTTLE_RATE_USER_CREATE", "10/hour"),
+    "messages": os.getenv("THROTTLE_RATE_MESSAGES", "30/min"),
+    "rendezvous": os.getenv("THROTTLE_RATE_RENDEZVOUS", "10/min"),
 }
+# Seaux en mémoire du processus ; avec plusieurs workers :
+# "EnTouteQuietude83_API.throttling.CacheBucketStore" (cache THROTTLE_CACHE_ALIAS)
+THROTTLE_BACKEND = os.getenv(
+    "THROTTLE_BACKEND", "EnTouteQuietude83_API.throttling.InProcessBucketStore")
+THROTTLE_CACHE_ALIAS = "default"
+# Nombre de seaux en mémoire au-delà duquel les moins récemment utilisés
+# sont oubliés
+THROTTLE_MAX_KEYS = 10000
+
+# Schéma OpenAPI précalculé (EnTouteQuietude83_API.schema)
+# Version du code (ex. sha git) ; vide => empreinte des sources Python
+CODE_VERSION = os.getenv("CODE_VERSION", "")
+SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", BASE_DIR / "var" / "schema")
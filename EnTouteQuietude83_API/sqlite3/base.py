@@ -0,0 +1,31 @@
+from django.db.backends.sqlite3 import base
+
+# Backend SQLite "production" (settings.DB_PROFILE == "production") :
+# =====================================================================
+# Identique au backend de Django, avec deux options supplémentaires dans
+# DATABASES["default"]["OPTIONS"] :
+#  - "pragmas" : PRAGMA appliqués à chaque nouvelle connexion (WAL, ...)
+#  - "transaction_mode" : "IMMEDIATE" prend le verrou d'écriture dès le BEGIN,
+#    évitant les "database is locked" lors du passage lecture => écriture.
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        params.pop("transaction_mode", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+        if mode:
+            self.cursor().execute(f"BEGIN {mode}")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+# Lancement des tests :
+# ======================
+# Fichiers de métriques (MetricsMiddleware, écrits à chaque requête passé
+# METRICS_FLUSH_INTERVAL) dans un répertoire temporaire, pas dans var/.
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp()
+        self.metrics_override = override_settings(METRICS_DIR=self.metrics_dir)
+        self.metrics_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_override.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework import permissions, throttling
+from .metrics import THROTTLED
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+# Limitation de débit par seau à jetons (token bucket) :
+# ========================================================
+# Chaque clé (scope + IP ou token) dispose d'un seau de N jetons, rempli en
+# continu au rythme de N par période ("20/min") ; une requête consomme un
+# jeton, un seau vide => 429 + Retry-After (temps avant le prochain jeton).
+# Débits par scope : settings.THROTTLE_RATES (scope absent => pas de limite).
+# Stockage : settings.THROTTLE_BACKEND, en mémoire du processus par défaut,
+# CacheBucketStore pour partager les seaux entre workers.
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    # "20/min" => (capacité, jetons par seconde)
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / RATE_PERIODS[period[0]]
+
+
+def take_token(tokens, elapsed, capacity, refill):
+    # Renvoie (jetons restants, attente en secondes ; 0 si la requête passe).
+    tokens = min(capacity, tokens + elapsed * refill)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill
+
+
+class InProcessBucketStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clé => (jetons, instant), du moins au plus récemment utilisé
+        self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, refill):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (capacity, now))
+            tokens, wait = take_token(tokens, now - last, capacity, refill)
+            self._buckets[key] = (tokens, now)
+            # Au-delà de THROTTLE_MAX_KEYS : les seaux inutilisés depuis le
+            # plus longtemps sont oubliés (en O(1) par requête).
+            while len(self._buckets) > settings.THROTTLE_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets = OrderedDict()
+
+
+class CacheBucketStore:
+    # Seaux partagés par tous les workers via un cache Django (Redis,
+    # Memcached). Lecture puis écriture sans verrou : sous forte concurrence,
+    # quelques requêtes de plus peuvent passer (comme les throttles de DRF).
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def consume(self, key, capacity, refill):
+        now = time.time()
+        cache_key = f"throttle:{key}"
+        tokens, last = self.cache.get(cache_key, (capacity, now))
+        tokens, wait = take_token(tokens, now - last, capacity, refill)
+        self.cache.set(cache_key, (tokens, now), math.ceil(capacity / refill) + 1)
+        return wait
+
+    def clear(self):
+        # Les seaux expirent d'eux-mêmes : vidage complet réservé aux tests.
+        self.cache.clear()
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    return import_string(settings.THROTTLE_BACKEND)()
+
+
+# Throttles DRF (scope : attribut throttle_scope de la vue) :
+# -------------------------------------------------------------
+
+
+class IPBucketThrottle(throttling.BaseThrottle):
+    # Par adresse IP (vues anonymes : connexion, inscription).
+    writes_only = False
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, "throttle_scope", None)
+        rate = settings.THROTTLE_RATES.get(scope)
+        if rate is None or (self.writes_only and request.method in permissions.SAFE_METHODS):
+            return True
+        capacity, refill = parse_rate(rate)
+        wait = get_bucket_store().consume(
+            f"{scope}:{self.get_ident_key(request)}", capacity, refill)
+        if wait:
+            self.wait_seconds = wait
+            THROTTLED.inc(scope=scope)
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserBucketThrottle(IPBucketThrottle):
+    # Par token (ou par user), uniquement sur les écritures (POST, PUT...).
+    writes_only = True
+
+    def get_ident_key(self, request):
+        if request.auth is not None and hasattr(request.auth, "key"):
+            return f"token:{request.auth.key}"
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return self.get_ident(request)
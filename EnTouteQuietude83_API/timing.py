@@ -0,0 +1,39 @@
+import time
+
+
+# Mesures par requête (en-têtes Server-Timing) :
+# ================================================
+
+
+class QueryTimer:
+    # execute_wrapper : compte et chronomètre les requêtes SQL.
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def record_timing(request, name, seconds):
+    # Ajoute une étape (auth...) à l'en-tête Server-Timing de la requête.
+    request = getattr(request, "_request", request)
+    timings = getattr(request, "server_timings", None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def format_server_timing(timings, query_count):
+    parts = []
+    for name, seconds in timings.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if name == "db":
+            entry += f';desc="{query_count} queries"'
+        parts.append(entry)
+    return ", ".join(parts)
@@ -2,17 +2,24 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+from .schema import CachedSpectacularAPIView
+from .profiling import ProfileListView, ProfileDownloadView
+from .views import metrics_view
 
 app_name = "api"
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path("schema/", CachedSpectacularAPIView.as_view(), name="api-schema"),
     path("docs/", SpectacularSwaggerView.as_view(url_name="api-schema"),
          name="api-docs"),
     path("user/", include("user.urls")),
     path("availability/", include("availability.urls")),
+    path("profiles/", ProfileListView.as_view(), name="profile-list"),
+    path("profiles/<str:profile_id>/", ProfileDownloadView.as_view(),
+         name="profile-download"),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 # Environnement de développement => Stockage des images :
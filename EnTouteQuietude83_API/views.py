@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from .metrics import registry
+from .profiling import is_superuser_request
+
+
+# Métriques Prometheus (interne) :
+# GET /metrics => totaux de tous les workers, au format texte Prometheus.
+# Accès : token superuser, ou adresses METRICS_ALLOWED_IPS (scraper ; aucune
+# par défaut).
+# --------------------------------------------------------------------------
+
+
+def metrics_view(request):
+    if (request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS
+            and not is_superuser_request(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")
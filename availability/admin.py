@@ -1,20 +1,43 @@
 from django.contrib import admin
 from availability.models import Availability, RendezVous, Message
+from EnTouteQuietude83_API.paginators import CappedCountPaginator
+
+
+# Changelists en nombre de requêtes constant : relations affichées jointes
+# (list_select_related, y compris celles de __str__), widgets autocomplete /
+# raw id pour les clés étrangères volumineuses, COUNT(*) borné.
 
 
 @admin.register(Availability)
 class AvailabilityAdmin(admin.ModelAdmin):
     ordering = ["date", "heure"]
     list_display = ("date", "heure", "is_taken")
+    list_filter = ("is_taken",)
+    date_hierarchy = "date"
+    paginator = CappedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(RendezVous)
 class RendezVousAdmin(admin.ModelAdmin):
     ordering = ["availability"]
     list_display = ("user", "availability", "degree")
+    list_select_related = ("user", "availability")
+    autocomplete_fields = ("user",)
+    raw_id_fields = ("availability",)
+    date_hierarchy = "availability__date"
+    paginator = CappedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     ordering = ["date_time"]
     list_display = ("rdv", "sender", "date_time")
+    # RendezVous.__str__ affiche l'étudiant et le créneau.
+    list_select_related = ("rdv__user", "rdv__availability", "sender")
+    autocomplete_fields = ("sender",)
+    raw_id_fields = ("rdv",)
+    date_hierarchy = "date_time"
+    paginator = CappedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,421 @@
+import asyncio
+import contextlib
+import datetime
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from availability.models import Availability, RendezVous, Message
+
+User = get_user_model()
+
+BENCH_PASSWORD = "Benchmark123"
+
+
+# Outils de benchmark (commandes benchmark_*) :
+# ===============================================
+# Les requêtes passent par les vraies routes et toute la pile Django/DRF
+# (APIClient), sans serveur HTTP : on mesure le coût applicatif.
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    # Base jetable : fichier temporaire créé comme une base de test (les
+    # threads clients partagent la même base, ce que :memory: ne permet pas).
+    setup_test_environment()
+    directory = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+        teardown_test_environment()
+
+
+def seed_dataset(students=50, slots=2000, messages_per_rdv=20, booked_ratio=0.5):
+    # Un seul hachage pour tous les comptes (le hachage n'est pas mesuré ici).
+    password = make_password(BENCH_PASSWORD)
+    users = User.objects.bulk_create([
+        User(email=f"eleve{i}@bench.local", first_name="Eleve",
+             last_name=str(i), password=password)
+        for i in range(students)
+    ])
+    admin = User.objects.create_superuser(
+        email="admin@bench.local", first_name="Admin", last_name="Bench",
+        password=BENCH_PASSWORD)
+    tokens = Token.objects.bulk_create([
+        Token(user=user, key=Token.generate_key()) for user in [*users, admin]
+    ])
+
+    start = datetime.date.today()
+    booked = int(slots * booked_ratio)
+    availabilities = Availability.objects.bulk_create([
+        Availability(date=start + datetime.timedelta(days=i // 8),
+                     heure=datetime.time(9 + i % 8), is_taken=i < booked)
+        for i in range(slots)
+    ], batch_size=500)
+    rendezvous = RendezVous.objects.bulk_create([
+        RendezVous(user=users[i % students], degree="CM1",
+                   availability=availabilities[i])
+        for i in range(booked)
+    ], batch_size=500)
+    now = timezone.now()
+    Message.objects.bulk_create([
+        Message(rdv=rdv, sender=rdv.user, content=f"Message {j}",
+                date_time=now - datetime.timedelta(minutes=messages_per_rdv - j))
+        for rdv in rendezvous for j in range(messages_per_rdv)
+    ], batch_size=500)
+
+    rdvs_by_user = defaultdict(list)
+    for rdv in rendezvous:
+        rdvs_by_user[rdv.user_id].append(rdv.id)
+    return {
+        "students": [
+            {"id": user.id, "email": user.email, "token": token.key,
+             "rdv_ids": rdvs_by_user[user.id]}
+            for user, token in zip(users, tokens)
+        ],
+        "admin": {"id": admin.id, "email": admin.email, "token": tokens[-1].key},
+        "free_slots": deque(avail.id for avail in availabilities[booked:]),
+    }
+
+
+def authenticated_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+    return client
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, ok=True, queries=None):
+        with self._lock:
+            self.samples[name].append(seconds)
+            if queries is not None:
+                self.queries[name].append(queries)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, elapsed):
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            queries = self.queries[name]
+            results[name] = {
+                "requests": len(samples),
+                "errors": self.errors[name],
+                "throughput": round(len(samples) / elapsed, 1),
+                "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+            }
+        return results
+
+
+def run_workers(workers, duration, task):
+    # Lance `workers` threads qui appellent task(index, recorder) jusqu'à
+    # l'échéance (ou jusqu'à ce que task renvoie False) ; chaque thread
+    # ferme sa connexion à la base en sortant.
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    barrier = threading.Barrier(workers)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            while time.perf_counter() < deadline:
+                if task(index, recorder) is False:
+                    break
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def timed_request(recorder, name, method, *args, expected=(200,), **kwargs):
+    # Les requêtes SQL sont comptées sur la connexion du thread courant.
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        try:
+            res = method(*args, **kwargs)
+            ok = res.status_code in expected
+        except Exception:
+            res, ok = None, False
+        elapsed = time.perf_counter() - start
+    recorder.record(name, elapsed, ok, len(queries.captured_queries))
+    return res
+
+
+# Clients ASGI (benchmark_asgi) : requêtes envoyées à l'application ASGI
+# de Django (EnTouteQuietude83_API.asgi) dans la boucle d'événements, comme
+# par un serveur ASGI (uvicorn, daphne) ; chaque requête a son contexte
+# "thread-sensitive", comme en production.
+# -------------------------------------------------------------------------
+
+
+async def asgi_get(application, url, headers=None):
+    # GET de `url` ("/chemin/?requête") ; renvoie le code de statut.
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver"),
+                    *((name.lower().encode(), value.encode())
+                      for name, value in (headers or {}).items())],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+    }
+    messages = []
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if request_sent:
+            # Client toujours connecté (pas de http.disconnect).
+            await asyncio.Future()
+        request_sent = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]["status"]
+
+
+def run_async_workers(workers, duration, task):
+    # Équivalent de run_workers : `workers` coroutines concurrentes dans une
+    # seule boucle, qui attendent task(index, recorder) jusqu'à l'échéance.
+    recorder = Recorder()
+
+    async def main():
+        deadline = time.perf_counter() + duration
+
+        async def worker(index):
+            while time.perf_counter() < deadline:
+                if await task(index, recorder) is False:
+                    break
+
+        await asyncio.gather(*(worker(i) for i in range(workers)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return recorder.summary(time.perf_counter() - start)
+
+
+async def timed_asgi_request(recorder, name, application, url, headers, expected=(200,)):
+    # Requêtes SQL non comptées : elles s'exécutent dans d'autres threads.
+    start = time.perf_counter()
+    try:
+        ok = await asgi_get(application, url, headers) in expected
+    except Exception:
+        ok = False
+    recorder.record(name, time.perf_counter() - start, ok)
+
+
+# Scénario réservation + messagerie (benchmark_db_profile) :
+# -----------------------------------------------------------
+
+
+def booking_and_messaging_task(dataset, write_ratio=0.3):
+    rdv_url = reverse("availability:rendezvous-list")
+    message_url = reverse("availability:messages-list")
+    lock = threading.Lock()
+    clients = {}
+
+    def task(index, recorder):
+        student = dataset["students"][index % len(dataset["students"])]
+        client = clients.get(index)
+        if client is None:
+            client = clients[index] = authenticated_client(student["token"])
+        rdv_id = random.choice(student["rdv_ids"]) if student["rdv_ids"] else None
+
+        if random.random() < write_ratio:
+            if rdv_id is not None and random.random() < 0.7:
+                timed_request(recorder, "write:message", client.post, message_url, {
+                    "rdv": rdv_id, "sender": student["id"], "content": "Bonjour",
+                    "date_time": timezone.now().isoformat()}, expected=(201,))
+            else:
+                with lock:
+                    slot_id = dataset["free_slots"].popleft() if dataset["free_slots"] else None
+                if slot_id is None:
+                    return
+                res = timed_request(recorder, "write:booking", client.post, rdv_url, {
+                    "user": student["id"], "degree": "CM1",
+                    "availability": slot_id}, expected=(201, 409))
+                if res is not None and res.status_code == 201:
+                    student["rdv_ids"].append(res.data["id"])
+        elif rdv_id is not None and random.random() < 0.5:
+            timed_request(recorder, "read:messages", client.get,
+                          message_url, {"rdv_id": rdv_id})
+        else:
+            timed_request(recorder, "read:rendezvous", client.get,
+                          rdv_url, {"availability_id": random.randint(1, 500)})
+
+    return task
+
+
+# Scénarios par endpoint (benchmark_api) :
+# -----------------------------------------
+
+
+class Scenario:
+
+    def __init__(self, name, route, method="get", role="student", args=None,
+                 params=None, data=None, expected=(200,)):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.role = role
+        # args/params/data : fonctions (dataset, student, lock) => valeur ;
+        # None en retour de data signifie "plus rien à envoyer".
+        self.args = args
+        self.params = params
+        self.data = data
+        self.expected = expected
+
+
+def _own_rdv(dataset, student, lock):
+    return [random.choice(student["rdv_ids"])] if student["rdv_ids"] else [dataset["any_rdv_id"]]
+
+
+def _free_slot_booking(dataset, student, lock):
+    with lock:
+        if not dataset["free_slots"]:
+            return None
+        slot_id = dataset["free_slots"].popleft()
+    return {"user": student["id"], "degree": "CM1", "availability": slot_id}
+
+
+def _new_account(dataset, student, lock):
+    with lock:
+        dataset["signups"] += 1
+        number = dataset["signups"]
+    return {"email": f"inscrit{number}@bench.local", "first_name": "Inscrit",
+            "last_name": str(number), "password": BENCH_PASSWORD}
+
+
+SCENARIOS = [
+    Scenario("user-login", "user:user-login", "post", role="anonymous",
+             data=lambda dataset, student, lock: {
+                 "email": student["email"], "password": BENCH_PASSWORD}),
+    Scenario("user-create", "user:user-create", "post", role="anonymous",
+             data=_new_account, expected=(201,)),
+    Scenario("user-me", "user:user-update"),
+    Scenario("user-list", "user:user-list", role="admin"),
+    Scenario("availability-list", "availability:availability-list"),
+    Scenario("availability-list-filtered", "availability:availability-list",
+             params=lambda dataset, student, lock: {"is_taken": "false"}),
+    Scenario("superuser-availability-list",
+             "availability:superuser-availability-list", role="admin"),
+    Scenario("rendezvous-list", "availability:rendezvous-list"),
+    Scenario("rendezvous-detail", "availability:rendezvous-detail",
+             args=_own_rdv),
+    Scenario("rendezvous-create", "availability:rendezvous-list", "post",
+             data=_free_slot_booking, expected=(201, 409)),
+    Scenario("messages-list", "availability:messages-list",
+             params=lambda dataset, student, lock: {
+                 "rdv_id": _own_rdv(dataset, student, lock)[0]}),
+    Scenario("messages-create", "availability:messages-list", "post",
+             data=lambda dataset, student, lock: {
+                 "rdv": _own_rdv(dataset, student, lock)[0], "sender": student["id"],
+                 "content": "Bonjour", "date_time": timezone.now().isoformat()},
+             expected=(201,)),
+]
+
+
+def scenario_task(dataset, scenario):
+    lock = threading.Lock()
+    clients = {}
+    dataset.setdefault("signups", 0)
+    dataset.setdefault("any_rdv_id", next(
+        (rdv_id for student in dataset["students"] for rdv_id in student["rdv_ids"]), 0))
+
+    def task(index, recorder):
+        student = dataset["students"][index % len(dataset["students"])]
+        client = clients.get(index)
+        if client is None:
+            if scenario.role == "admin":
+                client = authenticated_client(dataset["admin"]["token"])
+            elif scenario.role == "student":
+                client = authenticated_client(student["token"])
+            else:
+                client = APIClient()
+            clients[index] = client
+
+        args = scenario.args(dataset, student, lock) if scenario.args else None
+        url = reverse(scenario.route, args=args)
+        if scenario.method == "get":
+            params = scenario.params(dataset, student, lock) if scenario.params else None
+            timed_request(recorder, scenario.name, client.get, url, params,
+                          expected=scenario.expected)
+        else:
+            data = scenario.data(dataset, student, lock) if scenario.data else {}
+            if data is None:
+                return False
+            timed_request(recorder, scenario.name, getattr(client, scenario.method),
+                          url, data, expected=scenario.expected)
+
+    return task
+
+
+# Comparaison avec une référence (baseline JSON) :
+# -------------------------------------------------
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if current["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name} : p95 {current['p95_ms']} ms > {reference['p95_ms']} ms")
+        if current["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name} : débit {current['throughput']} req/s < {reference['throughput']} req/s")
+        if (current["queries_per_request"] or 0) > (reference["queries_per_request"] or 0):
+            regressions.append(
+                f"{name} : {current['queries_per_request']} requêtes SQL/req "
+                f"> {reference['queries_per_request']}")
+        if current["errors"] > reference["errors"]:
+            regressions.append(
+                f"{name} : {current['errors']} erreurs > {reference['errors']}")
+    return regressions
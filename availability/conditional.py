@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import time
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+COLLECTION_VERSION_PREFIX = "collection_version:"
+COLLECTION_VERSION_CACHE_ALIAS = "collections"
+
+
+# Version par collection (GET conditionnels, ETag / Last-Modified) :
+# ====================================================================
+# Chaque écriture sur une collection (signaux, ou appel explicite après
+# QuerySet.update / bulk_create, qui n'en émettent pas) remplace sa version
+# une fois la transaction validée : une réponse n'est jamais associée à une
+# version plus récente que les données lues. La version est gardée dans le
+# cache "collections" (partagé entre workers : voir CACHES), jamais dans le
+# cache du processus, sans quoi un worker renverrait 304 sur des données
+# modifiées par un autre. Last-Modified est l'heure de l'écriture, à la
+# seconde près (HTTP) : deux écritures dans la même seconde ne sont
+# distinguées que par l'ETag.
+
+
+def version_cache():
+    return caches[COLLECTION_VERSION_CACHE_ALIAS]
+
+
+def collection_version(name):
+    # (jeton, timestamp) ; cache vide (redémarrage...) => nouvelle version.
+    version = version_cache().get(f"{COLLECTION_VERSION_PREFIX}{name}")
+    if version is None:
+        version = new_version()
+        if not version_cache().add(f"{COLLECTION_VERSION_PREFIX}{name}", version, None):
+            version = version_cache().get(f"{COLLECTION_VERSION_PREFIX}{name}", version)
+    return version
+
+
+async def acollection_version(name):
+    # Vues async : même version, API async du cache.
+    version = await version_cache().aget(f"{COLLECTION_VERSION_PREFIX}{name}")
+    if version is None:
+        version = new_version()
+        if not await version_cache().aadd(f"{COLLECTION_VERSION_PREFIX}{name}", version, None):
+            version = await version_cache().aget(f"{COLLECTION_VERSION_PREFIX}{name}", version)
+    return version
+
+
+def new_version():
+    # (jeton, timestamp) ; timestamp jamais dans le futur.
+    return uuid.uuid4().hex, int(time.time())
+
+
+_local = threading.local()
+
+
+def _flush_bumps():
+    # Premier callback exécuté à la validation : un seul set_many pour
+    # toutes les collections quel que soit le nombre de signaux, les
+    # suivants n'ont plus rien à faire. Une collection laissée par une
+    # transaction annulée est changée à la validation suivante : version
+    # inutilement changée (un 200 au lieu d'un 304), jamais une version
+    # périmée.
+    names, _local.pending = getattr(_local, "pending", set()), set()
+    if names:
+        version_cache().set_many(
+            {f"{COLLECTION_VERSION_PREFIX}{name}": new_version() for name in sorted(names)}, None)
+
+
+def bump_collections(*names):
+    if not hasattr(_local, "pending"):
+        _local.pending = set()
+    _local.pending.update(names)
+    transaction.on_commit(_flush_bumps)
+
+
+def validators(versions, request, renderer_format):
+    # La réponse dépend aussi des filtres, du curseur, du format et du user.
+    key = "|".join([
+        *(token for token, _ in versions), request.get_full_path(),
+        renderer_format, str(request.user.pk),
+    ])
+    etag = f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+    return etag, max(timestamp for _, timestamp in versions)
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+class ConditionalListMixin:
+    # Listes des viewsets : 304 Not Modified avant toute requête principale
+    # et toute sérialisation quand la collection n'a pas changé.
+    collections = ()
+
+    def list_validators(self, request):
+        versions = [collection_version(name) for name in self.collections]
+        return validators(versions, request, request.accepted_renderer.format)
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.list_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+async def conditional_list(request, collections, build_response):
+    # Équivalent de ConditionalListMixin pour les vues async (JSON seul).
+    versions = [await acollection_version(name) for name in collections]
+    etag, last_modified = validators(versions, request, "json")
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await build_response()
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,154 @@
+import abc
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Pub/sub des nouveaux messages (flux Server-Sent Events) :
+# ==========================================================
+# Le backend est choisi par settings.MESSAGE_BROKER_BACKEND. InProcessBroker
+# ne diffuse qu'aux flux ouverts dans le même processus : pour plusieurs
+# workers, fournir un backend (Redis pub/sub...) avec la même interface.
+
+
+class BaseMessageBroker(abc.ABC):
+
+    # Appelable depuis du code synchrone (vues DRF).
+    @abc.abstractmethod
+    def publish(self, rdv_id, event_id, data):
+        ...
+
+    # Appelé depuis la boucle asyncio du flux, renvoie une Subscription.
+    @abc.abstractmethod
+    def subscribe(self, rdv_id):
+        ...
+
+    @abc.abstractmethod
+    def unsubscribe(self, subscription):
+        ...
+
+
+class Subscription:
+
+    def __init__(self, broker, rdv_id, loop, max_size):
+        self.broker = broker
+        self.rdv_id = rdv_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        # Client trop lent : on coupe le flux, il se reconnectera avec
+        # Last-Event-ID et rattrapera les messages depuis la base.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker(BaseMessageBroker):
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, rdv_id, event_id, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(rdv_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.put, (event_id, data))
+            except RuntimeError:
+                # Boucle fermée : flux abandonné sans avoir été refermé.
+                self.unsubscribe(subscription)
+
+    def subscribe(self, rdv_id):
+        subscription = Subscription(
+            self, rdv_id, asyncio.get_running_loop(), self.max_queue_size)
+        with self._lock:
+            self._subscriptions[rdv_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.rdv_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.rdv_id]
+
+    def subscriber_count(self, rdv_id):
+        with self._lock:
+            return len(self._subscriptions.get(rdv_id, ()))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.MESSAGE_BROKER_BACKEND)()
+
+
+# Limite du nombre de flux ouverts (par processus) :
+# ---------------------------------------------------
+
+
+class StreamLimiter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_streams = 0
+
+    def try_acquire(self, limit):
+        with self._lock:
+            if self.open_streams >= limit:
+                return False
+            self.open_streams += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open_streams -= 1
+
+    def acquire_slot(self, limit):
+        # StreamSlot, ou None si la limite est atteinte.
+        if not self.try_acquire(limit):
+            return None
+        return StreamSlot(self)
+
+
+class StreamSlot:
+    # Place acquise, rendue une seule fois quel que soit le chemin : fin du
+    # flux, fermeture de la réponse, réponse abandonnée sans être lue.
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._lock = threading.Lock()
+        self.released = False
+
+    def release(self):
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+        self._limiter.release()
+
+
+stream_limiter = StreamLimiter()
+
+
+def format_event(event_id, data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event_id}\nevent: message\ndata: {payload}\n\n"
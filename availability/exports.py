@@ -0,0 +1,118 @@
+import csv
+import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from availability.models import RendezVous, Message
+
+EXPORT_CHUNK_SIZE = 2000
+OUTPUT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# Exports en flux (CSV / NDJSON) des rendez-vous et des messages :
+# ==================================================================
+# Lignes lues par paquets (QuerySet.iterator) sous forme de tuples
+# (values_list, sans instancier de modèles) et écrites au fil de l'eau :
+# la mémoire du worker reste constante quel que soit le volume exporté.
+
+
+class Export:
+
+    def __init__(self, model, columns, date_field, ordering, datetime_field=False):
+        self.model = model
+        # (nom de colonne, champ ORM)
+        self.columns = columns
+        self.date_field = date_field
+        self.ordering = ordering
+        # Champ DateTimeField : bornes converties en intervalle [début, fin[
+        # (l'index sur le champ reste utilisable, contrairement à __date).
+        self.datetime_field = datetime_field
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def queryset(self, date_from=None, date_to=None):
+        queryset = self.model.objects.order_by(*self.ordering)
+        if self.datetime_field:
+            if date_from is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__gte": day_start(date_from)})
+            if date_to is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__lt": day_start(
+                    date_to + datetime.timedelta(days=1))})
+        else:
+            if date_from is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__gte": date_from})
+            if date_to is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__lte": date_to})
+        return queryset.values_list(*(field for _, field in self.columns))
+
+    def rows(self, date_from=None, date_to=None):
+        return self.queryset(date_from, date_to).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+EXPORTS = {
+    "rendezvous": Export(
+        RendezVous,
+        [("id", "id"), ("date", "availability__date"), ("heure", "availability__heure"),
+         ("degree", "degree"), ("availability_id", "availability_id"),
+         ("user_id", "user_id"), ("user_email", "user__email"),
+         ("user_first_name", "user__first_name"), ("user_last_name", "user__last_name")],
+        date_field="availability__date",
+        ordering=["availability__date", "availability__heure", "id"]),
+    "messages": Export(
+        Message,
+        [("id", "id"), ("rdv_id", "rdv_id"), ("date_time", "date_time"),
+         ("sender_id", "sender_id"), ("sender_email", "sender__email"),
+         ("content", "content")],
+        date_field="date_time",
+        ordering=["date_time", "id"], datetime_field=True),
+}
+
+
+def day_start(day):
+    # Minuit du jour dans le fuseau courant (TIME_ZONE), comme __date.
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class Echo:
+    # Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire.
+
+    def write(self, value):
+        return value
+
+
+# Texte commençant par l'un de ces caractères : interprété comme une
+# formule par les tableurs (injection CSV) => préfixé par une apostrophe.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_cell(value, encoder):
+    # Dates au même format ISO que l'export NDJSON.
+    if hasattr(value, "isoformat"):
+        return encoder.default(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(header, rows):
+    encoder = DjangoJSONEncoder()
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_cell(value, encoder) for value in row])
+
+
+def ndjson_lines(header, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + "\n"
+
+
+def export_lines(kind, output, date_from=None, date_to=None):
+    export = EXPORTS[kind]
+    lines = csv_lines if output == "csv" else ndjson_lines
+    return lines(export.header, export.rows(date_from, date_to))
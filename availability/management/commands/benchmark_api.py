@@ -0,0 +1,81 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from availability.benchmarks import SCENARIOS, benchmark_database, compare_to_baseline, run_workers, scenario_task, seed_dataset
+
+
+# Benchmark HTTP de bout en bout de tous les endpoints de l'API :
+#   python manage.py benchmark_api --output bench/baseline.json
+#   python manage.py benchmark_api --compare bench/baseline.json
+# Base jetable (benchmark_database), jeu de données réaliste, clients
+# simulés concurrents sur les vraies routes.
+class Command(BaseCommand):
+    help = "Benchmark de bout en bout des endpoints (latences p50/p95/p99, débit, requêtes SQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4,
+                            help="Clients simulés concurrents.")
+        parser.add_argument("--duration", type=float, default=5.0,
+                            help="Durée de mesure par endpoint (secondes).")
+        parser.add_argument("--students", type=int, default=50)
+        parser.add_argument("--slots", type=int, default=2000)
+        parser.add_argument("--messages-per-rdv", type=int, default=20)
+        parser.add_argument("--only", nargs="+", metavar="ENDPOINT",
+                            help="Endpoints à mesurer (noms des scénarios).")
+        parser.add_argument("--output", help="Fichier JSON où écrire les résultats.")
+        parser.add_argument("--compare", metavar="BASELINE",
+                            help="Fichier JSON de référence : échec en cas de régression.")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Écart relatif toléré sur p95 et débit (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options["only"]:
+            unknown = set(options["only"]) - {scenario.name for scenario in SCENARIOS}
+            if unknown:
+                raise CommandError(f"Endpoints inconnus : {', '.join(sorted(unknown))}")
+            scenarios = [s for s in SCENARIOS if s.name in options["only"]]
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)["endpoints"]
+
+        results = self.run(scenarios, options)
+        self.print_results(results)
+
+        if options["output"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+            with open(options["output"], "w") as file:
+                json.dump({"threads": options["threads"], "duration": options["duration"],
+                           "endpoints": results}, file, indent=2)
+            self.stdout.write(f"Résultats écrits dans {options['output']}")
+
+        if baseline is not None:
+            regressions = compare_to_baseline(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Régressions détectées :\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence."))
+
+    def run(self, scenarios, options):
+        # Sans limitation de débit : on mesure le coût des endpoints.
+        with benchmark_database(), override_settings(THROTTLE_RATES={}):
+            dataset = seed_dataset(options["students"], options["slots"],
+                                   options["messages_per_rdv"])
+            results = {}
+            for scenario in scenarios:
+                self.stderr.write(f"- {scenario.name}")
+                results.update(run_workers(options["threads"], options["duration"],
+                                           scenario_task(dataset, scenario)))
+            return results
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{'endpoint':<30}{'req':>7}{'err':>5}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL/req':>9}")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<30}{stats['requests']:>7}{stats['errors']:>5}{stats['throughput']:>9}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+                f"{stats['queries_per_request'] if stats['queries_per_request'] is not None else '-':>9}")
@@ -0,0 +1,110 @@
+import random
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from availability.benchmarks import authenticated_client, benchmark_database, run_async_workers, run_workers, seed_dataset, timed_asgi_request, timed_request
+from EnTouteQuietude83_API.asgi import application
+
+# Lectures comparées (mêmes données sur les deux routes) :
+# nom => (route DRF, route async)
+READ_ROUTES = {
+    "availability": ("availability:availability-list", "availability:async-availability-list"),
+    "messages": ("availability:messages-list", "availability:async-messages-list"),
+    "me": ("user:user-update", "user:user-async-me"),
+}
+
+# mode => (serveur, routes)
+MODES = {
+    "wsgi": ("wsgi", 0),
+    "asgi-drf": ("asgi", 0),
+    "asgi-async": ("asgi", 1),
+}
+
+
+def read_url(name, routes, student):
+    url = reverse(READ_ROUTES[name][routes])
+    if name == "messages":
+        url += f"?rdv_id={random.choice(student['rdv_ids'])}"
+    return url
+
+
+def read_names(student):
+    return [name for name in READ_ROUTES if name != "messages" or student["rdv_ids"]]
+
+
+# Clients de lecture concurrents (polling), même jeu de données :
+#   wsgi       : vues DRF, worker WSGI à --wsgi-threads threads (les clients
+#                en surnombre attendent un thread libre, attente comprise) ;
+#   asgi-drf   : vues DRF servies par l'application ASGI (un thread par requête) ;
+#   asgi-async : routes /async/ servies par l'application ASGI.
+# Un seul processus dans tous les cas, sans serveur HTTP (coût applicatif).
+#   python manage.py benchmark_asgi --clients 1 16 64 --duration 5
+class Command(BaseCommand):
+    help = "Compare le débit et les latences des lectures sous WSGI et sous ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64],
+                            help="Nombres de clients concurrents mesurés.")
+        parser.add_argument("--duration", type=float, default=5.0,
+                            help="Durée de mesure par mode et par nombre de clients (secondes).")
+        parser.add_argument("--modes", nargs="+", default=list(MODES), metavar="MODE")
+        parser.add_argument("--wsgi-threads", type=int, default=4,
+                            help="Threads du worker WSGI (mode wsgi).")
+        parser.add_argument("--students", type=int, default=50)
+        parser.add_argument("--slots", type=int, default=2000)
+        parser.add_argument("--messages-per-rdv", type=int, default=20)
+
+    def handle(self, *args, **options):
+        unknown = set(options["modes"]) - set(MODES)
+        if unknown:
+            raise CommandError(f"Modes inconnus : {', '.join(sorted(unknown))}")
+
+        with benchmark_database(), override_settings(THROTTLE_RATES={}):
+            dataset = seed_dataset(options["students"], options["slots"],
+                                   options["messages_per_rdv"])
+            self.stdout.write(
+                f"{'mode':<12}{'clients':>8}{'lecture':>14}{'req':>8}{'err':>5}"
+                f"{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            for clients in options["clients"]:
+                for mode in options["modes"]:
+                    results = self.run(mode, clients, options, dataset)
+                    self.print_results(mode, clients, results)
+
+    def run(self, mode, clients, options, dataset):
+        server, routes = MODES[mode]
+        students = dataset["students"]
+        if server == "wsgi":
+            http_clients = {}
+            worker_threads = threading.Semaphore(options["wsgi_threads"])
+
+            def serve(client, url):
+                with worker_threads:
+                    return client.get(url)
+
+            def task(index, recorder):
+                student = students[index % len(students)]
+                client = http_clients.get(index)
+                if client is None:
+                    client = http_clients[index] = authenticated_client(student["token"])
+                name = random.choice(read_names(student))
+                timed_request(recorder, name, serve, client, read_url(name, routes, student))
+
+            return run_workers(clients, options["duration"], task)
+
+        async def async_task(index, recorder):
+            student = students[index % len(students)]
+            name = random.choice(read_names(student))
+            await timed_asgi_request(
+                recorder, name, application, read_url(name, routes, student),
+                {"Authorization": f"Token {student['token']}"})
+
+        return run_async_workers(clients, options["duration"], async_task)
+
+    def print_results(self, mode, clients, results):
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{mode:<12}{clients:>8}{name:>14}{stats['requests']:>8}{stats['errors']:>5}"
+                f"{stats['throughput']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}")
+        total = sum(stats["throughput"] for stats in results.values())
+        self.stdout.write(f"{mode:<12}{clients:>8}{'total':>14}{'':>13}{total:>9.1f}")
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+from availability.benchmarks import booking_and_messaging_task, run_workers, seed_dataset
+
+PROFILES = ("default", "production")
+
+
+# Compare le débit lecture/écriture des endpoints de réservation et de
+# messagerie avec et sans le profil SQLite de production (DB_PROFILE) :
+#   python manage.py benchmark_db_profile --threads 8 --duration 10
+# Chaque profil est mesuré dans un sous-processus, sur une base fichier neuve.
+class Command(BaseCommand):
+    help = "Benchmark des endpoints réservation/messages avec et sans DB_PROFILE=production."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Durée de mesure par profil (secondes).")
+        parser.add_argument("--write-ratio", type=float, default=0.3)
+        parser.add_argument("--profile", choices=PROFILES,
+                            help="Ne mesurer qu'un profil.")
+        parser.add_argument("--child", action="store_true",
+                            help="(interne) mesure dans ce processus.")
+
+    def handle(self, *args, **options):
+        if options["child"]:
+            return self.run_child(options)
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in [options["profile"]] if options["profile"] else PROFILES:
+                env = {**os.environ, "DB_NAME": os.path.join(directory, f"{profile}.sqlite3")}
+                env.pop("DB_PROFILE", None)
+                if profile == "production":
+                    env["DB_PROFILE"] = "production"
+                process = subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / "manage.py"),
+                     "benchmark_db_profile", "--child",
+                     "--threads", str(options["threads"]),
+                     "--duration", str(options["duration"]),
+                     "--write-ratio", str(options["write_ratio"])],
+                    env=env, capture_output=True, text=True)
+                if process.returncode != 0:
+                    raise CommandError(f"Profil {profile} : échec\n{process.stderr}")
+                results[profile] = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.print_results(results)
+
+    def run_child(self, options):
+        if not os.getenv("DB_NAME"):
+            raise CommandError("--child exige DB_NAME (base jetable).")
+        setup_test_environment()
+        call_command("migrate", verbosity=0)
+        dataset = seed_dataset()
+        with override_settings(THROTTLE_RATES={}):
+            summary = run_workers(
+                options["threads"], options["duration"],
+                booking_and_messaging_task(dataset, options["write_ratio"]))
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(json.dumps({
+            "engine": settings.DATABASES["default"]["ENGINE"],
+            "journal_mode": journal_mode,
+            "endpoints": summary,
+        }))
+
+    def print_results(self, results):
+        for profile, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\nProfil {profile} ({result['engine']}, journal_mode={result['journal_mode']})"))
+            self.stdout.write(
+                f"{'opération':<18}{'req':>7}{'erreurs':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            for name, stats in result["endpoints"].items():
+                self.stdout.write(
+                    f"{name:<18}{stats['requests']:>7}{stats['errors']:>9}"
+                    f"{stats['throughput']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}")
+
+        if set(PROFILES) <= set(results):
+            self.stdout.write(self.style.MIGRATE_HEADING("\nGain production / default (req/s)"))
+            default, production = (results[p]["endpoints"] for p in PROFILES)
+            for name in sorted(set(default) & set(production)):
+                ratio = production[name]["throughput"] / max(default[name]["throughput"], 0.1)
+                self.stdout.write(f"{name:<18}x{ratio:.2f}")
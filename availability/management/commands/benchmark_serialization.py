@@ -0,0 +1,64 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from availability.benchmarks import benchmark_database, seed_dataset
+from availability.models import Availability, RendezVous, Message
+from availability.serializers import AvailabilitySerializer, RendezVousSerializer, MessageSerializer
+from availability.serializers import AvailabilityRowSerializer, RendezVousRowSerializer, MessageRowSerializer
+from user.serializers import UserSerializer, UserRowSerializer
+
+User = get_user_model()
+
+# (nom, queryset des vues, serializer DRF, version compilée)
+ENDPOINTS = (
+    ("availability", lambda: Availability.objects.all(),
+     AvailabilitySerializer, AvailabilityRowSerializer),
+    ("rendezvous", lambda: RendezVous.objects.select_related("availability", "user"),
+     RendezVousSerializer, RendezVousRowSerializer),
+    ("messages", lambda: Message.objects.select_related("sender"),
+     MessageSerializer, MessageRowSerializer),
+    ("users", lambda: User.objects.all(), UserSerializer, UserRowSerializer),
+)
+
+
+# Coût par ligne des listes : serializers DRF (instances de modèles) puis
+# sérialisation compilée (lignes values()), lecture en base comprise :
+#   python manage.py benchmark_serialization --slots 4000 --repeat 5
+class Command(BaseCommand):
+    help = "Compare le coût par ligne des listes : serializers DRF / sérialisation compilée."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--slots", type=int, default=4000)
+        parser.add_argument("--messages-per-rdv", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="Mesures par endpoint et par mode (meilleure retenue).")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seed_dataset(students=options["students"], slots=options["slots"],
+                         messages_per_rdv=options["messages_per_rdv"])
+            # Même contexte que les vues (URLs absolues des images).
+            context = {"request": Request(APIRequestFactory().get("/"))}
+            self.stdout.write(
+                f"{'endpoint':<14}{'lignes':>8}{'DRF µs/ligne':>15}{'compilé µs/ligne':>19}{'gain':>8}")
+            for name, queryset, serializer_class, row_serializer_class in ENDPOINTS:
+                rows = queryset().count()
+                drf = self.best(options["repeat"], lambda: serializer_class(
+                    list(queryset()), many=True, context=context).data)
+                row_serializer = row_serializer_class(context=context)
+                compiled = self.best(options["repeat"], lambda: row_serializer.render(
+                    list(queryset().values(*row_serializer.columns()))))
+                self.stdout.write(
+                    f"{name:<14}{rows:>8}{drf / rows * 1e6:>15.2f}"
+                    f"{compiled / rows * 1e6:>19.2f}{drf / compiled:>7.1f}x")
+
+    def best(self, repeat, function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
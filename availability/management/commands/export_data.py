@@ -0,0 +1,30 @@
+import datetime
+from django.core.management.base import BaseCommand
+from availability.exports import EXPORTS, export_lines
+
+
+# Export en flux des rendez-vous ou des messages (CSV / NDJSON) :
+#   python manage.py export_data rendezvous --output csv --date-from 2023-09-01 > rdv.csv
+#   python manage.py export_data messages --output ndjson --file messages.ndjson
+class Command(BaseCommand):
+    help = "Exporte les rendez-vous ou les messages en CSV ou NDJSON (mémoire constante)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--output", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--date-from", type=datetime.date.fromisoformat,
+                            help="AAAA-MM-JJ (inclus).")
+        parser.add_argument("--date-to", type=datetime.date.fromisoformat,
+                            help="AAAA-MM-JJ (inclus).")
+        parser.add_argument("--file", help="Fichier de sortie (défaut : sortie standard).")
+
+    def handle(self, *args, **options):
+        lines = export_lines(options["kind"], options["output"],
+                             options["date_from"], options["date_to"])
+        if options["file"]:
+            with open(options["file"], "w", newline="", encoding="utf-8") as file:
+                file.writelines(lines)
+            self.stderr.write(f"Export écrit dans {options['file']}")
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,28 @@
+import glob
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from EnTouteQuietude83_API.schema import clear_schema_cache, code_fingerprint, render_schema, schema_path, write_schema_file
+
+
+# Génère le schéma OpenAPI servi par /schema/ (à lancer au déploiement) :
+#   python manage.py generate_schema
+# Les fichiers des versions précédentes du code sont supprimés.
+class Command(BaseCommand):
+    help = "Précalcule le schéma OpenAPI (YAML et JSON) pour la version courante du code."
+
+    def handle(self, *args, **options):
+        clear_schema_cache()
+        fingerprint = code_fingerprint()
+        paths = set()
+        for renderer in (OpenApiYamlRenderer(), OpenApiJsonRenderer()):
+            path = schema_path(renderer.format, fingerprint)
+            write_schema_file(path, render_schema(renderer))
+            paths.add(path)
+            self.stdout.write(f"{path} ({os.path.getsize(path)} octets)")
+
+        for path in glob.glob(os.path.join(settings.SCHEMA_CACHE_DIR, "schema-*")):
+            if path not in paths:
+                os.remove(path)
+        self.stdout.write(self.style.SUCCESS(f"Schéma généré pour la version {fingerprint}."))
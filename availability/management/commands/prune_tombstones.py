@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from availability.models import Tombstone
+from availability.sync import sync_horizon
+
+
+# Purge des pierres tombales plus anciennes que SYNC_TOMBSTONE_RETENTION_DAYS
+# (les jetons de synchronisation plus anciens reçoivent déjà 410) :
+#   python manage.py prune_tombstones   (cron quotidien)
+class Command(BaseCommand):
+    help = "Supprime les pierres tombales de synchronisation expirées."
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(
+            deleted_at__lt=sync_horizon(timezone.now())).delete()
+        self.stdout.write(
+            f"{deleted} pierre(s) tombale(s) supprimée(s) "
+            f"(conservation : {settings.SYNC_TOMBSTONE_RETENTION_DAYS} jours).")
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='rendezvous',
+            constraint=models.UniqueConstraint(fields=('availability',), name='unique_rendezvous_availability'),
+        ),
+    ]
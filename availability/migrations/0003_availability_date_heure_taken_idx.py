@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0002_rendezvous_unique_availability'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['date', 'heure', 'is_taken'], name='avail_date_heure_taken_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0003_availability_date_heure_taken_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['rdv', 'date_time'], name='message_rdv_date_time_idx'),
+        ),
+    ]
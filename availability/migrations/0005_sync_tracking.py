@@ -0,0 +1,45 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0004_message_rdv_date_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availability',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='rendezvous',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('availability', 'Disponibilité'), ('rendezvous', 'Rendez-vous'), ('message', 'Message')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('owner_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Suppression',
+                'verbose_name_plural': 'Suppressions',
+                'ordering': ['deleted_at'],
+                'indexes': [models.Index(fields=['deleted_at', 'kind'], name='tombstone_deleted_kind_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+# Table du cache "collections" (versions des listes, ETag) : créée avec
+# le schéma, sans étape createcachetable au déploiement. Nom fixe : l'effet
+# de la migration ne dépend pas du réglage CACHES au moment où elle tourne
+# (une autre LOCATION => "manage.py createcachetable" au déploiement).
+COLLECTION_VERSIONS_TABLE = "collection_versions"
+
+
+def create_cache_table(apps, schema_editor):
+    call_command("createcachetable", COLLECTION_VERSIONS_TABLE,
+                 database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availability', '0005_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 # User = get_user_model()
 
@@ -8,11 +9,19 @@ class Availability(models.Model):
     date = models.DateField()
     heure = models.TimeField()
     is_taken = models.BooleanField(default=False)
+    # Synchronisation incrémentale (availability.sync) ; QuerySet.update ne
+    # renseigne pas auto_now : le passer explicitement.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Disponibilité"
         verbose_name_plural = "Disponibilités"
         ordering = ["date", "heure"]
+        # Index couvrant pour la pagination par curseur et les filtres.
+        indexes = [
+            models.Index(fields=["date", "heure", "is_taken"],
+                         name="avail_date_heure_taken_idx"),
+        ]
 
     def __str__(self):
         return f"{self.date} à {self.heure}"
@@ -29,27 +38,58 @@ class RendezVous(models.Model):
         Availability, on_delete=models.CASCADE
     )
     # price = models.PositiveIntegerField(verbose_name="Prix")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Rendez-vous"
         verbose_name_plural = "Rendez-vous"
         ordering = ["availability"]
+        # Un créneau ne peut être réservé qu'une seule fois (garde-fou en base).
+        constraints = [
+            models.UniqueConstraint(
+                fields=["availability"], name="unique_rendezvous_availability"
+            ),
+        ]
 
     def __str__(self):
         return f"Rendez-vous pour {self.user} le {self.availability.date} à {self.availability.heure} pour un cours de niveau {self.degree}"
 
 
+# Pierres tombales des messages : enregistrées par delete() (API, admin) et
+# non par un signal, pour que la cascade SQL depuis un rendez-vous reste un
+# seul DELETE (un rendez-vous supprimé emporte ses messages côté client).
+
+
+class MessageQuerySet(models.QuerySet):
+
+    def delete(self):
+        from .sync import record_deletions
+        with transaction.atomic():
+            rows = list(self.values_list("id", "rdv__user_id"))
+            deleted = super().delete()
+            record_deletions(Tombstone.MESSAGE, rows)
+            return deleted
+
+
 class Message(models.Model):
     rdv = models.ForeignKey(RendezVous, on_delete=models.CASCADE)
     sender = models.ForeignKey(
         "user.CustomUser", on_delete=models.SET_NULL, null=True)
     content = models.TextField()
     date_time = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Message"
         verbose_name_plural = "Messages"
         ordering = ["date_time"]
+        # Index pour la lecture incrémentale d'un fil (rdv, date_time).
+        indexes = [
+            models.Index(fields=["rdv", "date_time"],
+                         name="message_rdv_date_time_idx"),
+        ]
 
     def __str__(self):
         if self.sender is None:
@@ -58,3 +98,47 @@ class Message(models.Model):
             sender_name = f"{self.sender.first_name} {self.sender.last_name}"
 
         return f"{self.rdv.availability.date} {self.rdv.availability.heure} /{sender_name} - {self.date_time}"
+
+    def delete(self, *args, **kwargs):
+        from .sync import record_deletions
+        with transaction.atomic():
+            row = (self.pk, self.rdv.user_id)
+            deleted = super().delete(*args, **kwargs)
+            record_deletions(Tombstone.MESSAGE, [row])
+            return deleted
+
+
+# Suppressions (synchronisation incrémentale) :
+# ===============================================
+# Une ligne par objet supprimé, conservée SYNC_TOMBSTONE_RETENTION_DAYS
+# jours (python manage.py prune_tombstones). owner_id : étudiant du
+# rendez-vous (rendez-vous, messages) ; vide pour les disponibilités.
+
+
+class Tombstone(models.Model):
+    AVAILABILITY = "availability"
+    RENDEZVOUS = "rendezvous"
+    MESSAGE = "message"
+    KIND_CHOICES = [
+        (AVAILABILITY, "Disponibilité"),
+        (RENDEZVOUS, "Rendez-vous"),
+        (MESSAGE, "Message"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # Pas de clé étrangère : l'étudiant peut lui-même avoir été supprimé.
+    owner_id = models.PositiveBigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Suppression"
+        verbose_name_plural = "Suppressions"
+        ordering = ["deleted_at"]
+        indexes = [
+            models.Index(fields=["deleted_at", "kind"],
+                         name="tombstone_deleted_kind_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} supprimé le {self.deleted_at}"
@@ -1,12 +1,18 @@
+import datetime
+from operator import methodcaller
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from .conditional import bump_collections
 from .models import Availability, RendezVous, Message
-from user.serializers import UserSerializer
+from user.serializers import UserSerializer, UserRowSerializer
+from EnTouteQuietude83_API.fieldsets import SparseFieldsMixin
+from EnTouteQuietude83_API.rows import Column, Nested, RowSerializer, isoformat
 
 User = get_user_model()
 
 
-class AvailabilitySerializer(serializers.ModelSerializer):
+class AvailabilitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     date = serializers.DateField(format="%d-%m-%Y")
 
     class Meta:
@@ -14,7 +20,99 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         fields = ['id', 'date', 'heure', 'is_taken']
 
 
-class RendezVousSerializer(serializers.ModelSerializer):
+# Génération de disponibilités récurrentes (modèles hebdomadaires) :
+# ===================================================================
+
+MAX_TEMPLATE_DAYS = 366
+BULK_BATCH_SIZE = 500
+
+
+class WeeklyTemplateSerializer(serializers.Serializer):
+    # 0 = lundi ... 6 = dimanche (convention de date.weekday())
+    weekday = serializers.IntegerField(min_value=0, max_value=6)
+    hours = serializers.ListField(
+        child=serializers.TimeField(), allow_empty=False)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    exclude_dates = serializers.ListField(
+        child=serializers.DateField(), required=False, default=list)
+
+    def validate(self, data):
+        if data["end_date"] < data["start_date"]:
+            raise serializers.ValidationError(
+                "La date de fin doit être postérieure à la date de début.")
+        if (data["end_date"] - data["start_date"]).days > MAX_TEMPLATE_DAYS:
+            raise serializers.ValidationError(
+                f"Un modèle ne peut pas couvrir plus de {MAX_TEMPLATE_DAYS} jours.")
+        return data
+
+
+def expand_weekly_template(template):
+    excluded = set(template["exclude_dates"])
+    offset = (template["weekday"] - template["start_date"].weekday()) % 7
+    day = template["start_date"] + datetime.timedelta(days=offset)
+    while day <= template["end_date"]:
+        if day not in excluded:
+            for heure in template["hours"]:
+                yield day, heure
+        day += datetime.timedelta(days=7)
+
+
+class RecurringAvailabilitySerializer(serializers.Serializer):
+    templates = WeeklyTemplateSerializer(many=True, allow_empty=False)
+
+    def create(self, validated_data):
+        templates = validated_data["templates"]
+        generated = [slot for template in templates
+                     for slot in expand_weekly_template(template)]
+        candidates = set(generated)
+        if not candidates:
+            return {"created": 0, "skipped": 0}
+
+        dates = [date for date, _ in candidates]
+        with transaction.atomic():
+            # Une seule requête pour connaître les créneaux déjà existants.
+            existing = set(Availability.objects.filter(
+                date__range=(min(dates), max(dates))
+            ).values_list("date", "heure"))
+            new_slots = sorted(candidates - existing)
+            Availability.objects.bulk_create(
+                [Availability(date=date, heure=heure)
+                 for date, heure in new_slots],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            # bulk_create n'émet pas de signal.
+            if new_slots:
+                bump_collections("availability")
+        return {
+            "created": len(new_slots),
+            "skipped": len(generated) - len(new_slots),
+        }
+
+    def to_representation(self, instance):
+        return instance
+
+
+# Paramètres des exports (?output=csv|ndjson&date_from=...&date_to=...)
+# "output" plutôt que "format", réservé par DRF à la négociation de contenu.
+
+
+class ExportParamsSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if "date_from" in data and "date_to" in data and data["date_to"] < data["date_from"]:
+            raise serializers.ValidationError(
+                "La date de fin doit être postérieure à la date de début.")
+        return data
+
+
+# Lectures : ?fields= / ?expand= (EnTouteQuietude83_API.fieldsets).
+
+
+class RendezVousSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     availability = serializers.PrimaryKeyRelatedField(
         queryset=Availability.objects.all())
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
@@ -25,13 +123,13 @@ class RendezVousSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['availability'] = AvailabilitySerializer(
-            instance.availability).data
-        representation["user"] = UserSerializer(instance.user).data
+        self.nested_representation(
+            representation, "availability", AvailabilitySerializer, instance.availability)
+        self.nested_representation(representation, "user", UserSerializer, instance.user)
         return representation
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sender = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
 
     class Meta:
@@ -41,5 +139,40 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation["sender"] = UserSerializer(instance.sender).data
+        self.nested_representation(representation, "sender", UserSerializer, instance.sender)
         return representation
+
+
+# Versions compilées des listes (EnTouteQuietude83_API.rows) : même JSON,
+# octet pour octet, que les serializers ci-dessus.
+# ==============================
+
+
+class AvailabilityRowSerializer(RowSerializer):
+    fields = (
+        Column("id"),
+        Column("date", convert=methodcaller("strftime", "%d-%m-%Y")),
+        Column("heure", convert=isoformat),
+        Column("is_taken"),
+    )
+
+
+class RendezVousRowSerializer(RowSerializer):
+    fields = (
+        Column("id"),
+        Nested("user", UserRowSerializer),
+        Column("degree"),
+        Nested("availability", AvailabilityRowSerializer),
+    )
+
+
+class MessageRowSerializer(RowSerializer):
+    fields = (
+        Column("id"),
+        Column("rdv"),
+        # Expéditeur supprimé : même valeur que UserSerializer(None).data.
+        Nested("sender", UserRowSerializer, null=UserSerializer(None).data),
+        Column("content"),
+        # Fuseau courant et suffixe "Z" : conversion du champ DRF.
+        Column("date_time", convert=serializers.DateTimeField().to_representation),
+    )
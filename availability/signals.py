@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .conditional import bump_collections
+from .models import Availability, RendezVous, Tombstone
+from .sync import record_deletions
+
+User = get_user_model()
+
+
+# Versions des collections (GET conditionnels) :
+# ================================================
+# La liste des rendez-vous imbrique le créneau et l'étudiant : elle change
+# aussi quand l'un d'eux est modifié.
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def availability_changed(sender, **kwargs):
+    bump_collections("availability", "rendezvous")
+
+
+@receiver(post_save, sender=RendezVous)
+@receiver(post_delete, sender=RendezVous)
+def rendezvous_changed(sender, **kwargs):
+    bump_collections("rendezvous")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, **kwargs):
+    bump_collections("rendezvous")
+
+
+# Pierres tombales (synchronisation incrémentale, availability.sync) :
+# ======================================================================
+
+
+@receiver(post_delete, sender=Availability)
+def availability_deleted(sender, instance, using, **kwargs):
+    record_deletions(Tombstone.AVAILABILITY, [(instance.pk, None)], using)
+
+
+@receiver(post_delete, sender=RendezVous)
+def rendezvous_deleted(sender, instance, using, **kwargs):
+    record_deletions(Tombstone.RENDEZVOUS, [(instance.pk, instance.user_id)], using)
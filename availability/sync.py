@@ -0,0 +1,151 @@
+import datetime
+import threading
+import weakref
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from availability.models import Availability, RendezVous, Message, Tombstone
+from availability.serializers import AvailabilitySerializer, RendezVousSerializer, MessageSerializer
+
+TOMBSTONE_BATCH_SIZE = 500
+SYNC_TOKEN_SALT = "availability.sync"
+
+
+# Synchronisation incrémentale (clients hors ligne) :
+# =====================================================
+# Le jeton de synchronisation contient l'instant de la réponse précédente ;
+# la réponse suivante ne contient que les lignes dont updated_at est
+# postérieur (index) et les pierres tombales des suppressions : le coût est
+# proportionnel aux changements, pas à la taille des tables.
+# Une transaction validée tardivement peut porter un updated_at antérieur au
+# jeton : la fenêtre est élargie de SYNC_OVERLAP_SECONDS, le client applique
+# les lignes par id (une ligne reçue deux fois est sans effet).
+
+
+class SyncTokenExpired(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Jeton de synchronisation expiré, synchronisation complète nécessaire."
+    default_code = "sync_token_expired"
+
+
+def make_sync_token(instant):
+    return signing.dumps(instant.isoformat(), salt=SYNC_TOKEN_SALT)
+
+
+def read_sync_token(token):
+    try:
+        return datetime.datetime.fromisoformat(signing.loads(token, salt=SYNC_TOKEN_SALT))
+    except (signing.BadSignature, ValueError):
+        raise exceptions.ValidationError({"token": "Jeton de synchronisation invalide."})
+
+
+def sync_horizon(now):
+    # Les pierres tombales plus anciennes peuvent avoir été purgées.
+    return now - datetime.timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def sync_changes(user, token=None):
+    now = timezone.now()
+    since = None
+    if token:
+        since = read_sync_token(token) - datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        if since < sync_horizon(now):
+            raise SyncTokenExpired()
+
+    rendezvous = RendezVous.objects.select_related("availability", "user")
+    messages = Message.objects.select_related("sender")
+    if not user.is_superuser:
+        rendezvous = rendezvous.filter(user=user)
+        messages = messages.filter(rdv__user=user)
+    sections = {
+        "availability": (Availability.objects.all(), AvailabilitySerializer, Tombstone.AVAILABILITY),
+        "rendezvous": (rendezvous, RendezVousSerializer, Tombstone.RENDEZVOUS),
+        "messages": (messages, MessageSerializer, Tombstone.MESSAGE),
+    }
+
+    data = {"token": make_sync_token(now), "full": since is None}
+    for name, (queryset, serializer_class, kind) in sections.items():
+        deleted = []
+        if since is not None:
+            queryset = queryset.filter(updated_at__gt=since)
+            deleted = deleted_ids(user, kind, since)
+        data[name] = {
+            "changed": serializer_class(queryset.order_by("updated_at", "id"), many=True).data,
+            "deleted": deleted,
+        }
+    return data
+
+
+def deleted_ids(user, kind, since):
+    tombstones = Tombstone.objects.filter(kind=kind, deleted_at__gt=since)
+    if kind != Tombstone.AVAILABILITY and not user.is_superuser:
+        tombstones = tombstones.filter(owner_id=user.pk)
+    return list(tombstones.values_list("object_id", flat=True))
+
+
+# Enregistrement des suppressions :
+# -----------------------------------
+# Les pierres tombales d'une transaction sont regroupées et insérées en un
+# bulk_create après sa validation : la suppression d'un étudiant et de tout
+# son historique reste un nombre fixe de requêtes. Un tampon par savepoint
+# (clé : savepoints actifs) : l'annulation d'un savepoint abandonne son
+# callback on_commit, et donc son tampon, sans toucher à ceux des niveaux
+# supérieurs. deleted_at est l'instant de l'insertion : toujours postérieur
+# au jeton d'une synchronisation qui ne la voyait pas encore.
+
+
+def insert_tombstones(using, rows):
+    now = timezone.now()
+    Tombstone.objects.using(using).bulk_create(
+        [Tombstone(kind=kind, object_id=object_id, owner_id=owner_id, deleted_at=now)
+         for kind, object_id, owner_id in rows],
+        batch_size=TOMBSTONE_BATCH_SIZE)
+
+
+class TombstoneBuffer:
+
+    def __init__(self, using, key):
+        self.using = using
+        self.key = key
+        self.rows = []
+
+    def flush(self):
+        if _buffers().get(self.key) is self:
+            del _buffers()[self.key]
+        insert_tombstones(self.using, self.rows)
+
+
+_local = threading.local()
+
+
+def _buffers():
+    # Références faibles : seul le callback on_commit garde un tampon en vie ;
+    # un callback abandonné (rollback) libère son tampon, et sa clé.
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = weakref.WeakValueDictionary()
+    return buffers
+
+
+def current_buffer(using):
+    connection = transaction.get_connection(using)
+    key = (using, tuple(connection.savepoint_ids))
+    buffer = _buffers().get(key)
+    if buffer is None:
+        buffer = _buffers()[key] = TombstoneBuffer(using, key)
+        transaction.on_commit(buffer.flush, using=using)
+    return buffer
+
+
+def record_deletions(kind, rows, using="default"):
+    # rows : [(id de l'objet supprimé, id de l'étudiant propriétaire ou None)]
+    rows = [(kind, object_id, owner_id) for object_id, owner_id in rows]
+    if not rows:
+        return
+    if not transaction.get_connection(using).in_atomic_block:
+        # Hors transaction : la suppression est déjà validée.
+        insert_tombstones(using, rows)
+        return
+    current_buffer(using).rows.extend(rows)
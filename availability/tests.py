@@ -1,18 +1,55 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from rest_framework.test import APIClient
+from django.core.cache import cache
+from django.db import connection, transaction, OperationalError
+from rest_framework.test import APIClient, APIRequestFactory
+from drf_spectacular.views import SpectacularAPIView
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from django.urls import reverse
-from availability.models import Availability, RendezVous, Message
+from django.utils.http import parse_http_date
+from django.core.management import call_command
+from availability.benchmarks import compare_to_baseline, percentile
+from availability.events import get_broker, stream_limiter
+from availability.views import message_event_data, message_event_stream
+from EnTouteQuietude83_API.paginators import CappedCountPaginator
+from EnTouteQuietude83_API.schema import clear_schema_cache, code_fingerprint
+from EnTouteQuietude83_API.throttling import get_bucket_store
+from EnTouteQuietude83_API.sqlite3.base import DatabaseWrapper as ProductionSQLiteWrapper
+from availability.models import Availability, RendezVous, Message, Tombstone
+from availability.conditional import collection_version
+from availability.sync import make_sync_token
+from asgiref.sync import sync_to_async
+import csv
 import datetime
+import gc
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 # Constantes :
 # ======================
 
 AVAILABILITY_URL = reverse("availability:availability-list")
 AVAILABILITY_URL_SU = reverse("availability:superuser-availability-list")
+AVAILABILITY_BULK_URL_SU = reverse("availability:superuser-availability-bulk")
 RDV_URL = reverse("availability:rendezvous-list")
 MESSAGE_URL = reverse("availability:messages-list")
+RDV_EXPORT_URL = reverse("availability:rendezvous-export")
+MESSAGE_EXPORT_URL = reverse("availability:messages-export")
+SYNC_URL = reverse("availability:sync")
+ASYNC_AVAILABILITY_URL = reverse("availability:async-availability-list")
+ASYNC_RDV_URL = reverse("availability:async-rendezvous-list")
+ASYNC_MESSAGE_URL = reverse("availability:async-messages-list")
 
 
 def detail_avail_url(avail_id):
@@ -26,6 +63,10 @@ def detail_rdv_url(rdv_id):
 def detail_msg_url(msg_id):
     return reverse("availability:messages-detail", args=[msg_id])
 
+
+def stream_url(rdv_id):
+    return reverse("availability:rendezvous-stream", args=[rdv_id])
+
 # Fonction de création :
 # ==================================
 
@@ -97,6 +138,219 @@ class AvailabilityModelTests_SU(TestCase):
         with self.assertRaises(Availability.DoesNotExist):
             Availability.objects.get(id=availability_id)
 
+    def test_bulk_create_weekly_templates(self):
+        # Lundis et mercredis de septembre 2023, sauf le lundi 11.
+        payload = {"templates": [
+            {"weekday": 0, "hours": ["09:00", "10:00"], "start_date": "2023-09-01",
+             "end_date": "2023-09-30", "exclude_dates": ["2023-09-11"]},
+            {"weekday": 2, "hours": ["14:00"], "start_date": "2023-09-01",
+             "end_date": "2023-09-30"},
+        ]}
+        res = self.client.post(AVAILABILITY_BULK_URL_SU, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {"created": 10, "skipped": 0})
+        mondays = Availability.objects.filter(date__week_day=2)
+        self.assertEqual(mondays.count(), 6)
+        self.assertFalse(Availability.objects.filter(
+            date=datetime.date(2023, 9, 11)).exists())
+
+    def test_bulk_create_skips_existing_slots(self):
+        create_availability(date=datetime.date(
+            2023, 9, 4), heure=datetime.time(9, 0))
+        payload = {"templates": [
+            {"weekday": 0, "hours": ["09:00"], "start_date": "2023-09-01",
+             "end_date": "2023-09-30"},
+        ]}
+        res = self.client.post(AVAILABILITY_BULK_URL_SU, payload, format="json")
+        self.assertEqual(res.data, {"created": 3, "skipped": 1})
+
+        res = self.client.post(AVAILABILITY_BULK_URL_SU, payload, format="json")
+        self.assertEqual(res.data, {"created": 0, "skipped": 4})
+        self.assertEqual(Availability.objects.filter(
+            date__month=9, date__year=2023).count(), 4)
+
+    def test_bulk_create_invalid_range(self):
+        payload = {"templates": [
+            {"weekday": 0, "hours": ["09:00"], "start_date": "2023-09-30",
+             "end_date": "2023-09-01"},
+        ]}
+        res = self.client.post(AVAILABILITY_BULK_URL_SU, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReadOnlyAvailabilityTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.user)
+        start = datetime.date(2023, 9, 1)
+        Availability.objects.bulk_create([
+            Availability(date=start + datetime.timedelta(days=i // 3),
+                         heure=datetime.time(9 + i % 3), is_taken=i % 2 == 0)
+            for i in range(30)
+        ])
+
+    def test_list_cursor_pagination(self):
+        res = self.client.get(AVAILABILITY_URL, {"page_size": 12})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 12)
+        self.assertIsNotNone(res.data["next"])
+        seen = [avail["id"] for avail in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [avail["id"] for avail in res.data["results"]]
+        expected = list(Availability.objects.order_by(
+            "date", "heure", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_list_cursor_on_all_ordering_fields(self):
+        # Page suivante : (date, heure, id) > curseur, sans OFFSET ; retour
+        # arrière par le lien "previous".
+        first = self.client.get(AVAILABILITY_URL, {"page_size": 4})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first.data["next"])
+        sql = next(query["sql"] for query in queries.captured_queries
+                   if 'FROM "availability_availability"' in query["sql"])
+        self.assertIn('"availability_availability"."heure" >', sql)
+        self.assertNotIn("OFFSET", sql)
+
+        expected = list(Availability.objects.order_by(
+            "date", "heure", "id").values_list("id", flat=True))
+        self.assertEqual([avail["id"] for avail in second.data["results"]], expected[4:8])
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual([avail["id"] for avail in previous.data["results"]], expected[:4])
+
+        res = self.client.get(AVAILABILITY_URL, {"cursor": "cD1hYmM="})  # p=abc
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_filters(self):
+        res = self.client.get(AVAILABILITY_URL, {
+            "date_from": "2023-09-03", "date_to": "2023-09-05", "is_taken": "false"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = Availability.objects.filter(
+            date__range=(datetime.date(2023, 9, 3), datetime.date(2023, 9, 5)),
+            is_taken=False)
+        self.assertEqual([avail["id"] for avail in res.data["results"]],
+                         [avail.id for avail in expected])
+
+    def test_list_page_uses_index(self):
+        plan = Availability.objects.filter(
+            date__gte=datetime.date(2023, 9, 3)).order_by("date", "heure").explain()
+        self.assertIn("avail_date_heure_taken_idx", plan)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.user)
+        self.avail = create_availability()
+
+    def assertNotModified(self, url, **headers):
+        # Seule requête : la version partagée de la collection (cache "collections").
+        with self.assertNumQueries(1):
+            res = self.client.get(url, **headers)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_availability_list_not_modified(self):
+        res = self.client.get(AVAILABILITY_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotModified(AVAILABILITY_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertNotModified(AVAILABILITY_URL, HTTP_IF_MODIFIED_SINCE=res["Last-Modified"])
+
+        # Autres filtres : autre ETag.
+        other = self.client.get(AVAILABILITY_URL, {"is_taken": "false"})
+        self.assertNotEqual(other["ETag"], res["ETag"])
+
+    def test_versions_not_kept_in_process_cache(self):
+        # Cache local vidé (autre worker, redémarrage) : même version partagée.
+        etag = self.client.get(AVAILABILITY_URL)["ETag"]
+        cache.clear()
+        self.assertNotModified(AVAILABILITY_URL, HTTP_IF_NONE_MATCH=etag)
+
+    def test_availability_write_changes_etag(self):
+        etag = self.client.get(AVAILABILITY_URL)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            create_availability(heure=datetime.time(11, 0))
+
+        res = self.client.get(AVAILABILITY_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_write_bumps_versions_in_one_batch(self):
+        # Validation : un seul set_many, sans lecture préalable des versions ;
+        # Last-Modified reste l'heure réelle même pour des écritures rapprochées.
+        for heure in (11, 12):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(RDV_URL, {
+                        "user": self.user.id, "degree": "CE1",
+                        "availability": create_availability(heure=datetime.time(heure)).id})
+            reads = [query for query in queries.captured_queries
+                     if 'SELECT "cache_key", "value"' in query["sql"]]
+            self.assertEqual(reads, [])
+
+        res = self.client.get(AVAILABILITY_URL)
+        self.assertLessEqual(parse_http_date(res["Last-Modified"]), time.time())
+
+    def test_booking_claim_changes_availability_etag(self):
+        # Le créneau est "pris" par QuerySet.update : version changée explicitement.
+        etag = self.client.get(AVAILABILITY_URL)["ETag"]
+        rdv_etag = self.client.get(RDV_URL)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(RDV_URL, {
+                "user": self.user.id, "degree": "CE1", "availability": self.avail.id})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(AVAILABILITY_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data["results"][0]["is_taken"])
+        res = self.client.get(RDV_URL, HTTP_IF_NONE_MATCH=rdv_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_create_changes_etag(self):
+        admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        etag = self.client.get(AVAILABILITY_URL)["ETag"]
+        self.client.force_authenticate(user=admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(AVAILABILITY_BULK_URL_SU, {"templates": [{
+                "weekday": 0, "hours": ["09:00"], "start_date": "2023-09-04",
+                "end_date": "2023-09-11"}]}, format="json")
+
+        self.client.force_authenticate(user=self.user)
+        res = self.client.get(AVAILABILITY_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_rendezvous_list_follows_nested_user(self):
+        create_rendezvous(self.user, self.avail)
+        res = self.client.get(RDV_URL)
+        self.assertNotModified(RDV_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("user:user-update"), {"first_name": "Gégé"})
+
+        res = self.client.get(RDV_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["user"]["first_name"], "Gégé")
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(RDV_URL)["ETag"]
+        other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password="Doudou123")
+        self.client.force_authenticate(user=other)
+        res = self.client.get(RDV_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
 
 class RendezVousModelTests(TestCase):
 
@@ -128,6 +382,51 @@ class RendezVousModelTests(TestCase):
         self.assertEqual(rendezvous.id, res.data['id'])
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_rdv_slot_taken_conflict(self):
+        other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password="Doudou123")
+        create_rendezvous(other, self.avail)
+        self.avail.is_taken = True
+        self.avail.save()
+        payload = {
+            "user": self.user.id,
+            "degree": "CE1",
+            "availability": self.avail.id,
+        }
+        res = self.client.post(RDV_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(RendezVous.objects.filter(
+            availability=self.avail).count(), 1)
+
+    def test_create_rdv_unique_constraint_conflict(self):
+        # Créneau incohérent (non marqué pris) : la contrainte en base protège.
+        other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password="Doudou123")
+        create_rendezvous(other, self.avail)
+        payload = {
+            "user": self.user.id,
+            "degree": "CE1",
+            "availability": self.avail.id,
+        }
+        res = self.client.post(RDV_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.avail.refresh_from_db()
+        self.assertFalse(self.avail.is_taken)
+
+    def test_create_rdv_marks_availability_taken(self):
+        payload = {
+            "user": self.user.id,
+            "degree": "CE1",
+            "availability": self.avail.id,
+        }
+        res = self.client.post(RDV_URL, payload)
+
+        self.avail.refresh_from_db()
+        self.assertTrue(self.avail.is_taken)
+        self.assertTrue(res.data["availability"]["is_taken"])
+
     def test_delete_rendezvous(self):
         rendezvous = create_rendezvous(self.user, self.avail)
         rendezvous_id = rendezvous.id
@@ -170,6 +469,87 @@ class MessageModelTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['id'], message.id)
 
+    def test_list_messages_after_id(self):
+        rendezvous = create_rendezvous(self.user, self.avail)
+        messages = [
+            create_message(rendezvous, self.user,
+                           date_time=f"2023-07-01T12:0{i}:00Z")
+            for i in range(5)
+        ]
+        # Même date que le 3e message mais créé après : doit être renvoyé.
+        same_time = create_message(
+            rendezvous, self.user, date_time="2023-07-01T12:02:00Z")
+
+        res = self.client.get(
+            MESSAGE_URL, {"rdv_id": rendezvous.id, "after_id": messages[2].id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([msg["id"] for msg in res.data],
+                         [same_time.id, messages[3].id, messages[4].id])
+
+    def test_list_messages_after_datetime(self):
+        rendezvous = create_rendezvous(self.user, self.avail)
+        for i in range(3):
+            create_message(rendezvous, self.user,
+                           date_time=f"2023-07-01T12:0{i}:00Z")
+
+        res = self.client.get(
+            MESSAGE_URL, {"rdv_id": rendezvous.id, "after": "2023-07-01T12:00:00Z"})
+        self.assertEqual(len(res.data), 2)
+
+    def test_poll_messages_after_deleted_message(self):
+        rendezvous = create_rendezvous(self.user, self.avail)
+        messages = [
+            create_message(rendezvous, self.user, content=f"Message {i}",
+                           date_time=datetime.datetime(2023, 7, 1, 12, i, tzinfo=datetime.timezone.utc))
+            for i in range(3)
+        ]
+        cursor_id = messages[0].id
+        messages[0].delete()
+
+        res = self.client.get(MESSAGE_URL, {"rdv_id": rendezvous.id, "after_id": cursor_id})
+        self.assertEqual([message["id"] for message in res.data],
+                         [messages[1].id, messages[2].id])
+
+    def test_poll_messages_nothing_new(self):
+        rendezvous = create_rendezvous(self.user, self.avail)
+        Message.objects.bulk_create([
+            Message(rdv=rendezvous, sender=self.user, content="Bonjour",
+                    date_time="2023-07-01T12:00:00Z")
+            for i in range(500)
+        ])
+        last = Message.objects.order_by("date_time", "id").last()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                MESSAGE_URL, {"rdv_id": rendezvous.id, "after_id": last.id})
+        self.assertEqual(res.data, [])
+        self.assertEqual(len(queries), 1)
+
+        # Plan de la requête réellement émise par la vue (after_id).
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + queries[0]["sql"])
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("message_rdv_date_time_idx", plan)
+        self.assertNotIn("SCAN availability_message", plan)
+
+    @override_settings(THROTTLE_RATES={"messages": "2/min"})
+    def test_create_message_throttled_per_token(self):
+        get_bucket_store().clear()
+        self.client.force_authenticate(user=None)
+        rdv = create_rendezvous(self.user, self.avail)
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        payload = {"rdv": rdv.id, "sender": self.user.id, "content": "Bonjour",
+                   "date_time": "2023-07-01T12:00:00Z"}
+
+        statuses = [self.client.post(MESSAGE_URL, payload).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [201, 201, 429])
+        # Lectures non limitées.
+        res = self.client.get(MESSAGE_URL, {"rdv_id": rdv.id})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delete_message_api(self):
         rendezvous = create_rendezvous(self.user, self.avail)
         message = create_message(rendezvous, self.user)
@@ -179,3 +559,1090 @@ class MessageModelTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         with self.assertRaises(Message.DoesNotExist):
             Message.objects.get(id=message.id)
+
+
+# Flux SSE des messages :
+# =========================
+
+
+@override_settings(MESSAGE_STREAM_HEARTBEAT=0.05)
+class MessageStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.token = Token.objects.create(user=self.user)
+        self.rdv = create_rendezvous(self.user, create_availability())
+        self.messages = [
+            create_message(self.rdv, self.user,
+                           date_time=f"2023-07-01T12:0{i}:00Z")
+            for i in range(3)
+        ]
+        self.client = AsyncClient()
+        self.auth = {"Authorization": f"Token {self.token.key}"}
+
+    async def read_events(self, stream, count):
+        events = []
+        while len(events) < count:
+            chunk = await stream.__anext__()
+            events.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+        return events
+
+    async def test_stream_replays_and_pushes(self):
+        res = await self.client.get(
+            stream_url(self.rdv.id),
+            headers={"Last-Event-ID": str(self.messages[0].id), **self.auth})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/event-stream")
+        stream = aiter(res.streaming_content)
+
+        events = await self.read_events(stream, 3)
+        self.assertTrue(events[0].startswith("retry:"))
+        self.assertIn(f"id: {self.messages[1].id}\n", events[1])
+        self.assertIn(f"id: {self.messages[2].id}\n", events[2])
+
+        get_broker().publish(self.rdv.id, 999, {"id": 999, "content": "Salut"})
+        event = (await self.read_events(stream, 1))[0]
+        self.assertIn("id: 999\n", event)
+        self.assertIn('"content":"Salut"', event)
+
+        event = (await self.read_events(stream, 1))[0]
+        self.assertEqual(event, ": heartbeat\n\n")
+        await stream.aclose()
+
+    async def test_stream_releases_subscription(self):
+        subscribers = get_broker().subscriber_count(self.rdv.id)
+        open_streams = stream_limiter.open_streams
+        slot = stream_limiter.acquire_slot(open_streams + 1)
+        stream = message_event_stream(self.rdv.id, None, slot)
+        await stream.__anext__()
+        self.assertEqual(get_broker().subscriber_count(
+            self.rdv.id), subscribers + 1)
+        self.assertEqual(stream_limiter.open_streams, open_streams + 1)
+
+        await stream.aclose()
+        self.assertEqual(get_broker().subscriber_count(
+            self.rdv.id), subscribers)
+        self.assertEqual(stream_limiter.open_streams, open_streams)
+
+    async def test_stream_requires_token(self):
+        res = await self.client.get(stream_url(self.rdv.id))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_other_user_forbidden(self):
+        other = await sync_to_async(create_user)(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password=None)
+        token = await Token.objects.acreate(user=other)
+        res = await self.client.get(
+            stream_url(self.rdv.id), headers={"Authorization": f"Token {token.key}"})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MESSAGE_STREAM_MAX_CONNECTIONS=0)
+    async def test_stream_connection_cap(self):
+        res = await self.client.get(stream_url(self.rdv.id), headers=self.auth)
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", res)
+
+    async def test_stream_slot_reserved_before_response(self):
+        # La place est prise dès la réponse, avant la lecture du flux.
+        open_streams = stream_limiter.open_streams
+        with override_settings(MESSAGE_STREAM_MAX_CONNECTIONS=open_streams + 1,
+                               MESSAGE_STREAM_MAX_DURATION=0):
+            first = await self.client.get(stream_url(self.rdv.id), headers=self.auth)
+            second = await self.client.get(stream_url(self.rdv.id), headers=self.auth)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            self.assertEqual(second.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertIn("Retry-After", second)
+
+            # Flux de durée nulle : lu jusqu'au bout, la place est rendue.
+            [chunk async for chunk in first.streaming_content]
+        self.assertEqual(stream_limiter.open_streams, open_streams)
+
+    async def test_unread_stream_releases_slot(self):
+        # Réponse fermée sans être lue, puis réponse abandonnée (collectée).
+        open_streams = stream_limiter.open_streams
+        res = await self.client.get(stream_url(self.rdv.id), headers=self.auth)
+        self.assertEqual(stream_limiter.open_streams, open_streams + 1)
+        res.close()
+        self.assertEqual(stream_limiter.open_streams, open_streams)
+
+        res = await self.client.get(stream_url(self.rdv.id), headers=self.auth)
+        self.assertEqual(stream_limiter.open_streams, open_streams + 1)
+        del res
+        gc.collect()
+        self.assertEqual(stream_limiter.open_streams, open_streams)
+
+    def test_create_message_publishes_event(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        published = []
+        broker = get_broker()
+        original, broker.publish = broker.publish, lambda *args: published.append(args)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                res = client.post(MESSAGE_URL, {
+                    "content": "Nouveau", "date_time": "2023-07-01T13:00:00Z",
+                    "rdv": self.rdv.id, "sender": self.user.id})
+        finally:
+            broker.publish = original
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # Même contenu que la relecture (Last-Event-ID).
+        message = Message.objects.select_related("sender").get(pk=res.data["id"])
+        self.assertEqual(published, [(self.rdv.id, message.id, message_event_data(message))])
+
+
+# Lectures async (routes /async/, ASGI) : mêmes données que les routes DRF
+# ==================================================================
+
+
+class AsyncReadTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password="Doudou123")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.avails = [create_availability(heure=datetime.time(9 + i), is_taken=i < 3)
+                       for i in range(6)]
+        self.rdv = create_rendezvous(self.user, self.avails[0])
+        self.other_rdv = create_rendezvous(self.other, self.avails[1])
+        create_rendezvous(self.user, self.avails[2])
+        self.messages = [
+            create_message(self.rdv, self.user if i % 2 else None,
+                           date_time=f"2023-07-01T12:0{i}:00Z")
+            for i in range(3)
+        ]
+        create_message(self.other_rdv, self.other)
+
+    async def async_get(self, url, params=None, token=None, **headers):
+        token = token or self.token.key
+        return await self.async_client.get(
+            url, params, headers={"Authorization": f"Token {token}", **headers})
+
+    async def sync_get(self, url, params=None):
+        return await sync_to_async(self.client.get)(url, params)
+
+    async def test_availability_list_matches_sync_route(self):
+        res = await self.async_get(ASYNC_AVAILABILITY_URL, {"page_size": 4})
+        reference = await self.sync_get(AVAILABILITY_URL, {"page_size": 4})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["results"], reference.json()["results"])
+
+        # Curseur suivant : même page que la route DRF.
+        res = await self.async_get(res.json()["next"])
+        reference = await self.sync_get(reference.json()["next"])
+        self.assertEqual(res.json()["results"], reference.json()["results"])
+        self.assertIsNone(res.json()["next"])
+
+        params = {"is_taken": "false", "date_from": datetime.date.today().isoformat()}
+        res = await self.async_get(ASYNC_AVAILABILITY_URL, params)
+        reference = await self.sync_get(AVAILABILITY_URL, params)
+        self.assertEqual(res.json()["results"], reference.json()["results"])
+        res = await self.async_get(ASYNC_AVAILABILITY_URL, {"date_from": "pas une date"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("date_from", res.json())
+
+    @override_settings(AUTH_TOKEN_CACHE_SINGLE_PROCESS=True)
+    async def test_availability_list_not_modified(self):
+        res = await self.async_get(ASYNC_AVAILABILITY_URL)
+        cached = await self.async_get(ASYNC_AVAILABILITY_URL, If_None_Match=res["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Token servi par le cache, version lue dans le cache partagé.
+        self.assertIn('desc="1 queries"', cached["Server-Timing"])
+
+        await sync_to_async(self.create_availability_and_commit)()
+        res = await self.async_get(ASYNC_AVAILABILITY_URL, If_None_Match=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def create_availability_and_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_availability(heure=datetime.time(18))
+
+    async def test_my_rendezvous(self):
+        res = await self.async_get(ASYNC_RDV_URL)
+        reference = (await self.sync_get(RDV_URL)).json()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()), 2)
+        self.assertEqual(res.json(), [rdv for rdv in reference
+                                      if rdv["user"]["id"] == self.user.id])
+
+        res = await self.async_get(ASYNC_RDV_URL, {
+            "fields": "id,user.first_name", "availability_id": self.avails[0].id})
+        self.assertEqual(res.json(), [{"id": self.rdv.id, "user": {"first_name": "Gérard"}}])
+
+    async def test_message_thread_matches_sync_route(self):
+        for params in [{"rdv_id": self.rdv.id},
+                       {"rdv_id": self.rdv.id, "after_id": self.messages[0].id},
+                       {"rdv_id": self.rdv.id, "fields": "id,sender.email", "expand": "sender"}]:
+            with self.subTest(params=params):
+                res = await self.async_get(ASYNC_MESSAGE_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res.content, (await self.sync_get(MESSAGE_URL, params)).content)
+
+    async def test_message_thread_access(self):
+        res = await self.async_get(ASYNC_MESSAGE_URL, {"rdv_id": self.other_rdv.id})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = await self.async_get(ASYNC_MESSAGE_URL, {"rdv_id": 999})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = await self.async_get(ASYNC_MESSAGE_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("rdv_id", res.json())
+        res = await self.async_get(ASYNC_MESSAGE_URL, {"rdv_id": self.rdv.id, "after_id": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_authentication_and_methods(self):
+        res = await self.async_client.get(ASYNC_RDV_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res["WWW-Authenticate"], "Token")
+        res = await self.async_get(ASYNC_RDV_URL, token="invalide")
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.json(), {"detail": "Token non valide."})
+        res = await self.async_client.post(
+            ASYNC_RDV_URL, headers={"Authorization": f"Token {self.token.key}"})
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_server_timing_counts_async_queries(self):
+        res = await self.async_get(ASYNC_MESSAGE_URL, {"rdv_id": self.rdv.id})
+        # Token (cache vide), propriétaire du rendez-vous, messages.
+        self.assertIn('desc="3 queries"', res["Server-Timing"])
+        self.assertIn("auth;dur=", res["Server-Timing"])
+
+
+# Nombre de requêtes SQL constant pour les listes (pas de N+1) :
+# ==================================================================
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0, THROTTLE_RATES={})
+class SyncTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin", password="Doudou123")
+        self.avails = [create_availability(heure=datetime.time(8 + i)) for i in range(5)]
+        self.rdv = create_rendezvous(self.user, self.avails[0])
+        self.other_rdv = create_rendezvous(self.other, self.avails[1])
+        self.message = create_message(self.rdv, self.user)
+        create_message(self.other_rdv, self.other)
+        self.client.force_authenticate(user=self.user)
+
+    def sync(self, token=None):
+        res = self.client.get(SYNC_URL, {"token": token} if token else {})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def ids(self, section):
+        return sorted(row["id"] for row in section["changed"])
+
+    def test_full_sync_scoped_to_user(self):
+        data = self.sync()
+
+        self.assertTrue(data["full"])
+        self.assertEqual(len(data["availability"]["changed"]), 5)
+        self.assertEqual(self.ids(data["rendezvous"]), [self.rdv.id])
+        self.assertEqual(self.ids(data["messages"]), [self.message.id])
+
+    def test_incremental_sync_returns_only_changes(self):
+        token = self.sync()["token"]
+        self.avails[2].is_taken = True
+        self.avails[2].save()
+        new = create_availability(heure=datetime.time(18))
+
+        data = self.sync(token)
+
+        self.assertFalse(data["full"])
+        self.assertEqual(self.ids(data["availability"]), [self.avails[2].id, new.id])
+        self.assertEqual(data["rendezvous"], {"changed": [], "deleted": []})
+        self.assertEqual(self.sync(data["token"])["availability"]["changed"], [])
+
+    def test_incremental_sync_cost_independent_of_table_size(self):
+        token = self.sync()["token"]
+        with CaptureQueriesContext(connection) as small:
+            self.sync(token)
+        Availability.objects.bulk_create(
+            [Availability(date=datetime.date(2023, 9, 1), heure=datetime.time(8))] * 200)
+        token = self.sync()["token"]
+        with CaptureQueriesContext(connection) as large:
+            data = self.sync(token)
+        self.assertEqual(data["availability"]["changed"], [])
+        self.assertEqual(len(small), len(large))
+
+    def test_booking_claim_is_tracked(self):
+        # Le créneau est "pris" par QuerySet.update (updated_at explicite).
+        token = self.sync()["token"]
+        res = self.client.post(RDV_URL, {
+            "user": self.user.id, "degree": "CE1", "availability": self.avails[3].id})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        data = self.sync(token)
+        self.assertEqual(self.ids(data["availability"]), [self.avails[3].id])
+        self.assertTrue(data["availability"]["changed"][0]["is_taken"])
+        self.assertEqual(self.ids(data["rendezvous"]), [res.data["id"]])
+
+    def test_deletions_are_returned_as_tombstones(self):
+        token = self.sync()["token"]
+        avail_id, rdv_id, message_id = self.avails[0].id, self.rdv.id, self.message.id
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(detail_msg_url(message_id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avails[0].delete()
+
+        data = self.sync(token)
+        self.assertEqual(data["availability"]["deleted"], [avail_id])
+        self.assertEqual(data["rendezvous"]["deleted"], [rdv_id])
+        self.assertEqual(data["messages"]["deleted"], [message_id])
+
+    def test_other_users_tombstones_hidden(self):
+        token = self.sync()["token"]
+        rdv_id = self.other_rdv.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_rdv.delete()
+
+        data = self.sync(token)
+        self.assertEqual(data["rendezvous"]["deleted"], [])
+
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.sync(token)["rendezvous"]["deleted"], [rdv_id])
+
+    def test_rolled_back_deletion_leaves_no_tombstone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.avails[4].delete()
+                    raise OperationalError("annulé")
+            except OperationalError:
+                pass
+        avail_id = self.avails[3].id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avails[3].delete()
+
+        self.assertEqual(list(Tombstone.objects.values_list("object_id", flat=True)), [avail_id])
+
+    def test_rolled_back_savepoint_keeps_outer_tombstones_only(self):
+        kept_ids = sorted([self.avails[2].id, self.avails[3].id])
+        rolled_back_id = self.avails[4].id
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.avails[3].delete()
+                try:
+                    with transaction.atomic():
+                        self.avails[4].delete()
+                        raise OperationalError("annulé")
+                except OperationalError:
+                    pass
+                self.avails[2].delete()
+
+        self.assertTrue(Availability.objects.filter(pk=rolled_back_id).exists())
+        self.assertEqual(sorted(Tombstone.objects.values_list("object_id", flat=True)), kept_ids)
+
+    def test_user_deletion_tombstones_inserted_in_bulk(self):
+        for i in range(10):
+            create_rendezvous(self.other, create_availability(date=datetime.date(2023, 9, i + 1)))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.other.delete()
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+
+        inserts = [query for query in queries.captured_queries
+                   if query["sql"].startswith('INSERT INTO "availability_tombstone"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Tombstone.objects.filter(kind=Tombstone.RENDEZVOUS).count(), 11)
+        self.assertEqual(Tombstone.objects.filter(kind=Tombstone.AVAILABILITY).count(), 11)
+
+    def test_expired_token(self):
+        old = make_sync_token(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=31))
+        res = self.client.get(SYNC_URL, {"token": old})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+        res = self.client.get(SYNC_URL, {"token": "invalide"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_tombstones(self):
+        Tombstone.objects.create(kind=Tombstone.AVAILABILITY, object_id=1,
+                                 deleted_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        recent = Tombstone.objects.create(kind=Tombstone.AVAILABILITY, object_id=2)
+
+        call_command("prune_tombstones", stdout=io.StringIO())
+
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+
+# Sérialisation compilée des listes : mêmes octets que les serializers DRF.
+# ==============================
+
+
+@override_settings(THROTTLE_RATES={})
+class RowSerializationConformanceTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud",
+            password="Gerard123", telephone="0601020304")
+        self.other = create_user(
+            email="doudou@gmail.com", first_name="Doudou", last_name="Martin",
+            password="Doudou123", profile_image="")
+        self.client.force_authenticate(user=self.user)
+        today = datetime.date(2023, 9, 1)
+        self.avails = [
+            create_availability(date=today + datetime.timedelta(days=i // 3),
+                                heure=datetime.time(9 + i % 3, 30, 15 * (i % 2)),
+                                is_taken=i % 2 == 0)
+            for i in range(12)
+        ]
+        self.rdvs = [create_rendezvous(self.user if i % 4 else self.other, avail)
+                     for i, avail in enumerate(self.avails[::2])]
+        for i, rdv in enumerate(self.rdvs):
+            create_message(rdv, rdv.user, content=f"Message {i} é", date_time=datetime.datetime(
+                2023, 7, 1, 12, 0, i, 1000 * i, tzinfo=datetime.timezone.utc))
+        # Expéditeur supprimé (SET_NULL).
+        create_message(self.rdvs[1], None, date_time=datetime.datetime(
+            2023, 12, 24, 23, 59, tzinfo=datetime.timezone.utc))
+
+    def assertConforms(self, url, params=None):
+        compiled = self.client.get(url, params)
+        with override_settings(ROW_SERIALIZATION_ENABLED=False):
+            cache.clear()
+            reference = self.client.get(url, params)
+        cache.clear()
+        self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+        self.assertEqual(compiled.content, reference.content)
+        return compiled
+
+    def test_availability_list(self):
+        res = self.assertConforms(AVAILABILITY_URL, {"page_size": 5})
+        self.assertConforms(res.data["next"])
+        self.assertConforms(AVAILABILITY_URL, {"is_taken": "true", "date_from": "2023-09-02"})
+
+    def test_rendezvous_list(self):
+        res = self.assertConforms(RDV_URL)
+        self.assertEqual(len(res.data), 6)
+        self.assertConforms(RDV_URL, {"availability_id": self.avails[2].id})
+
+    def test_message_list(self):
+        res = self.assertConforms(MESSAGE_URL)
+        self.assertEqual(len(res.data), 7)
+        self.assertConforms(MESSAGE_URL, {"rdv_id": self.rdvs[1].id, "after_id": 1})
+
+    def test_field_selection_conforms(self):
+        for params in [{"fields": "id,degree,user.first_name"}, {"expand": ""},
+                       {"expand": "user", "fields": "id,user.first_name,availability"},
+                       {"sideload": "users"}, {"sideload": "users", "fields": "user.last_name"}]:
+            with self.subTest(params=params):
+                self.assertConforms(RDV_URL, params)
+        for params in [{"fields": "id,sender.email,content"}, {"expand": ""},
+                       {"sideload": "users"}]:
+            with self.subTest(params=params):
+                self.assertConforms(MESSAGE_URL, params)
+
+
+# ?fields= / ?expand= / ?sideload=users :
+# ==============================
+
+
+@override_settings(THROTTLE_RATES={})
+class FieldSelectionTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.user)
+        self.rdvs = [create_rendezvous(self.user, create_availability(heure=datetime.time(9 + i)))
+                     for i in range(3)]
+        for rdv in self.rdvs:
+            create_message(rdv, self.user)
+        create_message(self.rdvs[0], None)
+
+    def test_sparse_fields_and_nested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RDV_URL, {"fields": "id,degree,user.first_name"})
+
+        self.assertEqual(res.data[0], {"id": self.rdvs[0].id, "degree": "CP",
+                                       "user": {"first_name": "Gérard"}})
+        select = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("email", select)
+        self.assertNotIn('"availability"."date"', select)
+
+    def test_expand_controls_nesting(self):
+        res = self.client.get(RDV_URL, {"expand": ""})
+        self.assertEqual(res.data[0]["user"], self.user.id)
+        self.assertEqual(res.data[0]["availability"], self.rdvs[0].availability_id)
+
+        res = self.client.get(RDV_URL, {"expand": "availability"})
+        self.assertEqual(res.data[0]["user"], self.user.id)
+        self.assertEqual(res.data[0]["availability"]["heure"], "09:00:00")
+
+        # Sans paramètre : comportement historique (tout imbriqué).
+        res = self.client.get(RDV_URL)
+        self.assertEqual(res.data[0]["user"]["email"], "gerard@gmail.com")
+
+    def test_sideload_users(self):
+        res = self.client.get(MESSAGE_URL, {"sideload": "users", "fields": "id,sender.first_name"})
+
+        self.assertEqual(list(res.data["included"]["users"]), [self.user.id])
+        self.assertEqual(res.data["included"]["users"][self.user.id],
+                         {"id": self.user.id, "first_name": "Gérard"})
+        senders = [message["sender"] for message in res.data["results"]]
+        self.assertEqual(senders.count(None), 1)
+        self.assertEqual(senders.count(self.user.id), 3)
+
+        res = self.client.get(MESSAGE_URL, {"sideload": "all"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_and_writes(self):
+        res = self.client.get(detail_rdv_url(self.rdvs[0].id), {"fields": "id,user.last_name"})
+        self.assertEqual(res.data, {"id": self.rdvs[0].id, "user": {"last_name": "Michaud"}})
+
+        # Écritures : paramètres ignorés, réponse complète.
+        res = self.client.post(f"{MESSAGE_URL}?fields=id", {
+            "rdv": self.rdvs[1].id, "sender": self.user.id, "content": "Bonjour",
+            "date_time": "2023-07-01T12:00:00Z"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["content"], "Bonjour")
+
+
+# Admin : nombre de requêtes constant par page :
+# ==============================
+
+
+class AdminQueryCountTests(TestCase):
+    # Changelists et formulaires : même nombre de requêtes quel que soit le
+    # nombre de lignes affichées ou d'objets liés en base.
+    CHANGELIST_QUERIES = {
+        "availability_availability": 6, "availability_rendezvous": 6,
+        "availability_message": 6, "user_customuser": 4,
+    }
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.client.force_login(self.admin)
+        self.add_history(2)
+
+    def add_history(self, count):
+        start = Availability.objects.count()
+        for i in range(start, start + count):
+            user = get_user_model().objects.create(
+                email=f"eleve{i}@gmail.com", first_name="Eleve", last_name=str(i))
+            rdv = create_rendezvous(user, create_availability(
+                date=datetime.date(2023, 9, 1) + datetime.timedelta(days=i), is_taken=True))
+            create_message(rdv, user, date_time=datetime.datetime(
+                2023, 9, 1, 12, tzinfo=datetime.timezone.utc))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_changelists_constant_queries(self):
+        few = {name: self.count_queries(reverse(f"admin:{name}_changelist"))
+               for name in self.CHANGELIST_QUERIES}
+        self.add_history(30)
+        for name, expected in self.CHANGELIST_QUERIES.items():
+            with self.subTest(changelist=name):
+                self.assertEqual(self.count_queries(reverse(f"admin:{name}_changelist")), few[name])
+                self.assertEqual(few[name], expected)
+
+    def test_change_forms_do_not_load_related_tables(self):
+        rdv, message = RendezVous.objects.first(), Message.objects.first()
+        rdv_url = reverse("admin:availability_rendezvous_change", args=[rdv.id])
+        message_url = reverse("admin:availability_message_change", args=[message.id])
+        # Premier affichage : remplissage du cache des ContentType.
+        self.count_queries(rdv_url), self.count_queries(message_url)
+        few = self.count_queries(rdv_url), self.count_queries(message_url)
+        self.add_history(30)
+        self.assertEqual((self.count_queries(rdv_url), self.count_queries(message_url)), few)
+
+        # Autocomplete : pas de <select> listant tous les users.
+        res = self.client.get(rdv_url)
+        self.assertNotContains(res, "eleve20@gmail.com")
+
+    def test_capped_count_paginator(self):
+        self.add_history(5)
+        paginator = CappedCountPaginator(Availability.objects.order_by("id"), 2)
+        paginator.count_cap = 4
+        self.assertEqual(paginator.count, 4)
+        self.assertEqual(paginator.num_pages, 2)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        today = datetime.date.today()
+        self.rdvs = [
+            create_rendezvous(self.user, create_availability(
+                date=today + datetime.timedelta(days=i), is_taken=True))
+            for i in range(3)
+        ]
+        create_message(self.rdvs[0], self.user, content='Bonjour, "virgule", accent é',
+                       date_time=datetime.datetime(2023, 7, 1, 12, tzinfo=datetime.timezone.utc))
+        self.client.force_authenticate(user=self.admin)
+
+    def read(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode()
+
+    def test_export_rendezvous_csv(self):
+        res = self.client.get(RDV_EXPORT_URL)
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(self.read(res))))
+
+        self.assertEqual([int(row["id"]) for row in rows], [rdv.id for rdv in self.rdvs])
+        self.assertEqual(rows[0]["user_email"], self.user.email)
+        self.assertEqual(rows[0]["date"], self.rdvs[0].availability.date.isoformat())
+
+    def test_export_rendezvous_date_range(self):
+        day = self.rdvs[1].availability.date.isoformat()
+        res = self.client.get(RDV_EXPORT_URL, {"date_from": day, "date_to": day})
+        rows = list(csv.DictReader(io.StringIO(self.read(res))))
+
+        self.assertEqual([int(row["id"]) for row in rows], [self.rdvs[1].id])
+
+    def test_export_messages_ndjson(self):
+        res = self.client.get(MESSAGE_EXPORT_URL, {"output": "ndjson"})
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in self.read(res).splitlines()]
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["content"], 'Bonjour, "virgule", accent é')
+        self.assertEqual(lines[0]["sender_email"], self.user.email)
+        self.assertEqual(lines[0]["date_time"], "2023-07-01T12:00:00Z")
+
+    def test_export_messages_date_range(self):
+        # Jours du fuseau courant (Europe/Paris) : bornes incluses.
+        paris = datetime.timezone(datetime.timedelta(hours=2))
+        for hour in (0, 23):
+            create_message(self.rdvs[0], self.user, content=f"{hour}h",
+                           date_time=datetime.datetime(2023, 7, 2, hour, tzinfo=paris))
+        create_message(self.rdvs[0], self.user, content="lendemain",
+                       date_time=datetime.datetime(2023, 7, 3, 0, tzinfo=paris))
+
+        res = self.client.get(MESSAGE_EXPORT_URL, {
+            "output": "ndjson", "date_from": "2023-07-02", "date_to": "2023-07-02"})
+        lines = [json.loads(line) for line in self.read(res).splitlines()]
+
+        self.assertEqual([line["content"] for line in lines], ["0h", "23h"])
+
+    def test_export_csv_neutralises_formulas(self):
+        for content in ("=HYPERLINK(\"http://x\")", "+1", "-1", "@SUM(A1)", "\tx", "Bonjour"):
+            create_message(self.rdvs[0], self.user, content=content)
+        res = self.client.get(MESSAGE_EXPORT_URL)
+        contents = [row["content"] for row in csv.DictReader(io.StringIO(self.read(res)))]
+
+        for expected in ("'=HYPERLINK(\"http://x\")", "'+1", "'-1", "'@SUM(A1)", "'\tx", "Bonjour"):
+            self.assertIn(expected, contents)
+
+    def test_export_invalid_params(self):
+        res = self.client.get(RDV_EXPORT_URL, {"output": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(RDV_EXPORT_URL, {"date_from": "2023-07-02", "date_to": "2023-07-01"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_superuser_only(self):
+        self.client.force_authenticate(user=self.user)
+        res = self.client.get(RDV_EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command("export_data", "messages", "--output", "csv", stdout=out)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["content"], 'Bonjour, "virgule", accent é')
+
+
+class ListQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.user)
+        self.students = [
+            create_user(email=f"eleve{i}@gmail.com", first_name="Eleve",
+                        last_name=str(i), password=None)
+            for i in range(5)
+        ]
+        # Versions des listes créées d'avance : hors du compte mesuré.
+        for name in ("availability", "rendezvous"):
+            collection_version(name)
+
+    def seed(self, count):
+        start = datetime.date(2023, 9, 1) + datetime.timedelta(
+            days=Availability.objects.count())
+        avails = Availability.objects.bulk_create([
+            Availability(date=start + datetime.timedelta(days=i),
+                         heure=datetime.time(10, 0), is_taken=True)
+            for i in range(count)
+        ])
+        rdvs = RendezVous.objects.bulk_create([
+            RendezVous(user=self.students[i % len(self.students)],
+                       degree="CP", availability=avail)
+            for i, avail in enumerate(avails)
+        ])
+        Message.objects.bulk_create([
+            Message(rdv=rdvs[0], sender=self.students[i % len(self.students)],
+                    content="Bonjour", date_time="2023-07-01T12:00:00Z")
+            for i in range(count)
+        ])
+        return rdvs[0]
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), res
+
+    def test_rendezvous_list_constant_queries(self):
+        self.seed(10)
+        small, res = self.count_queries(RDV_URL)
+        self.assertEqual(len(res.data), 10)
+
+        self.seed(990)
+        large, res = self.count_queries(RDV_URL)
+        self.assertEqual(len(res.data), 1000)
+        self.assertEqual(small, large)
+
+    def test_messages_list_constant_queries(self):
+        rdv = self.seed(10)
+        small, res = self.count_queries(MESSAGE_URL, {"rdv_id": rdv.id})
+        self.assertEqual(len(res.data), 10)
+
+        Message.objects.bulk_create([
+            Message(rdv=rdv, sender=self.students[i % len(self.students)],
+                    content="Bonjour", date_time="2023-07-01T12:00:00Z")
+            for i in range(990)
+        ])
+        large, res = self.count_queries(MESSAGE_URL, {"rdv_id": rdv.id})
+        self.assertEqual(len(res.data), 1000)
+        self.assertEqual(small, large)
+
+
+# Réservations concurrentes (stress test) :
+# ==========================================
+
+
+def metric_value(text, name, **labels):
+    # Valeur d'une série dans le texte Prometheus (0 si absente).
+    pattern = re.escape(name) + r"(\{(?P<labels>[^}]*)\})? (?P<value>\S+)$"
+    for line in text.splitlines():
+        match = re.match(pattern, line)
+        if match is None:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group("labels") or ""))
+        if found == {key: str(value) for key, value in labels.items()}:
+            return float(match.group("value"))
+    return 0.0
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        get_bucket_store().clear()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        # Scraper interne déclaré (client de test : 127.0.0.1).
+        settings_override = override_settings(
+            METRICS_DIR=metrics_dir, METRICS_ALLOWED_IPS=["127.0.0.1"])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.metrics_dir = metrics_dir
+
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.avail = create_availability()
+        self.client.force_authenticate(user=self.user)
+
+    def scrape(self):
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content.decode()
+
+    def test_request_latency_and_status_by_view(self):
+        before = self.scrape()
+        self.client.get(RDV_URL)
+        self.client.get(detail_rdv_url(999999))
+        after = self.scrape()
+
+        labels = {"view": "RendezVousViewSet", "method": "GET"}
+        self.assertEqual(
+            metric_value(after, "http_request_duration_seconds_count", **labels)
+            - metric_value(before, "http_request_duration_seconds_count", **labels), 2)
+        self.assertEqual(
+            metric_value(after, "http_responses_total", status=404, **labels)
+            - metric_value(before, "http_responses_total", status=404, **labels), 1)
+        self.assertGreater(metric_value(
+            after, "http_request_db_queries_count", view="RendezVousViewSet"), 0)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", after)
+
+    @override_settings(SERVER_TIMING_ENABLED=False)
+    def test_query_count_without_server_timing(self):
+        before = metric_value(self.scrape(), "http_request_db_queries_count", view="RendezVousViewSet")
+        res = self.client.get(RDV_URL)
+        self.assertNotIn("Server-Timing", res)
+        after = metric_value(self.scrape(), "http_request_db_queries_count", view="RendezVousViewSet")
+        self.assertEqual(after - before, 1)
+
+    def test_booking_conflicts_and_login_failures(self):
+        before = self.scrape()
+        self.avail.is_taken = True
+        self.avail.save()
+        res = self.client.post(RDV_URL, {
+            "user": self.user.id, "degree": "CE1", "availability": self.avail.id})
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        res = APIClient().post(reverse("user:user-login"), {
+            "email": self.user.email, "password": "Mauvais123"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        after = self.scrape()
+
+        for name in ("booking_conflicts_total", "login_failures_total"):
+            self.assertEqual(metric_value(after, name) - metric_value(before, name), 1)
+
+    def test_totals_aggregated_across_processes(self):
+        before = metric_value(self.scrape(), "login_failures_total")
+        # Un autre worker : compteur incrémenté puis écrit dans METRICS_DIR.
+        subprocess.run(
+            [sys.executable, "-c",
+             "import django; django.setup()\n"
+             "from EnTouteQuietude83_API.metrics import LOGIN_FAILURES, registry\n"
+             "LOGIN_FAILURES.inc(3); registry.flush()"],
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "EnTouteQuietude83_API.settings",
+                 "METRICS_DIR": self.metrics_dir},
+            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        self.assertEqual(len(os.listdir(self.metrics_dir)), 2)
+        self.assertEqual(metric_value(self.scrape(), "login_failures_total") - before, 3)
+
+    def test_metrics_restricted_to_internal_addresses(self):
+        res = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        # Aucune adresse par défaut, pas même la boucle locale (reverse proxy).
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        token = Token.objects.create(user=admin)
+        res = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3",
+                              HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class SchemaCacheTests(TestCase):
+    JSON = "application/vnd.oai.openapi+json"
+
+    def setUp(self):
+        schema_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, schema_dir, ignore_errors=True)
+        settings_override = override_settings(SCHEMA_CACHE_DIR=schema_dir, CODE_VERSION="v1")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_schema_cache()
+        self.addCleanup(clear_schema_cache)
+        self.schema_dir = schema_dir
+        self.client = APIClient()
+
+    def test_schema_served_from_cache_with_etag(self):
+        res = self.client.get(reverse("api-schema"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res["ETag"]
+        self.assertIn("no-cache", res["Cache-Control"])
+        self.assertIn(b"/availability/rendezvous/", res.content)
+        self.assertEqual(sorted(os.listdir(self.schema_dir)), ["schema-v1.yaml"])
+
+        res = self.client.get(reverse("api-schema"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_cached_schema_matches_generated(self):
+        cached = self.client.get(reverse("api-schema"), HTTP_ACCEPT=self.JSON)
+        generated = SpectacularAPIView.as_view()(
+            APIRequestFactory().get(reverse("api-schema"), HTTP_ACCEPT=self.JSON)).render()
+
+        self.assertEqual(cached["Content-Type"], generated["Content-Type"])
+        self.assertEqual(cached.content, generated.content)
+
+    def test_new_code_version_regenerates(self):
+        etag = self.client.get(reverse("api-schema"))["ETag"]
+        with override_settings(CODE_VERSION="v2"):
+            clear_schema_cache()
+            res = self.client.get(reverse("api-schema"))
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(sorted(os.listdir(self.schema_dir)), ["schema-v1.yaml", "schema-v2.yaml"])
+
+    def test_generate_schema_command(self):
+        with open(os.path.join(self.schema_dir, "schema-old.yaml"), "w") as file:
+            file.write("openapi: 3.0.3")
+        call_command("generate_schema", stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(sorted(os.listdir(self.schema_dir)), ["schema-v1.json", "schema-v1.yaml"])
+        self.assertEqual(code_fingerprint(), "v1")
+
+    def test_source_fingerprint(self):
+        with override_settings(CODE_VERSION=""):
+            clear_schema_cache()
+            fingerprint = code_fingerprint()
+        self.assertRegex(fingerprint, r"^[0-9a-f]{16}$")
+
+
+# Sans limitation de débit : 25 réservations par élève en rafale.
+@override_settings(THROTTLE_RATES={})
+class ConcurrentBookingTests(TransactionTestCase):
+    STUDENTS = 8
+    SLOTS = 25
+
+    def test_concurrent_booking_no_double_booking(self):
+        students = [
+            create_user(email=f"eleve{i}@gmail.com", first_name="Eleve",
+                        last_name=str(i), password=None)
+            for i in range(self.STUDENTS)
+        ]
+        slots = Availability.objects.bulk_create([
+            Availability(date=datetime.date.today(),
+                         heure=datetime.time(8 + i // 4, (i % 4) * 15))
+            for i in range(self.SLOTS)
+        ])
+        barrier = threading.Barrier(self.STUDENTS)
+        statuses = []
+        errors = []
+
+        # La base de test SQLite est en mémoire (cache partagé) : un verrou de
+        # table lève une erreur au lieu d'attendre comme le ferait busy_timeout
+        # sur un fichier. On rejoue alors la requête ; si l'erreur survient
+        # après le commit (rendu de la réponse), le rejeu répond 409, d'où
+        # les vérifications faites sur l'état de la base.
+        def post_with_retry(client, payload):
+            while True:
+                try:
+                    return client.post(RDV_URL, payload)
+                except OperationalError as exc:
+                    if "locked" not in str(exc):
+                        raise
+                    time.sleep(0.001)
+
+        # Tous les élèves tentent de réserver tous les créneaux, dans le même
+        # ordre, pour maximiser la contention.
+        def book(student):
+            client = APIClient()
+            client.force_authenticate(user=student)
+            try:
+                barrier.wait()
+                for slot in slots:
+                    res = post_with_retry(client, {
+                        "user": student.id,
+                        "degree": "CM2",
+                        "availability": slot.id,
+                    })
+                    statuses.append(res.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(student,))
+                   for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(statuses), self.SLOTS * self.STUDENTS)
+        self.assertEqual(
+            set(statuses), {status.HTTP_201_CREATED, status.HTTP_409_CONFLICT})
+        self.assertLessEqual(
+            statuses.count(status.HTTP_201_CREATED), self.SLOTS)
+        # Chaque créneau est réservé exactement une fois.
+        self.assertEqual(RendezVous.objects.count(), self.SLOTS)
+        self.assertEqual(RendezVous.objects.values(
+            "availability").distinct().count(), self.SLOTS)
+        self.assertFalse(Availability.objects.filter(is_taken=False).exists())
+        self.assertLessEqual(set(RendezVous.objects.values_list("user", flat=True)),
+                             {student.id for student in students})
+
+
+# Profil SQLite de production (backend EnTouteQuietude83_API.sqlite3) :
+# =======================================================================
+
+
+class SQLiteProductionProfileTests(TestCase):
+
+    def test_pragmas_applied_on_new_connection(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_dict = {
+            **connection.settings_dict,
+            "NAME": os.path.join(directory, "prod.sqlite3"),
+            "OPTIONS": {
+                "transaction_mode": "IMMEDIATE",
+                "pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL",
+                            "busy_timeout": 5000},
+            },
+        }
+        wrapper = ProductionSQLiteWrapper(settings_dict, alias="production")
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                self.assertEqual(cursor.fetchone()[0], "wal")
+                cursor.execute("PRAGMA synchronous")
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                cursor.execute("PRAGMA busy_timeout")
+                self.assertEqual(cursor.fetchone()[0], 5000)
+            wrapper.set_autocommit(True)
+            with wrapper.cursor() as cursor:
+                wrapper._start_transaction_under_autocommit()
+                self.assertTrue(wrapper.connection.in_transaction)
+                cursor.execute("ROLLBACK")
+        finally:
+            wrapper.close()
+
+
+# Outils de benchmark (comparaison à une référence) :
+# =====================================================
+
+
+class BenchmarkBaselineTests(TestCase):
+
+    def stats(self, **params):
+        payload = {"requests": 100, "errors": 0, "throughput": 100.0,
+                   "p50_ms": 5.0, "p95_ms": 10.0, "p99_ms": 12.0,
+                   "queries_per_request": 2.0}
+        payload.update(params)
+        return payload
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 95))
+
+    def test_compare_within_tolerance(self):
+        baseline = {"user-me": self.stats()}
+        results = {"user-me": self.stats(p95_ms=11.0, throughput=90.0)}
+        self.assertEqual(compare_to_baseline(results, baseline, 0.25), [])
+
+    def test_compare_detects_regressions(self):
+        baseline = {"user-me": self.stats()}
+        results = {"user-me": self.stats(
+            p95_ms=20.0, throughput=50.0, queries_per_request=3.0)}
+        regressions = compare_to_baseline(results, baseline, 0.25)
+        self.assertEqual(len(regressions), 3)
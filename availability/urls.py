@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AvailabilityViewSet, ReadOnlyAvailabilityViewSet, RendezVousViewSet, MessageViewSet
+from .views import AvailabilityViewSet, ReadOnlyAvailabilityViewSet, RendezVousViewSet, MessageViewSet, ExportView, SyncView, message_stream
+from .views import availability_list_async, my_rendezvous_async, message_thread_async
 
 app_name = "availability"
 router = DefaultRouter()
@@ -12,5 +13,19 @@ router.register("rendezvous", RendezVousViewSet, basename='rendezvous')
 router.register("messages", MessageViewSet, basename='messages')
 
 urlpatterns = [
+    path('rendezvous/<int:rdv_id>/stream/', message_stream,
+         name='rendezvous-stream'),
+    path('rendezvous/export/', ExportView.as_view(kind="rendezvous"),
+         name='rendezvous-export'),
+    path('messages/export/', ExportView.as_view(kind="messages"),
+         name='messages-export'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    # Lectures async (ASGI) : mêmes données que les routes DRF.
+    path('async/user/', availability_list_async,
+         name='async-availability-list'),
+    path('async/rendezvous/', my_rendezvous_async,
+         name='async-rendezvous-list'),
+    path('async/messages/', message_thread_async,
+         name='async-messages-list'),
     path('', include(router.urls)),
 ]
@@ -1,10 +1,34 @@
+import asyncio
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, Q, Subquery
 import django_filters
+from django_filters.utils import translate_validation
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, authentication, viewsets
-from availability.serializers import AvailabilitySerializer, RendezVousSerializer, MessageSerializer
+from rest_framework import permissions, viewsets, exceptions, status
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from availability.serializers import AvailabilitySerializer, RecurringAvailabilitySerializer, RendezVousSerializer, MessageSerializer, ExportParamsSerializer
+from availability.serializers import AvailabilityRowSerializer, RendezVousRowSerializer, MessageRowSerializer
+from django.utils import timezone
+from django.http import JsonResponse, StreamingHttpResponse
+from availability.conditional import ConditionalListMixin, bump_collections, conditional_list
+from availability.exports import OUTPUT_FORMATS, export_lines
+from availability.sync import sync_changes
+from availability.events import format_event, get_broker, stream_limiter
 from availability.models import Availability, RendezVous, Message
+from user.authentication import CachedTokenAuthentication
+from EnTouteQuietude83_API.metrics import BOOKING_CONFLICTS
+from EnTouteQuietude83_API.asyncviews import async_read_view, json_response
+from EnTouteQuietude83_API.fieldsets import FieldSelection, FieldSelectionMixin
+from EnTouteQuietude83_API.paginators import KeysetCursorPagination
+from EnTouteQuietude83_API.rows import RowListMixin
+from EnTouteQuietude83_API.throttling import UserBucketThrottle
 
 User = get_user_model()
 
@@ -14,10 +38,29 @@ class IsSuperUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_superuser
 
+
+# Créneau déjà réservé => 409 Conflict
+# --------------------------------------------------
+
+
+class SlotAlreadyTaken(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Ce créneau est déjà réservé."
+    default_code = "slot_already_taken"
+
 # Rend possible la recherche par paramètres : (django-filters) => exemple : GET /api/rendezvous/?availability_id=1
 # --------------------------------------------------
 
 
+class AvailabilityFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(field_name="date", lookup_expr="gte")
+    date_to = django_filters.DateFilter(field_name="date", lookup_expr="lte")
+
+    class Meta:
+        model = Availability
+        fields = ["date_from", "date_to", "is_taken"]
+
+
 class RendezVousFilter(django_filters.FilterSet):
     availability_id = django_filters.NumberFilter(
         field_name="availability__id")
@@ -27,13 +70,51 @@ class RendezVousFilter(django_filters.FilterSet):
         fields = ["availability_id"]
 
 
+# Lecture incrémentale d'un fil => GET /api/messages/?rdv_id=1&after_id=42
+# ou ?after=2023-07-01T12:00:00Z : uniquement les messages plus récents.
+
+
 class MessagesFilter(django_filters.FilterSet):
     rdv_id = django_filters.NumberFilter(
         field_name="rdv__id")
+    after = django_filters.IsoDateTimeFilter(method="filter_after")
+    after_id = django_filters.NumberFilter(method="filter_after_id")
 
     class Meta:
         model = Message
-        fields = ["rdv_id"]
+        fields = ["rdv_id", "after", "after_id"]
+
+    def filter_after(self, queryset, name, value):
+        return queryset.filter(date_time__gt=value).order_by("date_time", "id")
+
+    def filter_after_id(self, queryset, name, value):
+        return messages_after_id(queryset, value)
+
+
+# Messages postérieurs au message `message_id` (même date => id plus grand),
+# en une seule requête grâce à la sous-requête. Message de référence
+# supprimé : messages d'id plus grand (sinon le fil resterait vide).
+def messages_after_id(queryset, message_id):
+    reference = Message.objects.filter(pk=message_id)
+    date_time = Subquery(reference.values("date_time"))
+    return queryset.filter(
+        Q(date_time__gt=date_time)
+        | Q(date_time=date_time, id__gt=message_id)
+        | Q(~Exists(reference), id__gt=message_id)
+    ).order_by("date_time", "id")
+
+
+# Pagination par curseur (keyset) : chaque page est un parcours d'index,
+# quelle que soit la taille de la table => GET /availability/user/?cursor=...
+# Curseur sur (date, heure, id) : EnTouteQuietude83_API.paginators.
+# --------------------------------------------------
+
+
+class AvailabilityCursorPagination(KeysetCursorPagination):
+    ordering = ("date", "heure", "id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
 
 
 #  Disponibilités : CRUD pour superuser :
@@ -42,69 +123,349 @@ class MessagesFilter(django_filters.FilterSet):
 class AvailabilityViewSet(viewsets.ModelViewSet):
     serializer_class = AvailabilitySerializer
     permission_classes = [permissions.IsAuthenticated, IsSuperUser]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     queryset = Availability.objects.all()
 
+    # Publication en une requête : POST /availability/superuser/bulk/
+    @action(detail=False, methods=["post"], url_path="bulk",
+            serializer_class=RecurringAvailabilitySerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 # Disponibilités : Consultation pour utilisateur non superuser :
 # =============================================
 
 
-class ReadOnlyAvailabilityViewSet(viewsets.ReadOnlyModelViewSet):
+# GET conditionnels (ETag / If-None-Match, Last-Modified / If-Modified-Since) :
+# 304 sans requête ni sérialisation tant que la collection n'a pas changé.
+# Listes sérialisées depuis values() (RowListMixin, row_serializer_class).
+
+
+class ReadOnlyAvailabilityViewSet(ConditionalListMixin, RowListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = AvailabilitySerializer
+    row_serializer_class = AvailabilityRowSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AvailabilityFilter
+    pagination_class = AvailabilityCursorPagination
     queryset = Availability.objects.all()
+    collections = ("availability",)
 
 # Rendez-Vous : ModelViewSet
 # ==============================
 
 
-class RendezVousViewSet(viewsets.ModelViewSet):
+# Lectures : ?fields=, ?expand=, ?sideload=users (EnTouteQuietude83_API.fieldsets).
+
+
+class RendezVousViewSet(ConditionalListMixin, FieldSelectionMixin, RowListMixin, viewsets.ModelViewSet):
     serializer_class = RendezVousSerializer
+    row_serializer_class = RendezVousRowSerializer
+    sideload_fields = ("user",)
     permission_classes = [permissions.IsAuthenticated]
+    # Écritures limitées par token (settings.THROTTLE_RATES["rendezvous"]).
+    throttle_classes = [UserBucketThrottle]
+    throttle_scope = "rendezvous"
     filter_backends = [DjangoFilterBackend]
     filterset_class = RendezVousFilter
+    collections = ("rendezvous",)
 
     def get_queryset(self):
         user = self.request.user
-        queryset = RendezVous.objects.all()
+        # Jointure unique : le serializer imbrique la disponibilité et l'étudiant.
+        queryset = RendezVous.objects.select_related("availability", "user")
 
         if self.request.method == "GET":
             filters = RendezVousFilter(self.request.GET, queryset=queryset)
             return filters.qs
 
         if user.is_superuser:
-            return RendezVous.objects.all()
+            return queryset
         else:
-            return RendezVous.objects.filter(user=user)
+            return queryset.filter(user=user)
 
     def perform_create(self, serializer):
+        availability = serializer.validated_data["availability"]
+        # Échec rapide, sans prendre le verrou d'écriture.
+        if availability.is_taken:
+            raise SlotAlreadyTaken()
+
+        # Réservation atomique : l'UPDATE conditionnel ne "prend" le créneau
+        # que s'il est encore libre, une seule requête concurrente peut gagner.
         with transaction.atomic():
-            rdv = serializer.save()
-            rdv.availability.is_taken = True
-            rdv.availability.save()
+            claimed = Availability.objects.filter(
+                pk=availability.pk, is_taken=False).update(
+                    is_taken=True, updated_at=timezone.now())
+            if not claimed:
+                raise SlotAlreadyTaken()
+            availability.is_taken = True
+            # QuerySet.update n'émet pas de signal.
+            bump_collections("availability", "rendezvous")
+            try:
+                serializer.save()
+            except IntegrityError:
+                # Contrainte unique_rendezvous_availability violée.
+                raise SlotAlreadyTaken()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, SlotAlreadyTaken):
+            BOOKING_CONFLICTS.inc()
+        return super().handle_exception(exc)
 
 # Messages : ModelViewSet
 # ==============================
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(FieldSelectionMixin, RowListMixin, viewsets.ModelViewSet):
     serializer_class = MessageSerializer
+    row_serializer_class = MessageRowSerializer
+    sideload_fields = ("sender",)
     permission_classes = [permissions.IsAuthenticated]
+    # Écritures limitées par token (settings.THROTTLE_RATES["messages"]).
+    throttle_classes = [UserBucketThrottle]
+    throttle_scope = "messages"
     filter_backends = [DjangoFilterBackend]
     filterset_class = MessagesFilter
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Message.objects.all()
+        # Jointure unique : le serializer imbrique l'expéditeur.
+        queryset = Message.objects.select_related("sender")
 
         if self.request.method == "GET":
             filters = MessagesFilter(self.request.GET, queryset=queryset)
             return filters.qs
 
         if user.is_superuser:
-            return Message.objects.all()
+            return queryset
         else:
-            return Message.objects.filter(rdv__user=user)
+            return queryset.filter(rdv__user=user)
+
+    def perform_create(self, serializer):
+        message = serializer.save()
+        data = message_event_data(message)
+        # Diffusion aux flux SSE ouverts, une fois le message réellement en base.
+        transaction.on_commit(lambda: get_broker().publish(
+            message.rdv_id, message.id, data))
+
+
+# Exports en flux (superuser) :
+# GET /availability/rendezvous/export/?output=csv|ndjson&date_from=&date_to=
+# GET /availability/messages/export/ (mêmes paramètres)
+# ==============================
+
+
+class ExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+    authentication_classes = [CachedTokenAuthentication]
+    kind = None
+
+    def get(self, request):
+        params = ExportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output = params.validated_data["output"]
+        response = StreamingHttpResponse(
+            export_lines(self.kind, output,
+                         params.validated_data.get("date_from"),
+                         params.validated_data.get("date_to")),
+            content_type=OUTPUT_FORMATS[output])
+        response["Content-Disposition"] = f'attachment; filename="{self.kind}.{output}"'
+        return response
+
+
+# Synchronisation incrémentale (clients hors ligne) :
+# GET /availability/sync/ (complète), puis /availability/sync/?token=<jeton reçu>
+# => lignes créées / modifiées et ids supprimés depuis ; 410 si le jeton est
+# trop ancien (pierres tombales purgées) : refaire une synchronisation complète.
+# ==============================
+
+
+class SyncView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+
+    def get(self, request):
+        return Response(sync_changes(request.user, request.query_params.get("token")))
+
+
+# Messages : flux Server-Sent Events (push des nouveaux messages)
+# GET /availability/rendezvous/<rdv_id>/stream/ (reprise avec Last-Event-ID)
+# ==============================
+
+
+def get_stream_token(request):
+    header = request.META.get("HTTP_AUTHORIZATION", "").split()
+    if len(header) == 2 and header[0].lower() == "token":
+        return header[1]
+    # EventSource (navigateur) ne permet pas d'envoyer d'en-tête.
+    return request.GET.get("token")
+
+
+async def message_stream(request, rdv_id):
+    key = get_stream_token(request)
+    if not key:
+        return JsonResponse({"detail": "Informations d'authentification non fournies."}, status=401)
+    try:
+        user, _ = await sync_to_async(
+            CachedTokenAuthentication().authenticate_credentials)(key)
+    except exceptions.AuthenticationFailed as exc:
+        return JsonResponse({"detail": str(exc.detail)}, status=401)
+
+    owner_id = await RendezVous.objects.filter(
+        pk=rdv_id).values_list("user_id", flat=True).afirst()
+    if owner_id is None:
+        return JsonResponse({"detail": "Rendez-vous introuvable."}, status=404)
+    if not (user.is_superuser or owner_id == user.id):
+        return JsonResponse({"detail": "Accès refusé."}, status=403)
+
+    last_event_id = request.headers.get(
+        "Last-Event-ID") or request.GET.get("last_event_id")
+    if last_event_id is not None and not last_event_id.isdigit():
+        last_event_id = None
+
+    # Place réservée avant la réponse (503 immédiat).
+    slot = stream_limiter.acquire_slot(settings.MESSAGE_STREAM_MAX_CONNECTIONS)
+    if slot is None:
+        response = JsonResponse(
+            {"detail": "Trop de flux ouverts, réessayez plus tard."}, status=503)
+        response["Retry-After"] = str(settings.MESSAGE_STREAM_RETRY_AFTER)
+        return response
+    try:
+        return EventStreamResponse(
+            message_event_stream(rdv_id, last_event_id and int(last_event_id), slot), slot)
+    except BaseException:
+        slot.release()
+        raise
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    # La place est rendue par le flux (fin, déconnexion), par close() ou, si
+    # la réponse n'est jamais lue ni fermée (remplacée par un middleware,
+    # envoi interrompu avant le corps), quand elle est collectée.
+
+    def __init__(self, streaming_content, slot):
+        super().__init__(
+            streaming_content, content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        self.slot = slot
+        weakref.finalize(self, slot.release)
+
+    def close(self):
+        self.slot.release()
+        super().close()
+
+
+def message_event_data(message):
+    # Même contenu en direct et en relecture, sans le contexte de la requête
+    # de l'expéditeur (?fields=, ?expand=, URLs absolues).
+    return MessageSerializer(message).data
+
+
+async def message_event_stream(rdv_id, last_event_id, slot):
+    subscription = None
+    try:
+        # Abonnement avant la relecture : aucun message ne peut passer entre les deux.
+        subscription = get_broker().subscribe(rdv_id)
+        yield f"retry: {settings.MESSAGE_STREAM_RETRY_AFTER * 1000}\n\n"
+
+        replayed = set()
+        if last_event_id is not None:
+            queryset = messages_after_id(
+                Message.objects.select_related("sender").filter(rdv_id=rdv_id),
+                last_event_id)
+            async for message in queryset:
+                replayed.add(message.id)
+                yield format_event(message.id, message_event_data(message))
+
+        # Durée bornée : le client se reconnecte automatiquement (Last-Event-ID).
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.MESSAGE_STREAM_MAX_DURATION
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await subscription.get(
+                    min(settings.MESSAGE_STREAM_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event is None:
+                break
+            event_id, data = event
+            if event_id not in replayed:
+                yield format_event(event_id, data)
+    finally:
+        if subscription is not None:
+            subscription.close()
+        slot.release()
+
+
+# Lectures async (ASGI, EnTouteQuietude83_API.asyncviews) :
+# GET /availability/async/user/ (mêmes filtres, curseur et JSON que /user/)
+# GET /availability/async/rendezvous/ (rendez-vous de l'étudiant connecté)
+# GET /availability/async/messages/?rdv_id=1&after_id=42 (fil d'un rendez-vous)
+# ==============================
+
+
+@async_read_view
+async def availability_list_async(request):
+    async def build_response():
+        filters = AvailabilityFilter(request.GET, queryset=Availability.objects.all())
+        if not filters.is_valid():
+            raise translate_validation(filters.errors)
+        serializer = AvailabilityRowSerializer(context={"request": request})
+        paginator = AvailabilityCursorPagination()
+        columns = dict.fromkeys([*serializer.columns(), *paginator.ordering])
+        # Curseur DRF (mêmes liens, mêmes pages) : sa requête passe par
+        # sync_to_async, comme celles de l'ORM async.
+        page = await sync_to_async(paginator.paginate_queryset)(
+            filters.qs.values(*columns), Request(request))
+        return json_response(paginator.get_paginated_response(serializer.render(page)).data)
+
+    return await conditional_list(request, ("availability",), build_response)
+
+
+@async_read_view
+async def my_rendezvous_async(request):
+    async def build_response():
+        filters = RendezVousFilter(
+            request.GET, queryset=RendezVous.objects.filter(user=request.user))
+        if not filters.is_valid():
+            raise translate_validation(filters.errors)
+        serializer = RendezVousRowSerializer(
+            context={"request": request}, selection=FieldSelection.from_request(request))
+        rows = [row async for row in filters.qs.values(*serializer.columns())]
+        return json_response(serializer.render(rows))
+
+    return await conditional_list(request, ("rendezvous",), build_response)
+
+
+@async_read_view
+async def message_thread_async(request):
+    params = {}
+    for name in ("rdv_id", "after_id"):
+        value = request.GET.get(name)
+        if value is not None and not value.isdigit():
+            raise exceptions.ValidationError({name: ["Saisissez un nombre entier."]})
+        params[name] = value and int(value)
+    if params["rdv_id"] is None:
+        raise exceptions.ValidationError({"rdv_id": ["Ce champ est obligatoire."]})
+
+    owner_id = await RendezVous.objects.filter(
+        pk=params["rdv_id"]).values_list("user_id", flat=True).afirst()
+    if owner_id is None:
+        raise exceptions.NotFound("Rendez-vous introuvable.")
+    if not (request.user.is_superuser or owner_id == request.user.id):
+        raise exceptions.PermissionDenied("Accès refusé.")
+
+    queryset = Message.objects.filter(rdv_id=params["rdv_id"]).order_by("date_time", "id")
+    if params["after_id"] is not None:
+        queryset = messages_after_id(queryset, params["after_id"])
+    serializer = MessageRowSerializer(
+        context={"request": request}, selection=FieldSelection.from_request(request))
+    rows = [row async for row in queryset.values(*serializer.columns())]
+    return json_response(serializer.render(rows))
@@ -1,13 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import CustomUser
+from EnTouteQuietude83_API.paginators import CappedCountPaginator
 
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ('email', 'first_name', 'last_name',
                     'is_staff', 'is_active', 'is_superuser')
-    list_filter = ('email', 'is_staff', 'is_active',)
+    # Pas de filtre sur l'email : une entrée par user dans la barre latérale.
+    list_filter = ('is_staff', 'is_active', 'is_premium',)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('first_name',
@@ -21,8 +25,14 @@ class CustomUserAdmin(UserAdmin):
             'fields': ('email', 'first_name', 'last_name', 'password1', 'password2', 'is_staff', 'is_active', 'is_superuser', 'is_premium',)
         }),
     )
-    search_fields = ('email',)
+    # Préfixe de l'email, du prénom ou du nom : même recherche indexée que
+    # la liste de l'API (CustomUserQuerySet.search).
+    search_fields = ('email', 'first_name', 'last_name')
+    search_help_text = "Début de l'email, du prénom ou du nom."
     ordering = ('email',)
 
+    def get_search_results(self, request, queryset, search_term):
+        return queryset.search(search_term), False
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
@@ -0,0 +1,158 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+from rest_framework.authtoken.models import Token
+from EnTouteQuietude83_API.timing import record_timing
+
+AUTH_TOKEN_CACHE_PREFIX = "auth_token:"
+
+
+# Compteurs du cache d'authentification (par processus) :
+# ---------------------------------------------------------
+
+
+class AuthCacheStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+auth_cache_stats = AuthCacheStats()
+
+
+def token_cache_key(key):
+    return f"{AUTH_TOKEN_CACHE_PREFIX}{key}"
+
+
+def get_token_cache():
+    # None => pas de cache : un LocMemCache est propre au processus, une
+    # invalidation (déconnexion...) n'atteindrait pas les autres workers.
+    token_cache = caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+    if isinstance(token_cache, LocMemCache) and not settings.AUTH_TOKEN_CACHE_SINGLE_PROCESS:
+        return None
+    return token_cache
+
+
+def invalidate_token(key):
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        token_cache.delete(token_cache_key(key))
+        auth_cache_stats.incr("invalidations")
+
+
+def invalidate_user_tokens(user):
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        keys = Token.objects.filter(user=user).values_list("key", flat=True)
+        token_cache.delete_many([token_cache_key(key) for key in keys])
+        auth_cache_stats.incr("invalidations", len(keys))
+
+
+# TokenAuthentication avec cache : la jointure Token <=> CustomUser n'est
+# faite qu'au premier appel, puis servie depuis le cache jusqu'au TTL ou
+# jusqu'à l'invalidation (déconnexion, suppression, modification du user).
+# -------------------------------------------------------------------------
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+
+    def authenticate(self, request):
+        start = time.perf_counter()
+        try:
+            return super().authenticate(request)
+        finally:
+            record_timing(request, "auth", time.perf_counter() - start)
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        token = token_cache.get(cache_key) if token_cache is not None else None
+
+        if token is not None:
+            auth_cache_stats.incr("hits")
+        else:
+            auth_cache_stats.incr("misses")
+            model = self.get_model()
+            try:
+                token = model.objects.select_related("user").get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            if token_cache is not None:
+                token_cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+        return self.check_token(token)
+
+    def check_token(self, token):
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted."))
+
+        return (token.user, token)
+
+    # Vues async (EnTouteQuietude83_API.asyncviews) : même en-tête, même
+    # cache, ORM et cache async (pas de thread dédié à la requête).
+
+    async def aauthenticate(self, request):
+        start = time.perf_counter()
+        try:
+            auth = authentication.get_authorization_header(request).split()
+            if not auth or auth[0].lower() != self.keyword.lower().encode():
+                return None
+            if len(auth) == 1:
+                raise exceptions.AuthenticationFailed(
+                    _("Invalid token header. No credentials provided."))
+            elif len(auth) > 2:
+                raise exceptions.AuthenticationFailed(
+                    _("Invalid token header. Token string should not contain spaces."))
+            try:
+                key = auth[1].decode()
+            except UnicodeError:
+                raise exceptions.AuthenticationFailed(
+                    _("Invalid token header. Token string should not contain invalid characters."))
+            return await self.aauthenticate_credentials(key)
+        finally:
+            record_timing(request, "auth", time.perf_counter() - start)
+
+    async def aauthenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cache_key = token_cache_key(key)
+        token = await token_cache.aget(cache_key) if token_cache is not None else None
+
+        if token is not None:
+            auth_cache_stats.incr("hits")
+        else:
+            auth_cache_stats.incr("misses")
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related("user").aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            if token_cache is not None:
+                await token_cache.aset(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+        return self.check_token(token)
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.request import Request
+from .hashing import HashingPoolSaturated, pooled_check_password, pooled_make_password
+
+
+# Authentification email / mot de passe :
+# =======================================
+# ModelBackend dont le hachage se fait dans le pool dédié (user.hashing).
+# Passer par authenticate() conserve le signal user_login_failed et
+# user_can_authenticate (is_active).
+# Pool saturé : 503 + Retry-After pour l'API (gestionnaire de DRF) ; les
+# autres appelants (admin, login de session...) n'en ont pas et
+# afficheraient une 500 => calcul sur le thread de la requête.
+
+
+class PooledModelBackend(ModelBackend):
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self.pooled_authenticate(username, password, **kwargs)
+        except HashingPoolSaturated:
+            if isinstance(request, Request):
+                raise
+            return super().authenticate(request, username, password, **kwargs)
+
+    def pooled_authenticate(self, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Email inconnu : un hachage est quand même calculé pour ne pas
+            # révéler l'existence du compte par le temps de réponse.
+            pooled_make_password(password)
+            return None
+        if pooled_check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from rest_framework import exceptions, status
+
+
+# Hachage des mots de passe hors du processus courant :
+# =======================================================
+# PBKDF2 est volontairement coûteux : exécuté sur le thread de la requête,
+# une vague de connexions occupe tous les workers et affame les autres
+# endpoints. Le calcul part dans un pool de processus dédié et borné.
+
+
+def hash_passwords(passwords, workers=None):
+    # Import en masse : pool éphémère, le temps de hacher toute la liste.
+    workers = workers or settings.PASSWORD_HASH_WORKERS
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    # django.setup : les processus "spawn" (macOS, Windows) repartent de zéro.
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+# Pool permanent des requêtes (LoginView, UserCreateView) :
+# -----------------------------------------------------------
+# Au plus PASSWORD_HASH_QUEUE_LIMIT calculs en cours ou en attente par
+# processus web ; au-delà, 503 + Retry-After plutôt qu'une file sans fin.
+
+
+class HashingPoolSaturated(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Trop de connexions simultanées, réessayez dans quelques instants."
+    default_code = "hashing_pool_saturated"
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # Lu par le gestionnaire d'exceptions de DRF => en-tête Retry-After.
+        self.wait = settings.PASSWORD_HASH_RETRY_AFTER
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_POOL_WORKERS, initializer=django.setup)
+            _slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_QUEUE_LIMIT)
+        return _pool, _slots
+
+
+def reset_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _slots = None, None
+
+
+def run_in_pool(function, *args):
+    if not settings.PASSWORD_HASH_POOL_WORKERS:
+        return function(*args)
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        future = pool.submit(function, *args)
+    except (BrokenProcessPool, RuntimeError):
+        slots.release()
+        reset_pool()
+        raise HashingPoolSaturated()
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        raise HashingPoolSaturated()
+    except BrokenProcessPool:
+        # Worker tué (OOM...) : pool recréé à la prochaine requête.
+        reset_pool()
+        raise HashingPoolSaturated()
+
+
+def verify(password, encoded):
+    # (mot de passe correct, hash à mettre à jour) : calculé dans le pool.
+    if not check_password(password, encoded):
+        return False, False
+    preferred = get_hasher("default")
+    hasher = identify_hasher(encoded)
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def pooled_make_password(password):
+    return run_in_pool(make_password, password)
+
+
+def pooled_check_password(user, password):
+    # Équivalent de user.check_password(), y compris la mise à niveau du hash.
+    correct, must_update = run_in_pool(verify, password, user.password)
+    if correct and must_update:
+        user.password = pooled_make_password(password)
+        user.save(update_fields=["password"])
+    return correct
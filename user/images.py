@@ -0,0 +1,136 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_IMAGE = "default_images/user.png"
+THUMBNAIL_SIZES = (64, 128, 256)
+# extension => (format Pillow, options d'enregistrement)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True}),
+}
+
+
+# Miniatures des images de profil :
+# ===================================
+# Noms déterministes (profile_images/thumbs/<nom>_<taille>.<ext>) : les
+# serializers construisent les URLs sans requête ni champ supplémentaire.
+
+
+def thumbnail_name(image_name, size, ext):
+    directory, filename = posixpath.split(posixpath.splitext(image_name)[0])
+    return posixpath.join(directory, "thumbs", f"{filename}_{size}.{ext}")
+
+
+def thumbnail_names(image_name):
+    return [thumbnail_name(image_name, size, ext)
+            for size in THUMBNAIL_SIZES for ext in THUMBNAIL_FORMATS]
+
+
+def delete_image_and_thumbnails(image_name, storage=default_storage):
+    for name in [image_name, *thumbnail_names(image_name)]:
+        storage.delete(name)
+
+
+def _square_thumbnail(image, size):
+    # Recadrage carré centré puis redimensionnement en une seule passe.
+    width, height = image.size
+    side = min(width, height)
+    left, top = (width - side) / 2, (height - side) / 2
+    return image.resize((size, size), Image.Resampling.LANCZOS,
+                        box=(left, top, left + side, top + side),
+                        reducing_gap=2.0)
+
+
+def generate_thumbnails(image_name, storage=default_storage):
+    largest = max(THUMBNAIL_SIZES)
+    with storage.open(image_name, "rb") as file:
+        image = Image.open(file)
+        # JPEG : décodage directement à une échelle réduite (1/2, 1/4, 1/8).
+        image.draft("RGB", (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA"))
+            image = background
+        image = image.convert("RGB")
+
+    # Chaque taille est calculée à partir de la précédente (plus grande) ;
+    # reducing_gap fait d'abord un Image.reduce() entier, bien plus rapide.
+    source = image
+    for size in sorted(THUMBNAIL_SIZES, reverse=True):
+        source = _square_thumbnail(source, size)
+        for ext, (pil_format, options) in THUMBNAIL_FORMATS.items():
+            buffer = io.BytesIO()
+            source.save(buffer, pil_format, **options)
+            name = thumbnail_name(image_name, size, ext)
+            # storage.save() renommerait le fichier s'il existe déjà.
+            storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+
+# Pool de workers borné (hors du thread de la requête) :
+# --------------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PROFILE_IMAGE_WORKERS,
+                thread_name_prefix="thumbnails",
+            )
+        return _executor
+
+
+def _generate_thumbnails_logged(image_name):
+    try:
+        generate_thumbnails(image_name)
+    except Exception:
+        logger.exception(
+            "Échec de la génération des miniatures de %s", image_name)
+        raise
+
+
+def schedule_thumbnails(image_name):
+    if not settings.PROFILE_IMAGE_THUMBNAILS_ASYNC:
+        _generate_thumbnails_logged(image_name)
+        return None
+    return get_executor().submit(_generate_thumbnails_logged, image_name)
+
+
+def thumbnails_ready(image_name, storage=default_storage):
+    # Miniature écrite en dernier par generate_thumbnails (plus petite
+    # taille, dernier format) : présente => génération terminée.
+    return storage.exists(thumbnail_name(
+        image_name, min(THUMBNAIL_SIZES), list(THUMBNAIL_FORMATS)[-1]))
+
+
+def thumbnail_urls(image_name, request=None):
+    # Miniatures pas encore générées (tâche en cours) ou en échec : URL de
+    # l'image d'origine pour chaque taille et chaque format.
+    if not image_name:
+        return None
+    ready = thumbnails_ready(image_name)
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        urls[str(size)] = {}
+        for ext in THUMBNAIL_FORMATS:
+            url = default_storage.url(
+                thumbnail_name(image_name, size, ext) if ready else image_name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[str(size)][ext] = url
+    return urls
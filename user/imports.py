@@ -0,0 +1,121 @@
+import csv
+import json
+import time
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from .hashing import hash_passwords
+from .serializers import UserImportSerializer
+
+User = get_user_model()
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_FORMATS = ("csv", "json")
+
+
+# Import en masse d'élèves (commande import_users, POST /user/import/) :
+# ========================================================================
+# Validation ligne par ligne, doublons détectés en quelques requêtes,
+# mots de passe hachés dans un pool de processus, puis bulk_create par lots.
+
+
+def read_rows(file, kind):
+    # CSV : en-tête email,first_name,last_name,telephone,password
+    # JSON : liste d'objets avec les mêmes clés.
+    if kind == "csv":
+        return list(csv.DictReader(file))
+    rows = json.load(file)
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Le JSON doit être une liste d'objets.")
+    return rows
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.created = 0
+        self.duplicates = []
+        self.errors = []
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 2),
+            "users_per_second": round(self.created / self.seconds, 1) if self.seconds else None,
+        }
+
+
+def error_messages(errors):
+    return {field: [str(message) for message in messages]
+            for field, messages in errors.items()}
+
+
+def existing_emails(emails, chunk_size=IMPORT_BATCH_SIZE):
+    existing = set()
+    for i in range(0, len(emails), chunk_size):
+        existing.update(User.objects.filter(
+            email__in=emails[i:i + chunk_size]).values_list("email", flat=True))
+    return existing
+
+
+def import_users(rows, workers=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    start = time.perf_counter()
+    report = ImportReport()
+
+    valid = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        serializer = UserImportSerializer(data=row)
+        if not serializer.is_valid():
+            report.errors.append({"row": number, "errors": error_messages(serializer.errors)})
+            continue
+        data = serializer.validated_data
+        data["email"] = User.objects.normalize_email(data["email"])
+        if data["email"] in seen:
+            report.duplicates.append({"row": number, "email": data["email"]})
+            continue
+        seen.add(data["email"])
+        valid.append((number, data))
+
+    valid = skip_existing(valid, report)
+
+    if not dry_run and valid:
+        passwords = hash_passwords([data.pop("password") for _, data in valid], workers)
+        users = {number: User(password=password, **data)
+                 for (number, data), password in zip(valid, passwords)}
+        inserted = insert_users(users, batch_size)
+        for number, user in users.items():
+            if number not in inserted:
+                report.duplicates.append({"row": number, "email": user.email})
+        report.duplicates.sort(key=lambda duplicate: duplicate["row"])
+        valid = [(number, data) for number, data in valid if number in inserted]
+    report.created = len(valid)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def skip_existing(valid, report):
+    # Lignes dont l'adresse existe déjà en base => doublons.
+    existing = existing_emails([data["email"] for _, data in valid])
+    for number, data in valid:
+        if data["email"] in existing:
+            report.duplicates.append({"row": number, "email": data["email"]})
+    report.duplicates.sort(key=lambda duplicate: duplicate["row"])
+    return [(number, data) for number, data in valid if data["email"] not in existing]
+
+
+def insert_users(users, batch_size):
+    # {ligne: user} => lignes réellement insérées. Adresse prise entre la
+    # vérification et l'insertion (inscription, autre import) : ligne
+    # ignorée (ignore_conflicts), puis reconnue au hash du mot de passe
+    # (sel aléatoire : propre à cette ligne).
+    with transaction.atomic():
+        User.objects.bulk_create(users.values(), batch_size=batch_size, ignore_conflicts=True)
+    emails = [user.email for user in users.values()]
+    stored = set()
+    for i in range(0, len(emails), batch_size):
+        stored.update(User.objects.filter(
+            email__in=emails[i:i + batch_size]).values_list("email", "password"))
+    return {number for number, user in users.items() if (user.email, user.password) in stored}
@@ -0,0 +1,74 @@
+import random
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from availability.benchmarks import BENCH_PASSWORD, authenticated_client, benchmark_database, run_workers, seed_dataset, timed_request
+from user.hashing import reset_pool
+
+MODES = ("inline", "pool")
+
+
+# Isolation du hachage des mots de passe : latence des lectures de créneaux
+# pendant une vague de connexions, hachage sur le thread de la requête
+# ("inline") puis dans le pool de processus borné ("pool") :
+#   python manage.py benchmark_password_pool --login-threads 8 --read-threads 4
+class Command(BaseCommand):
+    help = "Compare la latence des autres endpoints pendant une vague de connexions (inline / pool)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--login-threads", type=int, default=8)
+        parser.add_argument("--read-threads", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Durée de mesure par mode (secondes).")
+        parser.add_argument("--pool-workers", type=int, default=2)
+        parser.add_argument("--queue-limit", type=int, default=4)
+
+    def handle(self, *args, **options):
+        results = {}
+        with benchmark_database():
+            dataset = seed_dataset(students=20, slots=500, messages_per_rdv=2)
+            for mode in MODES:
+                workers = options["pool_workers"] if mode == "pool" else 0
+                # Sans limitation de débit : la vague de connexions doit passer.
+                with override_settings(PASSWORD_HASH_POOL_WORKERS=workers,
+                                       PASSWORD_HASH_QUEUE_LIMIT=options["queue_limit"],
+                                       THROTTLE_RATES={}):
+                    reset_pool()
+                    self.stderr.write(f"- {mode}")
+                    results[mode] = run_workers(
+                        options["login_threads"] + options["read_threads"],
+                        options["duration"], self.task(dataset, options["login_threads"]))
+                reset_pool()
+        self.print_results(results)
+
+    def task(self, dataset, login_threads):
+        login_url = reverse("user:user-login")
+        availability_url = reverse("availability:availability-list")
+        clients = {}
+
+        def task(index, recorder):
+            student = random.choice(dataset["students"])
+            if index < login_threads:
+                client = clients.setdefault(index, APIClient())
+                res = timed_request(recorder, "login", client.post, login_url, {
+                    "email": student["email"], "password": BENCH_PASSWORD},
+                    expected=(200, 503))
+                if res is not None and res.status_code == 503:
+                    recorder.record("login-503", 0.0)
+            else:
+                client = clients.get(index)
+                if client is None:
+                    client = clients[index] = authenticated_client(student["token"])
+                timed_request(recorder, "availability-list", client.get, availability_url)
+
+        return task
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{'mode':<8}{'endpoint':<20}{'req':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for mode, endpoints in results.items():
+            for name, stats in endpoints.items():
+                self.stdout.write(
+                    f"{mode:<8}{name:<20}{stats['requests']:>7}{stats['throughput']:>9}"
+                    f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
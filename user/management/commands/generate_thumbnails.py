@@ -0,0 +1,36 @@
+from concurrent.futures import as_completed
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from user.images import DEFAULT_PROFILE_IMAGE, generate_thumbnails, get_executor
+
+User = get_user_model()
+
+
+# (Re)génère les miniatures de toutes les images de profil, image par défaut
+# comprise => python manage.py generate_thumbnails
+class Command(BaseCommand):
+    help = "Génère les miniatures (64/128/256 px, WebP et JPEG) des images de profil."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only-default", action="store_true",
+            help="Ne traiter que l'image de profil par défaut.")
+
+    def handle(self, *args, **options):
+        names = {DEFAULT_PROFILE_IMAGE}
+        if not options["only_default"]:
+            names.update(User.objects.exclude(profile_image="").exclude(
+                profile_image__isnull=True).values_list("profile_image", flat=True).distinct())
+
+        futures = {get_executor().submit(generate_thumbnails, name): name
+                   for name in sorted(names)}
+        failures = 0
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as exc:
+                failures += 1
+                self.stderr.write(f"{futures[future]} : {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(names) - failures} image(s) traitée(s), {failures} échec(s)."))
@@ -0,0 +1,47 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from user.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, import_users, read_rows
+
+
+# Import en masse d'élèves depuis un fichier CSV ou JSON :
+#   python manage.py import_users eleves.csv --workers 8
+# Colonnes / clés : email, first_name, last_name, telephone (optionnel), password
+class Command(BaseCommand):
+    help = "Importe des élèves (CSV/JSON) : hachage parallèle des mots de passe, insertion par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--input", choices=IMPORT_FORMATS,
+                            help="Format du fichier (défaut : d'après l'extension).")
+        parser.add_argument("--workers", type=int,
+                            help="Processus de hachage (défaut : PASSWORD_HASH_WORKERS).")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Valider le fichier sans rien créer.")
+
+    def handle(self, *args, **options):
+        kind = options["input"] or os.path.splitext(options["path"])[1].lower().lstrip(".")
+        if kind not in IMPORT_FORMATS:
+            raise CommandError("Format inconnu : utiliser --input csv ou --input json.")
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as file:
+                rows = read_rows(file, kind)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Lecture impossible : {exc}")
+
+        report = import_users(rows, options["workers"], options["batch_size"],
+                              options["dry_run"])
+
+        for duplicate in report.duplicates:
+            self.stderr.write(f"ligne {duplicate['row']} : email déjà utilisé ({duplicate['email']})")
+        for error in report.errors:
+            details = "; ".join(f"{field} : {' '.join(messages)}"
+                                for field, messages in error["errors"].items())
+            self.stderr.write(f"ligne {error['row']} : {details}")
+
+        summary = report.as_dict()
+        verb = "à créer (dry-run)" if options["dry_run"] else "créé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.created} élève(s) {verb}, {len(report.duplicates)} doublon(s), "
+            f"{len(report.errors)} erreur(s) en {summary['seconds']} s "
+            f"({summary['users_per_second'] or 0} élèves/s)."))
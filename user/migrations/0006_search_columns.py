@@ -0,0 +1,70 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+SEARCH_FIELDS = ("email", "first_name", "last_name")
+
+
+# Colonnes de recherche des comptes existants (minuscules Unicode).
+def fill_search_columns(apps, schema_editor):
+    User = apps.get_model("user", "CustomUser")
+    users = User.objects.using(schema_editor.connection.alias).only(*SEARCH_FIELDS)
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        for field in SEARCH_FIELDS:
+            setattr(user, f"{field}_search", (getattr(user, field) or "").lower())
+        batch.append(user)
+        if len(batch) == 2000:
+            User.objects.bulk_update(batch, [f"{field}_search" for field in SEARCH_FIELDS])
+            batch = []
+    User.objects.bulk_update(batch, [f"{field}_search" for field in SEARCH_FIELDS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_email_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_first_name_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_last_name_lower_idx',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='email_search',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='first_name_search',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='last_name_search',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['email_search'], name='user_email_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['first_name_search'], name='user_first_name_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name_search'], name='user_last_name_search_idx'),
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from availability.models import Availability, RendezVous
+from availability.models import Availability
 
 
 class MyUserManager(BaseUserManager):
-    def create_user(self, email, first_name, last_name, password=None, **kwargs):
+    def create_user(self, email, first_name, last_name, password=None, encoded_password=None, **kwargs):
         if not email:
             raise ValueError("Vous devez entrer une adresse email valide.")
         if not first_name and last_name:
@@ -15,9 +16,14 @@ class MyUserManager(BaseUserManager):
             user = self.model(
                 email=self.normalize_email(email),
                 first_name=first_name,
-                last_name=last_name
+                last_name=last_name,
+                **kwargs
             )
-            user.set_password(password)
+            if encoded_password is not None:
+                # Déjà haché (pool de hachage, import en masse).
+                user.password = encoded_password
+            else:
+                user.set_password(password)
             user.save()
             return user
 
@@ -31,6 +37,63 @@ class MyUserManager(BaseUserManager):
         return user
 
 
+# Suppression ensembliste : les créneaux réservés par les users sont
+# supprimés en quelques DELETE (cascade SQL : rendez-vous puis messages),
+# quel que soit le nombre de rendez-vous ou de messages.
+
+
+def delete_booked_availabilities(users):
+    return Availability.objects.filter(rendezvous__user__in=users).delete()
+
+
+# Recherche par préfixe (liste des users, admin) :
+# Chaque mot doit commencer l'email, le prénom ou le nom (insensible à la
+# casse). Intervalle [préfixe, préfixe + U+10FFFF) sur LOWER(colonne) plutôt
+# que LIKE : parcours des index sur expression user_*_lower_idx (SQLite
+# n'utilise pas d'index pour un LIKE sur une expression).
+
+SEARCH_FIELDS = ("email", "first_name", "last_name")
+SEARCH_MAX_WORDS = 4
+
+
+def prefix_range(prefix):
+    return prefix, prefix + chr(0x10FFFF)
+
+
+def search_key(value):
+    # Minuscules calculées en Python (É => é) : LOWER() de SQLite ne
+    # convertit que l'ASCII.
+    return (value or "").lower()
+
+
+class CustomUserQuerySet(models.QuerySet):
+
+    def delete(self):
+        with transaction.atomic():
+            delete_booked_availabilities(self)
+            return super().delete()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for user in objs:
+            user.set_search_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def search(self, term):
+        # Colonnes <champ>_search (minuscules, indexées) tenues à jour par
+        # save() et bulk_create().
+        words = search_key(term).split()[:SEARCH_MAX_WORDS]
+        if not words:
+            return self
+        queryset = self
+        for word in words:
+            start, end = prefix_range(word)
+            queryset = queryset.filter(Q(*[
+                Q(**{f"{field}_search__gte": start, f"{field}_search__lt": end})
+                for field in SEARCH_FIELDS], _connector=Q.OR))
+        return queryset
+
+
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(
         unique=True, max_length=255, blank=False, verbose_name="Adresse Email")
@@ -45,16 +108,35 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
+    # Recherche (CustomUserQuerySet.search) : champs en minuscules.
+    email_search = models.CharField(max_length=255, default="", editable=False)
+    first_name_search = models.CharField(max_length=255, default="", editable=False)
+    last_name_search = models.CharField(max_length=255, default="", editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name"]
-    objects = MyUserManager()
+    objects = MyUserManager.from_queryset(CustomUserQuerySet)()
 
-    def delete(self, *args, **kwargs):
-        rendezvous = RendezVous.objects.filter(user=self)
+    class Meta:
+        indexes = [
+            models.Index(fields=["email_search"], name="user_email_search_idx"),
+            models.Index(fields=["first_name_search"], name="user_first_name_search_idx"),
+            models.Index(fields=["last_name_search"], name="user_last_name_search_idx"),
+        ]
 
-        for rdv in rendezvous:
-            rdv.availability.delete()
-            rdv.delete()
+    def set_search_fields(self):
+        for field in SEARCH_FIELDS:
+            setattr(self, f"{field}_search", search_key(getattr(self, field)))
 
-        super().delete(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        self.set_search_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *(
+                f"{field}_search" for field in SEARCH_FIELDS if field in update_fields)}
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            delete_booked_availabilities([self])
+            return super().delete(*args, **kwargs)
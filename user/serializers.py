@@ -1,7 +1,11 @@
-from django.contrib.auth import get_user_model, authenticate
-from django.core.files.storage import default_storage
+from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
+from EnTouteQuietude83_API.fieldsets import SparseFieldsMixin
+from EnTouteQuietude83_API.rows import Column, RowSerializer
+from .hashing import pooled_make_password
+from .images import DEFAULT_PROFILE_IMAGE, delete_image_and_thumbnails, schedule_thumbnails, thumbnail_urls
 
 # Récupération du modèle CustomUser
 User = get_user_model()
@@ -18,15 +22,11 @@ class UserCreationSerializer(serializers.ModelSerializer):
         fields = ('email', 'first_name', 'last_name', 'telephone', 'password')
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            email=validated_data['email'],
-            first_name=validated_data['first_name'],
-            last_name=validated_data['last_name'],
-            password=validated_data['password']
-        )
-        if 'telephone' in validated_data:
-            user.telephone = validated_data['telephone']
-            user.save()
+        # Un seul INSERT : le téléphone est passé à create_user ; le mot de
+        # passe est haché dans le pool dédié (user.hashing).
+        validated_data["encoded_password"] = pooled_make_password(
+            validated_data.pop("password"))
+        user = User.objects.create_user(**validated_data)
         return {
             'id': user.id,
             'email': user.email,
@@ -36,26 +36,87 @@ class UserCreationSerializer(serializers.ModelSerializer):
         }
 
 
+# Import en masse (user.imports) : mêmes champs que l'inscription, l'unicité
+# des emails est vérifiée pour tout le fichier à la fois.
+
+
+class UserImportSerializer(UserCreationSerializer):
+
+    class Meta(UserCreationSerializer.Meta):
+        extra_kwargs = {"email": {"validators": []}}
+
+
 #  Get ALL users :
 # ==================
-class UserSerializer(serializers.ModelSerializer):
+class ProfileThumbnailsMixin(serializers.Serializer):
+    # {"64": {"webp": url, "jpeg": url}, "128": {...}, "256": {...}}
+    profile_thumbnails = serializers.SerializerMethodField()
+
+    def get_profile_thumbnails(self, instance):
+        return thumbnail_urls(instance.profile_image.name,
+                              self.context.get("request"))
+
+
+class UserSerializer(SparseFieldsMixin, ProfileThumbnailsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'first_name', 'last_name',
-                  'telephone', 'profile_image', 'is_premium', 'is_active')
+                  'telephone', 'profile_image', 'profile_thumbnails',
+                  'is_premium', 'is_active')
+
+
+# Version compilée de UserSerializer (listes, EnTouteQuietude83_API.rows) :
+# les URLs d'une même image (souvent l'image par défaut) sont calculées une
+# fois par réponse.
+
+
+class ProfileImageColumn(Column):
+
+    def __init__(self, key, thumbnails=False):
+        super().__init__(key, source="profile_image")
+        self.thumbnails = thumbnails
+
+    def accessor(self, prefix, context, selection):
+        column = prefix + self.source
+        request = context.get("request")
+        storage = User._meta.get_field("profile_image").storage
+        cache = {}
+
+        def get(row):
+            name = row[column]
+            if name not in cache:
+                if self.thumbnails:
+                    cache[name] = thumbnail_urls(name, request)
+                elif not name:
+                    cache[name] = None
+                else:
+                    url = storage.url(name)
+                    cache[name] = request.build_absolute_uri(url) if request is not None else url
+            return cache[name]
+        return get
+
+
+class UserRowSerializer(RowSerializer):
+    fields = (
+        Column("id"), Column("email"), Column("first_name"), Column("last_name"),
+        Column("telephone"), ProfileImageColumn("profile_image"),
+        ProfileImageColumn("profile_thumbnails", thumbnails=True),
+        Column("is_premium"), Column("is_active"),
+    )
 
 # Update d'un User :
 # ====================
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(ProfileThumbnailsMixin, serializers.ModelSerializer):
     is_superuser = serializers.BooleanField(read_only=True)
     is_premium = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = User
         fields = ("id", 'email', 'first_name', 'last_name',
-                  'telephone', 'profile_image', 'is_superuser', 'is_premium')
+                  'telephone', 'profile_image', 'profile_thumbnails',
+                  'is_superuser', 'is_premium')
         read_only_fields = ['id']
 
     def update(self, instance, validated_data):
@@ -72,10 +133,15 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         if 'profile_image' in validated_data:
             old_image_path = instance.profile_image.name  # change .path to .name
             instance.profile_image = validated_data['profile_image']
-            # Si l'ancienne image n'est pas l'image par défaut
-            if old_image_path != 'default_images/user.png':  # remove the leading slash
-                default_storage.delete(old_image_path)
+            # Si l'ancienne image n'est pas l'image par défaut (ni vide),
+            # suppression de l'originale et de toutes ses miniatures.
+            if old_image_path and old_image_path != DEFAULT_PROFILE_IMAGE:
+                delete_image_and_thumbnails(old_image_path)
         instance.save()
+        if 'profile_image' in validated_data and instance.profile_image:
+            # Miniatures générées hors du thread de la requête.
+            image_name = instance.profile_image.name
+            transaction.on_commit(lambda: schedule_thumbnails(image_name))
         return instance
 
 
@@ -103,9 +169,10 @@ class LoginSerializer(serializers.Serializer):
     )
 
     def validate(self, data):
-        user = authenticate(username=data.get('email'),
-                            password=data.get('password'))
-        if user and user.is_active:
+        # Hachage dans le pool dédié : user.backends.PooledModelBackend.
+        user = authenticate(self.context.get("request"),
+                            email=data.get('email'), password=data.get('password'))
+        if user is not None:
             return user
         raise serializers.ValidationError("Email/password incorrects.")
 
@@ -113,3 +180,15 @@ class LoginSerializer(serializers.Serializer):
         token, created = Token.objects.get_or_create(
             user=validated_data['user'])
         return token
+
+
+# Suppression groupée (superuser) :
+# ----------------------------------
+
+MAX_BULK_DELETE = 1000
+
+
+class UserBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=MAX_BULK_DELETE)
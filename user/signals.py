@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user_tokens
+
+User = get_user_model()
+
+
+# Invalidation du cache d'authentification :
+# ============================================
+
+# Déconnexion (LogoutView) et suppression d'un user (cascade sur le Token).
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# Toute modification du user (mot de passe, désactivation, profil) rend
+# obsolète la copie mise en cache avec le Token.
+@receiver(post_save, sender=User)
+def invalidate_updated_user(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance)
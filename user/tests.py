@@ -1,8 +1,35 @@
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache, caches
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from asgiref.sync import sync_to_async
+from user.authentication import auth_cache_stats, token_cache_key
+from user.hashing import reset_pool, run_in_pool
+from user.imports import import_users
+from EnTouteQuietude83_API.metrics import registry
+from EnTouteQuietude83_API.throttling import InProcessBucketStore, IPBucketThrottle, get_bucket_store
+from user.views import LoginView
+from availability.models import Availability, RendezVous, Message
+from user.images import THUMBNAIL_SIZES, generate_thumbnails, schedule_thumbnails, thumbnail_names, thumbnail_urls
+from PIL import Image
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
 # Urls de test :
 # ================
@@ -17,8 +44,12 @@ CREATE_USER_URL = reverse("user:user-create")
 LOGIN_URL = reverse("user:user-login")
 LIST_URL = reverse("user:user-list")
 ME_URL = reverse("user:user-update")
+ASYNC_ME_URL = reverse("user:user-async-me")
 PASSWORD_UPDATE_URL = reverse("user:user-update-password")
 LOGOUT_URL = reverse("user:user-logout")
+IMPORT_URL = reverse("user:user-import")
+BULK_DELETE_URL = reverse("user:user-bulk-delete")
+AUTH_CACHE_STATS_URL = reverse("user:user-auth-cache-stats")
 
 
 def create_user(**params):
@@ -32,6 +63,7 @@ def create_user(**params):
 class PublicUserAPITest(TestCase):
 
     def setUp(self):
+        get_bucket_store().clear()
         self.client = APIClient()
 
     def test_create_user_sucess(self):
@@ -49,6 +81,25 @@ class PublicUserAPITest(TestCase):
         self.assertTrue(user.check_password(payload["password"]))
         self.assertNotIn("password", res.data)
 
+    def test_create_user_with_telephone_single_insert(self):
+        payload = {
+            "email": "gerard@gmail.com",
+            "first_name": "Gérard",
+            "last_name": "Michaud",
+            "telephone": "0612345678",
+            "password": "Gerard123"
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        writes = [q["sql"] for q in queries.captured_queries
+                  if q["sql"].startswith(("INSERT", "UPDATE"))]
+        self.assertEqual(len(writes), 1)
+        user = get_user_model().objects.get(email=payload["email"])
+        self.assertEqual(user.telephone, payload["telephone"])
+
     def test_create_user_email_exists(self):
         payload = {
             "email": "gerard@gmail.com",
@@ -204,3 +255,815 @@ class SuperUserAPITest(TestCase):
     def test_get_all_profile_success(self):
         res = self.client.get(LIST_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_user_list_compiled_matches_serializer(self):
+        create_user(email="gerard@gmail.com", first_name="Gérard", last_name="Michaud",
+                    password="Gerard123", telephone="0601020304")
+        create_user(email="doudou@gmail.com", first_name="Doudou", last_name="Martin",
+                    password="Doudou123", profile_image="profile_images/doudou.png")
+        create_user(email="sans@gmail.com", first_name="Sans", last_name="Image",
+                    password="Sans12345", profile_image="", is_premium=True, is_active=False)
+
+        compiled = self.client.get(LIST_URL)
+        with override_settings(ROW_SERIALIZATION_ENABLED=False):
+            reference = self.client.get(LIST_URL)
+
+        self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(compiled.data["results"]), 4)
+        self.assertEqual(compiled.content, reference.content)
+
+        compiled = self.client.get(LIST_URL, {"fields": "id,email,profile_thumbnails"})
+        with override_settings(ROW_SERIALIZATION_ENABLED=False):
+            reference = self.client.get(LIST_URL, {"fields": "id,email,profile_thumbnails"})
+        self.assertEqual(list(compiled.data["results"][0]), ["id", "email", "profile_thumbnails"])
+        self.assertEqual(compiled.content, reference.content)
+
+
+# Liste des users : pagination, recherche par préfixe, filtres :
+# ===================================================================
+
+
+class UserListSearchTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.client.force_authenticate(user=self.admin_user)
+        get_user_model().objects.bulk_create([
+            get_user_model()(email=f"eleve{i:02}@gmail.com", first_name="Eleve", last_name=f"Nom{i:02}",
+                             is_premium=i % 3 == 0, is_active=i % 5 != 0)
+            for i in range(30)
+        ])
+        self.gerard = create_user(email="gerard@gmail.com", first_name="Gérard",
+                                  last_name="Michaud", password="Gerard123")
+
+    def emails(self, params):
+        res = self.client.get(LIST_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [user["email"] for user in res.data["results"]]
+
+    def test_cursor_pagination(self):
+        res = self.client.get(LIST_URL, {"page_size": 10, "fields": "id"})
+        self.assertEqual(len(res.data["results"]), 10)
+        seen = [user["id"] for user in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [user["id"] for user in res.data["results"]]
+        self.assertEqual(len(seen), 32)
+        self.assertEqual(len(set(seen)), 32)
+
+    def test_prefix_search(self):
+        self.assertEqual(self.emails({"search": "GER"}), ["gerard@gmail.com"])
+        self.assertEqual(self.emails({"search": "mich"}), ["gerard@gmail.com"])
+        self.assertEqual(self.emails({"search": "gérard michaud"}), ["gerard@gmail.com"])
+        self.assertEqual(self.emails({"search": "nom0"}),
+                         [f"eleve0{i}@gmail.com" for i in range(10)])
+        # Préfixe uniquement : "ichaud" ne correspond pas.
+        self.assertEqual(self.emails({"search": "ichaud"}), [])
+
+    def test_search_accented_capitals(self):
+        # LOWER() de SQLite laisse "É" tel quel : minuscules calculées en Python.
+        elodie = create_user(email="elodie@gmail.com", first_name="Élodie",
+                             last_name="Çelik", password="Elodie123")
+        self.assertEqual(self.emails({"search": "élo"}), [elodie.email])
+        self.assertEqual(self.emails({"search": "ÉLODIE çel"}), [elodie.email])
+
+        elodie.last_name = "Àubert"
+        elodie.save(update_fields=["last_name"])
+        self.assertEqual(self.emails({"search": "àub"}), [elodie.email])
+
+    def test_filters(self):
+        premium = self.emails({"is_premium": "true", "search": "eleve"})
+        self.assertEqual(premium, [f"eleve{i:02}@gmail.com" for i in range(0, 30, 3)])
+        inactive = self.emails({"is_active": "false"})
+        self.assertEqual(inactive, [f"eleve{i:02}@gmail.com" for i in range(0, 30, 5)])
+
+    def test_search_uses_indexes(self):
+        plan = get_user_model().objects.search("gér mi").order_by("email")[:51].explain()
+        for index in ("user_email_search_idx", "user_first_name_search_idx", "user_last_name_search_idx"):
+            self.assertIn(index, plan)
+        self.assertNotIn("SCAN user_customuser", plan)
+
+    def test_admin_search_uses_prefix_search(self):
+        self.client.force_login(self.admin_user)
+        res = self.client.get(reverse("admin:user_customuser_changelist"), {"q": "Michaud"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.context["cl"].result_list), [self.gerard])
+
+
+# Suppression ensembliste (user, rendez-vous, créneaux, messages) :
+# ===================================================================
+
+
+def create_student_with_history(index, rdv_count, messages_per_rdv=5):
+    # Sans hachage de mot de passe : seul le coût de la suppression compte ici.
+    user = get_user_model().objects.create(
+        email=f"eleve{index}@gmail.com", first_name="Eleve", last_name=str(index))
+    Token.objects.create(user=user)
+    for day in range(rdv_count):
+        avail = Availability.objects.create(
+            date=datetime.date(2023, 9, 1) + datetime.timedelta(days=day),
+            heure=datetime.time(9 + index % 8), is_taken=True)
+        rdv = RendezVous.objects.create(user=user, degree="CM1", availability=avail)
+        Message.objects.bulk_create([
+            Message(rdv=rdv, sender=user, content="Bonjour",
+                    date_time=datetime.datetime(2023, 9, 1, 12, tzinfo=datetime.timezone.utc))
+            for _ in range(messages_per_rdv)
+        ])
+    return user
+
+
+class UserDeletionTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.client.force_authenticate(user=self.admin_user)
+
+    def assertUserErased(self, user_id):
+        self.assertFalse(get_user_model().objects.filter(pk=user_id).exists())
+        self.assertFalse(RendezVous.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Message.objects.filter(sender_id=user_id).exists())
+        self.assertFalse(Token.objects.filter(user_id=user_id).exists())
+
+    def test_delete_removes_booked_availabilities(self):
+        user = create_student_with_history(1, rdv_count=3)
+        free = Availability.objects.create(
+            date=datetime.date(2023, 9, 1), heure=datetime.time(18))
+
+        user.delete()
+
+        self.assertUserErased(user.id)
+        self.assertEqual(list(Availability.objects.all()), [free])
+
+    def test_delete_query_count_independent_of_history(self):
+        small = create_student_with_history(1, rdv_count=1, messages_per_rdv=1)
+        large = create_student_with_history(2, rdv_count=30, messages_per_rdv=20)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            small.delete()
+        with CaptureQueriesContext(connection) as large_queries:
+            large.delete()
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertUserErased(large.id)
+
+    def test_bulk_delete_users(self):
+        users = [create_student_with_history(i, rdv_count=2) for i in range(3)]
+        keep = create_student_with_history(9, rdv_count=1)
+
+        res = self.client.post(BULK_DELETE_URL, {"ids": [users[0].id, users[1].id, 999999]},
+                               format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"deleted": [users[0].id, users[1].id], "not_found": [999999]})
+        for user in users[:2]:
+            self.assertUserErased(user.id)
+        self.assertEqual(RendezVous.objects.filter(user__in=[users[2], keep]).count(), 3)
+        self.assertEqual(Availability.objects.count(), 3)
+
+    def test_bulk_delete_query_count_independent_of_users(self):
+        few = [create_student_with_history(i, rdv_count=1).id for i in range(2)]
+        many = [create_student_with_history(i, rdv_count=5).id for i in range(10, 30)]
+
+        with CaptureQueriesContext(connection) as few_queries:
+            self.client.post(BULK_DELETE_URL, {"ids": few}, format="json")
+        with CaptureQueriesContext(connection) as many_queries:
+            self.client.post(BULK_DELETE_URL, {"ids": many}, format="json")
+
+        self.assertEqual(len(few_queries), len(many_queries))
+
+    def test_bulk_delete_requires_superuser(self):
+        user = create_student_with_history(1, rdv_count=1)
+        self.client.force_authenticate(user=user)
+        res = self.client.post(BULK_DELETE_URL, {"ids": [user.id]}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_delete_invalid_payload(self):
+        res = self.client.post(BULK_DELETE_URL, {"ids": []}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Hachage des mots de passe dans le pool borné :
+# ================================================
+
+
+class PasswordHashingPoolTest(TestCase):
+
+    def setUp(self):
+        get_bucket_store().clear()
+        reset_pool()
+        self.addCleanup(reset_pool)
+        self.client = APIClient()
+        self.payload = {
+            "email": "gerard@gmail.com",
+            "first_name": "Gérard",
+            "last_name": "Michaud",
+            "password": "Gerard123"
+        }
+
+    def test_hashing_runs_in_separate_process(self):
+        self.assertNotEqual(run_in_pool(os.getpid), os.getpid())
+
+    def test_login_and_registration_through_pool(self):
+        res = self.client.post(CREATE_USER_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": self.payload["password"]})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": "Mauvais123"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(LOGIN_URL, {"email": "inconnu@gmail.com",
+                                           "password": "Mauvais123"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_upgrades_outdated_hash(self):
+        user = create_user(**self.payload)
+        user.password = make_password(self.payload["password"], hasher="pbkdf2_sha1")
+        user.save()
+
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": self.payload["password"]})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+
+    def test_failed_login_sends_signal(self):
+        user = create_user(**self.payload)
+        failures = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failures.append(credentials["email"])
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": "Mauvais123"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        user.is_active = False
+        user.save()
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": self.payload["password"]})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(failures, [self.payload["email"]] * 2)
+
+    @override_settings(PASSWORD_HASH_QUEUE_LIMIT=0)
+    def test_saturated_pool_returns_503(self):
+        create_user(**self.payload)
+
+        res = self.client.post(LOGIN_URL, {"email": self.payload["email"],
+                                           "password": self.payload["password"]})
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "2")
+
+        res = self.client.post(CREATE_USER_URL, {**self.payload, "email": "doudou@gmail.com"})
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(get_user_model().objects.filter(email="doudou@gmail.com").exists())
+
+        # Les autres endpoints ne sont pas concernés.
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(PASSWORD_HASH_QUEUE_LIMIT=0)
+    def test_saturated_pool_admin_login_hashes_in_process(self):
+        get_user_model().objects.create_superuser(**self.payload)
+        client = Client()
+
+        res = client.post(reverse("admin:login"), {"username": self.payload["email"],
+                                                   "password": self.payload["password"]})
+        self.assertEqual(res.status_code, 302)
+        self.assertIn("_auth_user_id", client.session)
+
+        res = client.post(reverse("admin:login"), {"username": "inconnu@gmail.com",
+                                                   "password": "Mauvais123"})
+        self.assertEqual(res.status_code, 200)
+
+
+# Limitation de débit (seau à jetons) :
+# ======================================
+
+
+class ThrottlingTest(TestCase):
+
+    def setUp(self):
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+
+    @override_settings(THROTTLE_RATES={"login": "2/min"})
+    def test_login_throttled_per_ip(self):
+        payload = {"email": self.user.email, "password": "Mauvais123"}
+        statuses = [self.client.post(LOGIN_URL, payload).status_code for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+
+        res = self.client.post(LOGIN_URL, payload)
+        self.assertEqual(int(res["Retry-After"]), 30)
+        # Autre IP : seau distinct.
+        res = self.client.post(LOGIN_URL, payload, REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(THROTTLE_RATES={"login": "2/min"})
+    def test_forwarded_for_header_ignored_without_proxy(self):
+        payload = {"email": self.user.email, "password": "Mauvais123"}
+        statuses = [
+            self.client.post(LOGIN_URL, payload, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}").status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    @override_settings(THROTTLE_RATES={"user_create": "1/hour"})
+    def test_user_create_throttled(self):
+        payload = {"email": "doudou@gmail.com", "first_name": "Doudou",
+                   "last_name": "Martin", "password": "Doudou123"}
+        res = self.client.post(CREATE_USER_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.post(CREATE_USER_URL, {**payload, "email": "dede@gmail.com"})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(THROTTLE_RATES={"login": "1/min"})
+    def test_throttle_hits_counted(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        key = ("throttled_requests_total", ("login",))
+        with override_settings(METRICS_DIR=metrics_dir):
+            before = registry.collect().get(key, 0)
+            for _ in range(3):
+                self.client.post(LOGIN_URL, {"email": self.user.email, "password": "x"})
+            after = registry.collect().get(key, 0)
+        self.assertEqual(after - before, 2)
+
+    @override_settings(THROTTLE_RATES={"login": "2/min"},
+                       THROTTLE_BACKEND="EnTouteQuietude83_API.throttling.CacheBucketStore")
+    def test_shared_cache_backend(self):
+        get_bucket_store.cache_clear()
+        self.addCleanup(get_bucket_store.cache_clear)
+        cache.clear()
+        payload = {"email": self.user.email, "password": "Mauvais123"}
+
+        statuses = [self.client.post(LOGIN_URL, payload).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertIsNotNone(cache.get("throttle:login:127.0.0.1"))
+
+    def test_token_bucket_refill(self):
+        store = InProcessBucketStore()
+        self.assertEqual(store.consume("k", capacity=2, refill=1000.0), 0)
+        self.assertEqual(store.consume("k", capacity=2, refill=1000.0), 0)
+        self.assertGreater(store.consume("k", capacity=2, refill=1.0), 0)
+        time.sleep(0.01)
+        self.assertEqual(store.consume("k", capacity=2, refill=1000.0), 0)
+
+    @override_settings(THROTTLE_MAX_KEYS=3)
+    def test_in_process_store_evicts_least_recently_used(self):
+        store = InProcessBucketStore()
+        for key in ("a", "b", "c"):
+            store.consume(key, capacity=1, refill=0.001)
+        store.consume("a", capacity=1, refill=0.001)
+        store.consume("d", capacity=1, refill=0.001)
+
+        # "b" oublié (seau plein à nouveau), "a" (utilisé récemment) toujours vide.
+        self.assertEqual(store.consume("b", capacity=1, refill=0.001), 0)
+        self.assertGreater(store.consume("a", capacity=1, refill=0.001), 0)
+        self.assertEqual(len(store._buckets), 3)
+
+    def test_check_cost_microseconds(self):
+        # Coût d'une vérification complète (throttle DRF + seau en mémoire).
+        throttle = IPBucketThrottle()
+        view = LoginView()
+        view.throttle_scope = "login"
+        request = Request(APIRequestFactory().post(LOGIN_URL))
+        checks = 20000
+        with override_settings(THROTTLE_RATES={"login": f"{checks * 10}/s"}):
+            start = time.perf_counter()
+            for _ in range(checks):
+                throttle.allow_request(request, view)
+            per_check = (time.perf_counter() - start) / checks * 1e6
+        self.assertLess(per_check, 100)
+
+
+# Import en masse d'élèves :
+# ============================
+
+IMPORT_CSV = (
+    "email,first_name,last_name,telephone,password\n"
+    "eleve1@gmail.com,Eleve,Un,0611111111,Eleve123\n"
+    "eleve2@gmail.com,Eleve,Deux,,Eleve123\n"
+    "eleve1@gmail.com,Eleve,Doublon,,Eleve123\n"
+    "pas-un-email,Eleve,Invalide,,Eleve123\n"
+    "gerard@gmail.com,Gérard,Existant,,Gerard123\n"
+    "eleve3@gmail.com,Eleve,Trois,,123\n"
+)
+
+
+class UserImportTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        create_user(email="gerard@gmail.com", first_name="Gérard",
+                    last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_import_csv_file(self):
+        upload = SimpleUploadedFile("eleves.csv", IMPORT_CSV.encode(), content_type="text/csv")
+        res = self.client.post(IMPORT_URL, {"file": upload}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["duplicates"], [
+            {"row": 3, "email": "eleve1@gmail.com"}, {"row": 5, "email": "gerard@gmail.com"}])
+        self.assertEqual([error["row"] for error in res.data["errors"]], [4, 6])
+        self.assertIn("email", res.data["errors"][0]["errors"])
+        self.assertIn("password", res.data["errors"][1]["errors"])
+
+        user = get_user_model().objects.get(email="eleve1@gmail.com")
+        self.assertEqual(user.telephone, "0611111111")
+        self.assertTrue(user.check_password("Eleve123"))
+
+    def test_import_json_body(self):
+        rows = [{"email": f"eleve{i}@gmail.com", "first_name": "Eleve",
+                 "last_name": str(i), "password": "Eleve123"} for i in range(3)]
+        res = self.client.post(IMPORT_URL, rows, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 3)
+        self.assertEqual(get_user_model().objects.filter(email__startswith="eleve").count(), 3)
+
+    def test_import_survives_concurrent_signup(self):
+        rows = [{"email": f"eleve{i}@gmail.com", "first_name": "Eleve",
+                 "last_name": str(i), "password": "Eleve123"} for i in range(3)]
+
+        def hash_with_signup(passwords, workers):
+            # Inscription concurrente après la vérification des doublons.
+            create_user(email="eleve1@gmail.com", first_name="Eleve",
+                        last_name="Inscrit", password="Eleve123")
+            return [make_password(password) for password in passwords]
+
+        with mock.patch("user.imports.hash_passwords", hash_with_signup):
+            res = self.client.post(IMPORT_URL, rows, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["duplicates"], [{"row": 2, "email": "eleve1@gmail.com"}])
+        self.assertEqual(get_user_model().objects.get(email="eleve1@gmail.com").last_name, "Inscrit")
+        self.assertTrue(get_user_model().objects.filter(email="eleve2@gmail.com").exists())
+
+    def test_import_reports_every_concurrent_conflict(self):
+        rows = [{"email": f"eleve{i}@gmail.com", "first_name": "Eleve",
+                 "last_name": str(i), "password": "Eleve123"} for i in range(4)]
+
+        def hash_with_signups(passwords, workers):
+            # Plusieurs inscriptions concurrentes, dans des lots différents.
+            for email in ("eleve0@gmail.com", "eleve3@gmail.com"):
+                create_user(email=email, first_name="Eleve",
+                            last_name="Inscrit", password="Eleve123")
+            return [make_password(password) for password in passwords]
+
+        with mock.patch("user.imports.hash_passwords", hash_with_signups):
+            report = import_users(rows, batch_size=2)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.duplicates, [
+            {"row": 1, "email": "eleve0@gmail.com"}, {"row": 4, "email": "eleve3@gmail.com"}])
+        self.assertEqual(get_user_model().objects.filter(last_name="Inscrit").count(), 2)
+
+    @override_settings(USER_IMPORT_MAX_ROWS=2)
+    def test_import_rejects_too_many_rows(self):
+        rows = [{"email": f"eleve{i}@gmail.com", "first_name": "Eleve",
+                 "last_name": str(i), "password": "Eleve123"} for i in range(3)]
+        with mock.patch("user.imports.hash_passwords") as hash_passwords:
+            res = self.client.post(IMPORT_URL, rows, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        hash_passwords.assert_not_called()
+        self.assertFalse(get_user_model().objects.filter(email__startswith="eleve").exists())
+
+    def test_import_rejects_unknown_file_type(self):
+        upload = SimpleUploadedFile("eleves.xlsx", b"...")
+        res = self.client.post(IMPORT_URL, {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_requires_superuser(self):
+        self.client.force_authenticate(user=get_user_model().objects.get(email="gerard@gmail.com"))
+        res = self.client.post(IMPORT_URL, [], format="json")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command_with_process_pool(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "eleves.csv")
+        with open(path, "w") as file:
+            file.write(IMPORT_CSV)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_users", path, "--workers", "2", stdout=out, stderr=err)
+
+        self.assertIn("2 élève(s) créé(s), 2 doublon(s), 2 erreur(s)", out.getvalue())
+        self.assertIn("ligne 4 : email", err.getvalue())
+        self.assertTrue(get_user_model().objects.get(
+            email="eleve2@gmail.com").check_password("Eleve123"))
+
+
+# Cache d'authentification par token :
+# ======================================
+
+
+@override_settings(AUTH_TOKEN_CACHE_SINGLE_PROCESS=True)
+class AuthTokenCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_served_from_cache(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_logout_invalidates_cache(self):
+        self.client.get(ME_URL)
+        res = self.client.post(LOGOUT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_update_invalidates_cache(self):
+        self.client.get(ME_URL)
+        res = self.client.put(PASSWORD_UPDATE_URL, {"password": "Password123"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_deactivation_invalidates_cache(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_delete_invalidates_cache(self):
+        self.client.get(ME_URL)
+        admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin)
+        admin_client.delete(delete_url_function(self.user))
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_SINGLE_PROCESS=False)
+    def test_process_local_cache_not_used(self):
+        self.client.get(ME_URL)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(AUTH_TOKEN_CACHE_ALIAS="collections", AUTH_TOKEN_CACHE_SINGLE_PROCESS=False)
+    def test_logout_on_other_worker_invalidates_shared_cache(self):
+        # Deux instances du même cache partagé (deux workers).
+        worker, other_worker = caches["collections"], caches.create_connection("collections")
+        self.client.get(ME_URL)
+        self.assertIsNotNone(worker.get(token_cache_key(self.token.key)))
+
+        with mock.patch("user.authentication.get_token_cache", return_value=other_worker):
+            res = self.client.post(LOGOUT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(worker.get(token_cache_key(self.token.key)))
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stats_superuser_only(self):
+        res = self.client.get(AUTH_CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin)
+        res = admin_client.get(AUTH_CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("hits", res.data)
+        self.assertIn("misses", res.data)
+
+
+@override_settings(AUTH_TOKEN_CACHE_SINGLE_PROCESS=True)
+class AsyncMeTest(TestCase):
+    # GET /user/async/me/ : vue async, même cache de tokens que /user/me/.
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.headers = {"Authorization": f"Token {self.token.key}"}
+
+    async def test_same_payload_as_sync_route(self):
+        res = await self.async_client.get(ASYNC_ME_URL, headers=self.headers)
+        reference = await sync_to_async(self.client.get)(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, reference.content)
+
+    async def test_token_served_from_cache(self):
+        await self.async_client.get(ASYNC_ME_URL, headers=self.headers)
+        hits = auth_cache_stats.hits
+        res = await self.async_client.get(ASYNC_ME_URL, headers=self.headers)
+
+        self.assertEqual(auth_cache_stats.hits, hits + 1)
+        self.assertIn('desc="0 queries"', res["Server-Timing"])
+
+    async def test_inactive_or_unknown_token(self):
+        self.user.is_active = False
+        await self.user.asave()
+        res = await self.async_client.get(ASYNC_ME_URL, headers=self.headers)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = await self.async_client.get(ASYNC_ME_URL, headers={"Authorization": "Token"})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# Miniatures des images de profil :
+# ===================================
+
+
+def make_image_file(name="photo.jpg", size=(1200, 900), color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class ProfileImageThumbnailTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, PROFILE_IMAGE_THUMBNAILS_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                ME_URL, {"profile_image": make_image_file(**params)}, format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        return res
+
+    def test_upload_generates_thumbnails(self):
+        res = self.upload()
+
+        names = thumbnail_names(self.user.profile_image.name)
+        self.assertEqual(len(names), len(THUMBNAIL_SIZES) * 2)
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+            with default_storage.open(name) as file:
+                size = int(name.rsplit("_", 1)[1].split(".")[0])
+                self.assertEqual(Image.open(file).size, (size, size))
+        # Réponse construite avant la génération (après commit) : image d'origine.
+        self.assertTrue(res.data["profile_thumbnails"]["64"]["webp"].endswith(
+            self.user.profile_image.name))
+        res = self.client.get(ME_URL)
+        self.assertTrue(res.data["profile_thumbnails"]["64"]["webp"].endswith(
+            names[0].rsplit("/", 1)[1]))
+
+    def test_replace_image_deletes_old_thumbnails(self):
+        self.upload(name="first.jpg")
+        old_name = self.user.profile_image.name
+        self.upload(name="second.jpg", color="blue")
+
+        for name in [old_name, *thumbnail_names(old_name)]:
+            self.assertFalse(default_storage.exists(name))
+        for name in thumbnail_names(self.user.profile_image.name):
+            self.assertTrue(default_storage.exists(name))
+
+    def test_thumbnails_generated_in_worker_pool(self):
+        name = default_storage.save("profile_images/pool.jpg", make_image_file())
+        with override_settings(PROFILE_IMAGE_THUMBNAILS_ASYNC=True):
+            future = schedule_thumbnails(name)
+        future.result(timeout=30)
+        for thumbnail in thumbnail_names(name):
+            self.assertTrue(default_storage.exists(thumbnail))
+
+    def test_user_serializer_exposes_thumbnails(self):
+        admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.client.force_authenticate(user=admin)
+        res = self.client.get(LIST_URL)
+
+        for user in res.data["results"]:
+            self.assertEqual(set(user["profile_thumbnails"]), {"64", "128", "256"})
+            # Miniatures absentes de MEDIA_ROOT : image d'origine.
+            self.assertTrue(user["profile_thumbnails"]["128"]["jpeg"].endswith(
+                "default_images/user.png"))
+
+    def test_thumbnail_urls_wait_for_generation(self):
+        name = default_storage.save("profile_images/pending.jpg", make_image_file())
+        urls = thumbnail_urls(name)
+        self.assertEqual({urls[size][ext] for size in urls for ext in urls[size]},
+                         {default_storage.url(name)})
+
+        generate_thumbnails(name)
+        urls = thumbnail_urls(name)
+        self.assertTrue(urls["64"]["webp"].endswith("profile_images/thumbs/pending_64.webp"))
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_dir, ignore_errors=True)
+        settings_override = override_settings(
+            PROFILING_STORAGE_DIR=storage_dir, PROFILING_SAMPLE_RATE=1.0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = create_user(
+            email="gerard@gmail.com", first_name="Gérard", last_name="Michaud", password="Gerard123")
+        self.admin = get_user_model().objects.create_superuser(
+            email="francis@gmail.com", first_name="Francis", last_name="Dupont", password="Francis123")
+        self.user_token = Token.objects.create(user=self.user)
+        self.admin_token = Token.objects.create(user=self.admin)
+
+    def test_server_timing_header(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res["Server-Timing"]
+        for name in ("auth;dur=", "db;dur=", "app;dur=", "total;dur="):
+            self.assertIn(name, timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertNotIn("X-Profile-Id", res)
+
+    def test_superuser_profile_capture_and_download(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        res = self.client.get(LIST_URL, HTTP_X_PROFILE="1")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile_id = res["X-Profile-Id"]
+
+        res = self.client.get(reverse("profile-list"))
+        self.assertEqual([p["id"] for p in res.data], [profile_id])
+        self.assertEqual(res.data[0]["request"], f"GET {LIST_URL}")
+
+        res = self.client.get(reverse("profile-download", args=[profile_id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertGreater(len(b"".join(res.streaming_content)), 0)
+
+        res = self.client.get(reverse("profile-download", args=[profile_id]),
+                              {"summary": 1})
+        self.assertIn("cumulative", res.content.decode())
+
+    def test_profile_requires_superuser(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        res = self.client.get(ME_URL, HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-Id", res)
+
+        res = self.client.get(reverse("profile-list"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = self.client.get(reverse("profile-download", args=["0" * 32]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Session (admin Django) : pas de profil, token requis.
+        session_client = APIClient()
+        session_client.force_login(self.admin)
+        res = session_client.get(ME_URL, HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-Id", res)
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_old_profiles_pruned(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        for _ in range(4):
+            self.client.get(ME_URL, HTTP_X_PROFILE="1")
+
+        res = self.client.get(reverse("profile-list"))
+        self.assertEqual(len(res.data), 2)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import UserCreateView, UserListView, UserUpdateView, PasswordUpdateView, LoginView, LogoutView, UserDeleteView
+from .views import UserCreateView, UserListView, UserUpdateView, PasswordUpdateView, LoginView, LogoutView, UserDeleteView, UserBulkDeleteView, UserImportView, AuthCacheStatsView, me_async
 
 
 app_name = "user"
@@ -9,8 +9,13 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='user-login'),
     path('list/', UserListView.as_view(), name='user-list'),
     path('me/', UserUpdateView.as_view(), name='user-update'),
+    path('async/me/', me_async, name='user-async-me'),
     path('update-password/', PasswordUpdateView.as_view(),
          name='user-update-password'),
     path('logout/', LogoutView.as_view(), name='user-logout'),
     path('delete/<int:pk>/', UserDeleteView.as_view(), name='user-delete'),
+    path('delete/bulk/', UserBulkDeleteView.as_view(), name='user-bulk-delete'),
+    path('import/', UserImportView.as_view(), name='user-import'),
+    path('auth-cache-stats/', AuthCacheStatsView.as_view(),
+         name='user-auth-cache-stats'),
 ]
@@ -1,9 +1,23 @@
-from rest_framework import generics, permissions, authentication, status
+import io
+import os
+from rest_framework import generics, permissions, status
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from .serializers import UserCreationSerializer, UserSerializer, UserUpdateSerializer, PasswordUpdateSerializer, LoginSerializer
+from rest_framework.pagination import CursorPagination
+import django_filters
+from django_filters.rest_framework import DjangoFilterBackend
+from .serializers import UserCreationSerializer, UserSerializer, UserUpdateSerializer, PasswordUpdateSerializer, LoginSerializer, UserBulkDeleteSerializer, UserRowSerializer
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from .authentication import CachedTokenAuthentication, auth_cache_stats
+from .imports import IMPORT_FORMATS, import_users, read_rows
+from EnTouteQuietude83_API.asyncviews import async_read_view, json_response
+from EnTouteQuietude83_API.metrics import LOGIN_FAILURES
+from EnTouteQuietude83_API.fieldsets import FieldSelectionMixin
+from EnTouteQuietude83_API.rows import RowListMixin
+from EnTouteQuietude83_API.throttling import IPBucketThrottle
 
 
 User = get_user_model()
@@ -27,23 +41,55 @@ class UserCreateView(generics.CreateAPIView):
     serializer_class = UserCreationSerializer
     # Tout le monde peut créer un user.
     permission_classes = [permissions.AllowAny]
+    # Limite par IP (settings.THROTTLE_RATES["user_create"]).
+    throttle_classes = [IPBucketThrottle]
+    throttle_scope = "user_create"
 
 
 # Update d'un user (GET/PUT/DELETE):
 # -------------------
 
 
-class UserListView(generics.ListAPIView):
+# Liste des users (superuser) : paginée par curseur, triée par email
+# => GET /user/?search=gér&is_premium=true&cursor=...
+# ?search= : préfixe de l'email, du prénom ou du nom (CustomUserQuerySet.search).
+
+
+class UserFilter(django_filters.FilterSet):
+    search = django_filters.CharFilter(method="filter_search")
+
+    class Meta:
+        model = User
+        fields = ["search", "is_premium", "is_active"]
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+
+class UserCursorPagination(CursorPagination):
+    ordering = ("email",)
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class UserListView(FieldSelectionMixin, RowListMixin, generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    # Liste sérialisée depuis values() (EnTouteQuietude83_API.rows) ;
+    # ?fields= (EnTouteQuietude83_API.fieldsets).
+    row_serializer_class = UserRowSerializer
     permission_classes = [IsSuperUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UserFilter
+    pagination_class = UserCursorPagination
 
 
 class UserUpdateView(generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserUpdateSerializer
     # Token obligatoire
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # seuls les users authentifiés peuvent update leur profil.
     permission_classes = [permissions.IsAuthenticated]
 
@@ -51,6 +97,16 @@ class UserUpdateView(generics.RetrieveUpdateDestroyAPIView):
         return self.request.user  # retourne le user connecté.
 
 
+# Lecture async du profil (ASGI) : GET /user/async/me/
+# Même JSON que GET /user/me/, servi depuis le user du cache de tokens.
+
+
+@async_read_view
+async def me_async(request):
+    serializer = UserUpdateSerializer(request.user, context={"request": request})
+    return json_response(serializer.data)
+
+
 # Update Spécifique MDP :
 # --------------------------
 
@@ -58,7 +114,7 @@ class PasswordUpdateView(generics.UpdateAPIView):
     queryset = User.objects.all()
     serializer_class = PasswordUpdateSerializer
     # token obligatoire
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # seuls les users authentifiés peuvent update le mdp.
     permission_classes = [permissions.IsAuthenticated]
 
@@ -70,7 +126,7 @@ class PasswordUpdateView(generics.UpdateAPIView):
 
 
 class UserDeleteView(APIView):
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsSuperUser]
 
     def delete(self, request, pk):
@@ -83,15 +139,79 @@ class UserDeleteView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# Suppression groupée : POST /user/delete/bulk/ {"ids": [1, 2, 3]}
+# Mêmes effets que UserDeleteView (créneaux réservés, rendez-vous,
+# messages), en quelques requêtes et une seule transaction.
+
+
+class UserBulkDeleteView(APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def post(self, request):
+        serializer = UserBulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+
+        users = User.objects.filter(pk__in=ids)
+        found = set(users.values_list("pk", flat=True))
+        users.delete()
+        return Response({"deleted": sorted(found), "not_found": sorted(ids - found)},
+                        status=status.HTTP_200_OK)
+
+
+# Import en masse (superuser) : POST /user/import/
+# Fichier "file" (.csv ou .json) en multipart, ou liste JSON dans le corps.
+# Renvoie le rapport : créés, doublons, erreurs par ligne, débit.
+
+
+class UserImportView(APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSuperUser]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            kind = os.path.splitext(upload.name)[1].lower().lstrip(".")
+            if kind not in IMPORT_FORMATS:
+                return Response({"file": ["Fichier .csv ou .json attendu."]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                rows = read_rows(io.TextIOWrapper(upload, encoding="utf-8-sig"), kind)
+            except (ValueError, UnicodeDecodeError) as exc:
+                return Response({"file": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response({"file": ["Fichier ou liste d'utilisateurs attendu."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+            return Response({"file": [
+                f"{settings.USER_IMPORT_MAX_ROWS} lignes maximum par requête : "
+                "utiliser la commande import_users."]},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_users(rows)
+        return Response(report.as_dict(), status=status.HTTP_201_CREATED
+                        if report.created else status.HTTP_200_OK)
+
+
 # Création d'un Token (connexion) :
 # ----------------------------------
 
 class LoginView(APIView):
     serializer_class = LoginSerializer
+    # Limite par IP, vérifiée avant tout hachage de mot de passe.
+    throttle_classes = [IPBucketThrottle]
+    throttle_scope = "login"
 
     def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        serializer = self.serializer_class(data=request.data, context={"request": request})
+        if not serializer.is_valid():
+            LOGIN_FAILURES.inc()
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         user = serializer.validated_data
         token, created = Token.objects.get_or_create(user=user)
 
@@ -104,9 +224,21 @@ class LoginView(APIView):
 
 
 class LogoutView(APIView):
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         request.user.auth_token.delete()
         return Response(status=status.HTTP_200_OK)
+
+
+# Statistiques du cache d'authentification (superuser) :
+# --------------------------------------------------------
+
+
+class AuthCacheStatsView(APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def get(self, request):
+        return Response(auth_cache_stats.as_dict(), status=status.HTTP_200_OK)